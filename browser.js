@@ -8,13 +8,13 @@ async function buildDJDropdown() {
     const config = configResponse.ok ? await configResponse.json() : {};
     const mainDJs = config.main_djs || [];
 
-    // Fetch search index to extract unique DJs
-    const indexResponse = await fetch('mixes/search-index.json');
-    const searchIndex = indexResponse.ok ? await indexResponse.json() : [];
+    // Load the search index (shared with search, so a cached copy is
+    // patched once) to extract unique DJs
+    const { mixes } = await searchIndex.load();
 
     // Extract unique DJs and paths
     const djMap = new Map();
-    searchIndex.forEach(mix => {
+    mixes.forEach(mix => {
       const dj = mix.dj;
       if (dj && !djMap.has(dj)) {
         djMap.set(dj, dj);
@@ -219,9 +219,10 @@ function displayMixList(mixes) {
         const artist = showArtist && mix.artist && mix.artist !== 'Various'
           && !mix.name.toLowerCase().includes(mix.artist.toLowerCase())
           ? ` by ${escapeHtml(mix.artist)}` : '';
-        const hasExtra = mix.date || mix.comment;
+        // hasInfo: the summary manifest says there are details to load on demand
+        const hasExtra = mix.date || mix.comment || mix.hasInfo;
         const extraBtn = hasExtra ? `<button class="icon-btn info-btn" data-action="toggle-info" title="More info">ⓘ</button>` : '';
-        const extraInfo = hasExtra ? `<div class="mix-extra-info" style="display:none">${mix.date ? `<div><strong>Date:</strong> ${escapeHtml(mix.date)}</div>` : ''}${mix.comment ? `<div><strong>Notes:</strong> ${escapeHtml(mix.comment)}</div>` : ''}</div>` : '';
+        const extraInfo = hasExtra ? `<div class="mix-extra-info" style="display:none">${mixExtraInfo(mix)}</div>` : '';
         return `<div class="mix-item" data-mix-id="${escapeHtml(mixId)}">
         <div class="mix-item-row">
           <span class="mix-name">${escapeHtml(mix.name)}${artist} <span class="mix-duration">(${mix.duration}${genre})</span></span>
@@ -234,11 +235,21 @@ function displayMixList(mixes) {
       }).join('');
 }
 
-function toggleExtraInfo(btn) {
-   const info = btn.closest('.mix-item').querySelector('.mix-extra-info');
-   if (info) {
-      info.style.display = info.style.display === 'none' ? 'block' : 'none';
+function mixExtraInfo(mix) {
+   return `${mix.date ? `<div><strong>Date:</strong> ${escapeHtml(mix.date)}</div>` : ''}${mix.comment ? `<div><strong>Notes:</strong> ${escapeHtml(mix.comment)}</div>` : ''}`;
+}
+
+async function toggleExtraInfo(btn) {
+   const item = btn.closest('.mix-item');
+   const info = item.querySelector('.mix-extra-info');
+   if (!info) return;
+   // Date and notes of a mix from the summary manifest come with its detail page
+   const mix = !info.innerHTML && item.dataset.mixId && state.currentMixes.find(m => getMixId(m) === item.dataset.mixId);
+   if (mix) {
+      await loadMixPage(mix);
+      info.innerHTML = mixExtraInfo(mix);
    }
+   info.style.display = info.style.display === 'none' ? 'block' : 'none';
 }
 
 // Wrapper for button click handler
@@ -296,6 +296,7 @@ const declick = {
 
 const state = {
    currentPeaks: null,
+   currentBands: null,
    isResizing: false,
    currentMixes: [],
    currentDJ: storage.get('currentDJ', ''),
@@ -74,7 +74,9 @@ const playHistory = {
         duration: mix.duration || null,
         audioFile: mix.audioFile,
         hasTracklist: mix.hasTracklist || false,
+        hasSuggestedTracks: mix.hasSuggestedTracks || false,
         coverFile: mix.coverFile || null,
+        peaksFile: mix.peaksFile || null,
         downloads: mix.downloads || null,
         position: aud.currentTime || 0,
         timestamp: Date.now()
@@ -229,7 +231,9 @@ async function resumeFromHistory(index) {
       artist: entry.artist,
       duration: entry.duration,
       hasTracklist: entry.hasTracklist || false,
+      hasSuggestedTracks: entry.hasSuggestedTracks || false,
       coverFile: entry.coverFile,
+      peaksFile: entry.peaksFile,
       downloads: entry.downloads
     };
 
@@ -253,7 +257,7 @@ async function resumeFromHistory(index) {
       state.currentDownloadLinks = details.downloadLinks || [];
       state.currentCoverSrc = details.coverSrc;
       displayTrackList(mix, details.trackListTable, details.coverSrc);
-      loadPeaks(details.peaks);
+      loadPeaks(details.peaks, details.bands);
       displayQueue();
 
       await playAt(details.audioSrc, savedPosition);
@@ -1,8 +1,5 @@
-async function fetchDJMixes(djPath) {
-  const cleanPath = normalizeDJPath(djPath);
-  const response = await fetch(`mixes/${cleanPath}/manifest.json`);
-  const manifest = await response.json();
-  return manifest.mixes.map(mix => ({
+function mixFromManifest(mix, djPath) {
+  return {
     name: mix.name,
     file: mix.file,
     audioFile: mix.audioFile,
@@ -14,9 +11,82 @@ async function fetchDJMixes(djPath) {
     comment: mix.comment,
     downloads: mix.downloads,
     hasTracklist: mix.hasTracklist || false,
+    hasSuggestedTracks: mix.hasSuggestedTracks || false,
     coverFile: mix.coverFile,
-    djPath: cleanPath
-  }));
+    coverThumbs: mix.coverThumbs,
+    coverWidth: mix.coverWidth,
+    peaksFile: mix.peaksFile,
+    djPath
+  };
+}
+
+// srcset for a mix's cover: its thumbnails (covers.json via the manifest)
+// plus the full cover, so the browser fetches the smallest that fits
+function coverSrcset(mix, coverSrc) {
+  if (!mix || !coverSrc || !mix.coverThumbs || !mix.coverWidth) return '';
+  const dir = coverSrc.slice(0, coverSrc.lastIndexOf('/') + 1);
+  const candidates = mix.coverThumbs
+    .filter(thumb => thumb.width && thumb.width < mix.coverWidth)
+    .map(thumb => `${dir}${encodeFilename(thumb.file)} ${thumb.width}w`);
+  return [...candidates, `${coverSrc} ${mix.coverWidth}w`].join(', ');
+}
+
+// Fetch the mix list from the small summary manifest; each mix names the
+// detail page that loadMixPage() fetches on demand. Falls back to the full
+// manifest.json for folders without a summary.
+async function fetchDJMixes(djPath) {
+  const cleanPath = normalizeDJPath(djPath);
+  const summaryResponse = await fetch(`mixes/${cleanPath}/manifest.summary.json`);
+  if (summaryResponse.ok) {
+    const summary = await summaryResponse.json();
+    return summary.mixes.map((mix, i) => ({
+      name: mix.name,
+      file: mix.file,
+      duration: mix.durationFormatted,
+      durationSeconds: mix.duration,
+      artist: mix.artist,
+      genre: mix.genre,
+      coverFile: mix.coverFile,
+      hasInfo: mix.info || false,
+      detailsPage: summary.pages[Math.floor(i / summary.pageSize)],
+      djPath: cleanPath
+    }));
+  }
+  const response = await fetch(`mixes/${cleanPath}/manifest.json`);
+  const manifest = await response.json();
+  return manifest.mixes.map(mix => mixFromManifest(mix, cleanPath));
+}
+
+// Detail pages by URL -> Promise of Map(file -> manifest entry)
+const mixPages = new Map();
+
+function fetchManifestEntries(url) {
+  if (!mixPages.has(url)) {
+    mixPages.set(url, fetch(url).then(response => {
+      if (!response.ok) throw new Error(`${url}: ${response.status}`);
+      return response.json();
+    }).then(data => new Map(data.mixes.map(mix => [mix.file, mix]))).catch(e => {
+      mixPages.delete(url);
+      throw e;
+    }));
+  }
+  return mixPages.get(url);
+}
+
+// Fill in the full details of a mix listed by the summary manifest (in place).
+// A page that has since been replaced falls back to the full manifest.json.
+async function loadMixPage(mix) {
+  if (!mix.detailsPage || mix.audioFile) return mix;
+  const dir = `mixes/${normalizeDJPath(mix.djPath)}/`;
+  let entries;
+  try {
+    entries = await fetchManifestEntries(dir + encodeFilename(mix.detailsPage));
+  } catch {
+    entries = await fetchManifestEntries(dir + 'manifest.json');
+  }
+  const entry = entries.get(mix.file);
+  if (entry) Object.assign(mix, mixFromManifest(entry, normalizeDJPath(mix.djPath)));
+  return mix;
 }
 
 // Universal selection phrases (DJ-agnostic common terms)
@@ -225,17 +295,41 @@ async function resolveMediaUrl(relativePath) {
   return MIXES_BASE_URLS[0] + relativePath;
 }
 
+// Warm the HTTP cache with the peaks and covers of the most played mixes
+// (mixes/hot.json, written by tools/generate-hot.py) once the page is idle
+function prefetchHotMixes() {
+  const whenIdle = window.requestIdleCallback || (cb => setTimeout(cb, 2000));
+  whenIdle(async () => {
+    try {
+      const response = await fetch('mixes/hot.json');
+      if (!response.ok) return;
+      const hot = await response.json();
+      for (const mix of hot.mixes || []) {
+        for (const url of [mix.peaks, mix.cover]) {
+          if (url) await fetch(url, { priority: 'low' }).then(r => r.blob()).catch(() => {});
+        }
+      }
+    } catch {
+      // No hot list, nothing to prefetch
+    }
+  });
+}
+
 async function fetchMixDetails(mix) {
+  await loadMixPage(mix);
   const djPath = normalizeDJPath(mix.djPath || mix.dj);
   const localDir = `mixes/${djPath}/`;
   
-  // Load peaks (derived from mix filename)
+  // Load peaks and low/mid/high band levels (content-hashed name from the
+  // manifest, else derived from mix filename)
   let peaks = null;
+  let bands = null;
   try {
-    const peaksResponse = await fetch(localDir + encodeFilename(mix.file + '.peaks.json'));
+    const peaksResponse = await fetch(localDir + encodeFilename(mix.peaksFile || mix.file + '.peaks.json'));
     if (peaksResponse.ok) {
       const peaksData = await peaksResponse.json();
       peaks = peaksData.peaks;
+      bands = peaksData.bands || null;
     }
   } catch (e) {
     // Peaks file doesn't exist, that's fine
@@ -254,8 +348,18 @@ async function fetchMixDetails(mix) {
     } catch (e) {
       // No track list file, that's fine
     }
+  } else if (mix.hasSuggestedTracks) {
+    // Track starts suggested by tools/detect-tracks.py (.tracks.json)
+    try {
+      const jsonResponse = await fetch(`${localDir}${encodeFilename(mix.file)}.tracks.json`);
+      if (jsonResponse.ok) {
+        trackListTable = suggestedTrackTable(await jsonResponse.json());
+      }
+    } catch (e) {
+      // No suggested tracks, that's fine
+    }
   }
-  
+
   // Cover art URL (local)
   const coverSrc = mix.coverFile ? localDir + encodeFilename(mix.coverFile) : null;
   
@@ -274,6 +378,7 @@ async function fetchMixDetails(mix) {
     audioSrc,
     trackListTable,
     peaks,
+    bands,
     downloadLinks,
     coverSrc
   };
@@ -336,3 +441,13 @@ function parseTrackListCSV(txt) {
   return `<table class="border">${header}${rows.join('')}</table>`;
 }
 
+// Suggested chapters: each start time seeks the player (see player-mix.js)
+function suggestedTrackTable(data) {
+  const tracks = data.tracks || [];
+  if (tracks.length < 2) return '';
+  const rows = tracks.map((track, i) =>
+    `<tr><td><a href="#" data-seek="${Number(track.start) || 0}">${escapeHtml(formatTime(track.start))}</a></td><td>Track ${i + 1}</td></tr>`
+  );
+  return `<table class="border"><tr><th>Time</th><th>Suggested chapter</th></tr>${rows.join('')}</table>`;
+}
+
@@ -2,7 +2,11 @@
 // Used by: browser.js, liveui.js
 // Dependencies: core.js (escapeHtml)
 
-// Load available streams from /streams/manifest.json
+// Load available streams from /streams/manifest.json: every preset from
+// bundle.json in one request when the manifest lists one (written by
+// tools/generate-streams-manifest.py --bundle), else each .streams file.
+// Bundle and preset URLs carry their content hash, so the browser cache
+// only misses when they change.
 async function loadAvailablePresets() {
     try {
         // Load manifest with cache-busting parameter
@@ -14,20 +18,23 @@ async function loadAvailablePresets() {
             return [];
         }
         
+        if (manifest.bundle) {
+            try {
+                return await loadBundlePresets(manifest);
+            } catch (e) {
+                console.error('Failed to load stream bundle, loading presets one by one:', e);
+            }
+        }
+        
         // Load each stream file
         const presets = [];
         for (const item of manifest.presets) {
             try {
-                const presetResponse = await fetch(`/streams/${item.filename}?t=${Date.now()}`);
+                const version = item.hash ? `v=${item.hash}` : `t=${Date.now()}`;
+                const presetResponse = await fetch(`/streams/${item.filename}?${version}`);
                 const preset = await presetResponse.json();
                 if (preset.name && Array.isArray(preset.streams)) {
-                    presets.push({
-                        filename: item.filename,
-                        name: preset.name,
-                        category: preset.category || 'other',
-                        tab: preset.tab || null,
-                        streams: preset.streams
-                    });
+                    presets.push(presetEntry(item.filename, preset, preset.streams));
                 }
             } catch (e) {
                 console.error(`Failed to load preset ${item.filename}:`, e);
@@ -41,6 +48,30 @@ async function loadAvailablePresets() {
     }
 }
 
+// Expand bundle.json (presets list station ids into a shared table) in manifest order
+async function loadBundlePresets(manifest) {
+    const { file, hash } = manifest.bundle;
+    const response = await fetch(`/streams/${file || 'bundle.json'}?v=${hash}`);
+    if (!response.ok) throw new Error(`${file}: ${response.status}`);
+    const bundle = await response.json();
+    const stations = bundle.stations || [];
+    const byFilename = new Map((bundle.presets || []).map(p => [p.filename, p]));
+    return manifest.presets
+        .map(item => byFilename.get(item.filename))
+        .filter(preset => preset && preset.name && Array.isArray(preset.streams))
+        .map(preset => presetEntry(preset.filename, preset, preset.streams.map(id => stations[id]).filter(Boolean)));
+}
+
+function presetEntry(filename, preset, streams) {
+    return {
+        filename,
+        name: preset.name,
+        category: preset.category || 'other',
+        tab: preset.tab || null,
+        streams
+    };
+}
+
 // Get unique categories from presets with proper ordering
 async function getAvailableCategories() {
     const presets = await loadAvailablePresets();
@@ -86,14 +86,22 @@ function drawWaveform(peaks, progress = 0) {
 
     waveformCtx.clearRect(0, 0, w, h);
 
+    const bands = peaks === state.currentPeaks ? state.currentBands : null;
     peaks.forEach((peak, i) => {
         const x = i * barWidth;
         const barHeight = peak * h * 0.9;
         const y = (h - barHeight) / 2;
 
-        // Played portion in accent color, unplayed in muted
+        // Played portion in accent color, unplayed in muted; with band levels
+        // (from generate-peaks.py) bass is red, mids green and highs blue
         const playedX = w * progress;
-        waveformCtx.fillStyle = x < playedX ? '#5c6bc0' : '#3d3d5c';
+        if (bands) {
+            const top = Math.max(bands.low[i], bands.mid[i], bands.high[i], 1) / 255;
+            const [r, g, b] = [bands.low[i], bands.mid[i], bands.high[i]].map(v => Math.round(v / top));
+            waveformCtx.fillStyle = `rgba(${r}, ${g}, ${b}, ${x < playedX ? 1 : 0.45})`;
+        } else {
+            waveformCtx.fillStyle = x < playedX ? '#5c6bc0' : '#3d3d5c';
+        }
         waveformCtx.fillRect(x, y, Math.max(1, barWidth - 1), barHeight);
     });
 
@@ -145,6 +153,18 @@ waveformCanvas.addEventListener('click', function (e) {
     }
 });
 
+// Click on a suggested chapter's start time to seek there
+document.getElementById('trackList').addEventListener('click', function (e) {
+    const link = e.target.closest('[data-seek]');
+    if (!link) return;
+    e.preventDefault();
+    const time = Number(link.dataset.seek);
+    if (isFinite(time) && state.currentPeaks) {
+        aud.currentTime = time;
+        updateWaveformCursor();
+    }
+});
+
 // Initialize with empty waveform
 state.currentPeaks = null;
 drawWaveform([], 0);
@@ -196,12 +216,16 @@ function stopResize() {
     storage.set('waveformHeight', waveformCanvas.height);
 }
 
-function loadPeaks(peaks) {
+function loadPeaks(peaks, bands = null) {
     if (peaks && peaks.length > 0) {
         state.currentPeaks = peaks;
+        // Band levels colour the bars only when there is one per peak
+        const complete = bands && ['low', 'mid', 'high'].every(b => Array.isArray(bands[b]) && bands[b].length === peaks.length);
+        state.currentBands = complete ? bands : null;
         drawWaveform(state.currentPeaks, 0);
     } else {
         state.currentPeaks = null;
+        state.currentBands = null;
         waveformCtx.clearRect(0, 0, waveformCanvas.width, waveformCanvas.height);
     }
 }
@@ -248,7 +272,7 @@ async function playMix(mix, source) {
             state.currentCoverSrc = details.coverSrc;
             play(details.audioSrc);
             displayTrackList(mix, details.trackListTable, details.coverSrc);
-            loadPeaks(details.peaks);
+            loadPeaks(details.peaks, details.bands);
         }
     }
     displayQueue();
@@ -275,7 +299,11 @@ function displayTrackList(mix, table, coverSrc) {
 
     // Cover art (available in its own tab now, independent of track list)
     if (coverSrc) {
-        coverArtDiv.innerHTML = `<img src="${coverSrc}" alt="Cover art">`;
+        // Thumbnails when the manifest lists them (right column is at most 520px wide)
+        const srcset = coverSrcset(mix, coverSrc);
+        coverArtDiv.innerHTML = srcset
+            ? `<img src="${coverSrc}" srcset="${srcset}" sizes="(max-width: 600px) 100vw, 520px" alt="Cover art">`
+            : `<img src="${coverSrc}" alt="Cover art">`;
     } else {
         coverArtDiv.innerHTML = '';
     }
@@ -106,7 +106,7 @@ document.getElementById('fileInput').addEventListener('change', async function (
         state.currentDownloadLinks = details.downloadLinks || [];
         state.currentCoverSrc = details.coverSrc;
         displayTrackList(mix, details.trackListTable, details.coverSrc);
-        loadPeaks(details.peaks);
+        loadPeaks(details.peaks, details.bands);
         requestAnimationFrame(resizeWaveformCanvas);
       }
     }
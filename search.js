@@ -1,5 +1,15 @@
 // search.js - Search index, search results, and favourites display
 
+// Apply a search index delta (added/changed/removed entries keyed by dj/file)
+// to a cached copy; changed entries keep their place, added ones go last
+function applySearchIndexDelta(mixes, delta) {
+  const key = mix => `${mix.dj}/${mix.file}`;
+  const byKey = new Map(mixes.map(mix => [key(mix), mix]));
+  for (const removed of delta.removed || []) byKey.delete(removed);
+  for (const mix of [...(delta.changed || []), ...(delta.added || [])]) byKey.set(key(mix), mix);
+  return [...byKey.values()];
+}
+
 // Search index cache
 const searchIndex = {
   mixData: null,
@@ -18,12 +28,12 @@ const searchIndex = {
     this.loading = true;
     try {
       // Load both indexes in parallel
-      const [mixResponse, streamResponse] = await Promise.all([
-        fetch('mixes/search-index.json'),
+      const [mixData, streamResponse] = await Promise.all([
+        this.loadMixIndex(),
         fetch('streams/search-index.json')
       ]);
       
-      this.mixData = await mixResponse.json();
+      this.mixData = mixData;
       this.streamData = await streamResponse.json();
       
       this.mixData = this.mixData.map(m => ({ ...m, dj: normalizeDJPath(m.dj) }));
@@ -40,6 +50,46 @@ const searchIndex = {
     return { mixes: this.mixData, streams: this.streamData };
   },
 
+  // The mix index from the copy in localStorage when it is the latest
+  // version, patched with a delta when one is published from its version
+  // (see tools/generate-search-index.py), else fetched in full
+  async loadMixIndex() {
+    let latest = null;
+    try {
+      const response = await fetch('mixes/search-index.latest.json', { cache: 'no-cache' });
+      if (response.ok) latest = await response.json();
+    } catch {
+      // No version pointer, fetch the full index
+    }
+    if (!latest) {
+      return (await fetch('mixes/search-index.json')).json();
+    }
+
+    const cached = storage.getJSON('searchIndexCache');
+    if (cached && cached.version === latest.version) return cached.mixes;
+    let mixes = null;
+    const deltaFile = cached && (latest.deltas || {})[cached.version];
+    if (deltaFile) {
+      try {
+        const response = await fetch(`mixes/${deltaFile}`);
+        if (response.ok) mixes = applySearchIndexDelta(cached.mixes, await response.json());
+      } catch {
+        mixes = null;
+      }
+    }
+    if (!mixes || mixes.length !== latest.count) {
+      // Named after its version, so the content always matches latest.version
+      mixes = await (await fetch(`mixes/${latest.file}`)).json();
+    }
+
+    try {
+      if (mixes.length === latest.count) storage.set('searchIndexCache', { version: latest.version, mixes });
+    } catch {
+      storage.remove('searchIndexCache');  // Over the storage quota
+    }
+    return mixes;
+  },
+
   search(query) {
     if (!this.mixData || !query.trim()) return [];
     const terms = query.toLowerCase().split(/\s+/).filter(t => t.length > 0);
@@ -91,7 +141,9 @@ async function displayFavourites() {
         genre: match.genre,
         comment: match.comment,
         hasTracklist: match.hasTracklist || false,
+        hasSuggestedTracks: match.hasSuggestedTracks || false,
         coverFile: match.coverFile,
+        peaksFile: match.peaksFile,
         downloads: match.downloads,
         djPath: normalizeDJPath(match.dj),
         djLabel: normalizeDJPath(match.dj)
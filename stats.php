@@ -10,19 +10,13 @@ if (!isset($_SERVER['PHP_AUTH_PW']) || $_SERVER['PHP_AUTH_PW'] !== STATS_PASSWOR
     exit('Unauthorized');
 }
 
-// Parse beacon.log
+// Load the per-day rollups written by tools/rollup-beacons.py, then parse
+// only the part of beacon.log appended since its last run (the whole log
+// if it has never run)
 $logFile = __DIR__ . '/beacon.log';
-$entries = [];
-if (file_exists($logFile)) {
-    foreach (file($logFile, FILE_IGNORE_NEW_LINES | FILE_SKIP_EMPTY_LINES) as $line) {
-        $entry = json_decode($line, true);
-        if ($entry) $entries[] = $entry;
-    }
-}
-
-$total = count($entries);
+$rollupDir = __DIR__ . '/beacon-rollups';
 
-// Aggregate stats
+$total = 0;
 $ips = [];
 $nicks = [];
 $events = [];
@@ -31,31 +25,88 @@ $mixes = [];
 $searches = [];
 $sources = [];
 $days = [];
+$firstTs = null;
+$lastTs = null;
 
-foreach ($entries as $e) {
-    $ip = $e['ip'] ?? 'unknown';
-    $nick = $e['nick'] ?? 'unknown';
-    $event = $e['event'] ?? 'unknown';
-    $detail = $e['detail'] ?? '';
-    $day = substr($e['server_ts'] ?? $e['ts'] ?? '', 0, 10);
+function addCounts(&$into, $counts) {
+    foreach ($counts as $key => $n) $into[$key] = ($into[$key] ?? 0) + $n;
+}
 
-    $ips[$ip] = ($ips[$ip] ?? 0) + 1;
-    $nicks[$nick] = ($nicks[$nick] ?? 0) + 1;
-    $events[$event] = ($events[$event] ?? 0) + 1;
-    if ($day) $days[$day] = ($days[$day] ?? 0) + 1;
+// Same as first_line_hash() in tools/rollup-beacons.py: a copytruncate
+// rotation keeps the inode but replaces the first line
+function firstLineHash($path) {
+    $fh = fopen($path, 'rb');
+    if (!$fh) return null;
+    $line = fgets($fh, 64 * 1024 + 1);
+    fclose($fh);
+    return ($line !== false && substr($line, -1) === "\n") ? sha1($line) : null;
+}
 
-    if (($event === 'stream-play' || $event === 'daily-stream') && $detail) {
-        $streams[$detail] = ($streams[$detail] ?? 0) + 1;
+$dayFiles = glob($rollupDir . '/*.json') ?: [];
+sort($dayFiles);
+foreach ($dayFiles as $file) {
+    if (basename($file) === 'state.json') continue;
+    $r = json_decode(file_get_contents($file), true);
+    if (!$r) continue;
+    $total += $r['total'];
+    addCounts($ips, $r['ips']);
+    addCounts($nicks, $r['nicks']);
+    addCounts($events, $r['events']);
+    addCounts($streams, $r['streams']);
+    addCounts($mixes, $r['mixes']);
+    addCounts($sources, $r['sources']);
+    $searches = array_merge($searches, $r['searches']);
+    if ($r['day'] !== 'undated') {
+        $days[$r['day']] = $r['total'];
+        if ($r['first'] && !$firstTs) $firstTs = $r['first'];
+        if ($r['last']) $lastTs = $r['last'];
     }
-    if (($event === 'mix-play' || $event === 'daily-mix') && $detail) {
-        $mixes[$detail] = ($mixes[$detail] ?? 0) + 1;
-    }
-    $source = $e['source'] ?? '';
-    if ($source) $sources[$source] = ($sources[$source] ?? 0) + 1;
+}
 
-    if ($event === 'search' && $detail) {
-        $searches[] = ['query' => $detail, 'nick' => $nick, 'ts' => $e['server_ts'] ?? $e['ts'] ?? ''];
+$state = is_file($rollupDir . '/state.json') ? json_decode(file_get_contents($rollupDir . '/state.json'), true) : null;
+$offset = 0;
+if ($state && file_exists($logFile) && fileinode($logFile) === $state['inode'] && filesize($logFile) >= $state['offset']
+        && firstLineHash($logFile) === ($state['head'] ?? null)) {
+    $offset = $state['offset'];
+}
+$pending = 0;
+
+if (file_exists($logFile) && ($fh = fopen($logFile, 'r'))) {
+    fseek($fh, $offset);
+    while (($line = fgets($fh)) !== false) {
+        $e = json_decode($line, true);
+        if (!$e) continue;
+        $pending++;
+        $total++;
+
+        $ip = $e['ip'] ?? 'unknown';
+        $nick = $e['nick'] ?? 'unknown';
+        $event = $e['event'] ?? 'unknown';
+        $detail = $e['detail'] ?? '';
+        $ts = $e['server_ts'] ?? $e['ts'] ?? '';
+        $day = substr($ts, 0, 10);
+
+        $ips[$ip] = ($ips[$ip] ?? 0) + 1;
+        $nicks[$nick] = ($nicks[$nick] ?? 0) + 1;
+        $events[$event] = ($events[$event] ?? 0) + 1;
+        if ($day) $days[$day] = ($days[$day] ?? 0) + 1;
+        if ($ts && !$firstTs) $firstTs = $ts;
+        if ($ts) $lastTs = $ts;
+
+        if (($event === 'stream-play' || $event === 'daily-stream') && $detail) {
+            $streams[$detail] = ($streams[$detail] ?? 0) + 1;
+        }
+        if (($event === 'mix-play' || $event === 'daily-mix') && $detail) {
+            $mixes[$detail] = ($mixes[$detail] ?? 0) + 1;
+        }
+        $source = $e['source'] ?? '';
+        if ($source) $sources[$source] = ($sources[$source] ?? 0) + 1;
+
+        if ($event === 'search' && $detail) {
+            $searches[] = ['query' => $detail, 'nick' => $nick, 'ts' => $ts];
+        }
     }
+    fclose($fh);
 }
 
 arsort($ips);
@@ -67,10 +118,6 @@ arsort($sources);
 ksort($days);
 $searches = array_slice(array_reverse($searches), 0, 30);
 
-// Date range
-$firstTs = $entries[0]['server_ts'] ?? $entries[0]['ts'] ?? null;
-$lastTs = end($entries)['server_ts'] ?? end($entries)['ts'] ?? null;
-
 function h($s) { return htmlspecialchars($s, ENT_QUOTES, 'UTF-8'); }
 
 function renderTable($data, $col1, $col2, $limit = 20) {
@@ -118,6 +165,7 @@ function renderTable($data, $col1, $col2, $limit = 20) {
     · <?= h(substr($firstTs, 0, 10)) ?> → <?= h(substr($lastTs, 0, 10)) ?>
   <?php endif; ?>
   · Log size: <?= file_exists($logFile) ? round(filesize($logFile) / 1024, 1) . ' KB' : '0 KB' ?>
+  · <?= $state ? count($dayFiles) - 1 . ' day rollups, ' . $pending . ' events since ' . h(date('Y-m-d H:i', (int)$state['updated'])) : 'no rollups (run tools/rollup-beacons.py)' ?>
 </p>
 
 <div class="summary">
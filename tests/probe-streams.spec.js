@@ -0,0 +1,90 @@
+import { expect, test } from '@playwright/test';
+import { execFile, spawn } from 'node:child_process';
+import fs from 'node:fs/promises';
+import os from 'node:os';
+import path from 'node:path';
+import { fileURLToPath } from 'node:url';
+import { promisify } from 'node:util';
+
+// Verifies tools/probe-streams.py against the fake Icecast mounts of
+// tools/test-server.js (/__test__/icecast*). The server is started on its own
+// port with a temporary folder as its root, a preset listing one stream per
+// outcome is written there, and the statuses recorded in health.json are
+// checked, along with the icy-br bitrate of the healthy mounts.
+
+const run = promisify(execFile);
+const repoRoot = path.resolve(path.dirname(fileURLToPath(import.meta.url)), '..');
+const python = process.env.PYTHON || 'python3';
+const PORT = 4176;
+const BASE_URL = `http://127.0.0.1:${PORT}`;
+// First-byte delays around probe-streams.py's SLOW_FIRST_BYTE_MS (3000) and
+// the --timeout passed below
+const PROBE_TIMEOUT_SECONDS = 5;
+const SLOW_DELAY_MS = 3500;
+const TIMEOUT_DELAY_MS = 8000;
+
+const STREAMS = {
+  ok: `${BASE_URL}/__test__/icecast.mp3`,
+  playlist: `${BASE_URL}/__test__/icecast.pls`,
+  slow: `${BASE_URL}/__test__/icecast-slow.mp3?delay=${SLOW_DELAY_MS}`,
+  timeout: `${BASE_URL}/__test__/icecast-slow.mp3?delay=${TIMEOUT_DELAY_MS}`,
+  dead: `${BASE_URL}/__test__/icecast-dead.mp3`,
+  notAudio: `${BASE_URL}/notes.txt`,
+  // Nothing listens on port 1, so the connection is refused
+  unreachable: 'http://127.0.0.1:1/stream.mp3'
+};
+
+let fixtureRoot;
+let server;
+
+async function waitForServer() {
+  const deadline = Date.now() + 10_000;
+  while (Date.now() < deadline) {
+    try {
+      const response = await fetch(`${BASE_URL}/notes.txt`);
+      if (response.ok) return;
+    } catch {
+      // Not listening yet
+    }
+    await new Promise(resolve => setTimeout(resolve, 100));
+  }
+  throw new Error(`test-server.js did not start on port ${PORT}`);
+}
+
+test.beforeAll(async () => {
+  fixtureRoot = await fs.mkdtemp(path.join(os.tmpdir(), 'probe-streams-'));
+  await fs.writeFile(path.join(fixtureRoot, 'notes.txt'), 'Not a stream\n');
+  await fs.mkdir(path.join(fixtureRoot, 'streams'));
+  const preset = {
+    name: 'Probe Test',
+    version: 1,
+    streams: Object.entries(STREAMS).map(([name, m3u]) => ({ name, m3u }))
+  };
+  await fs.writeFile(path.join(fixtureRoot, 'streams/test.streams'), JSON.stringify(preset));
+  server = spawn(process.execPath, [path.join(repoRoot, 'tools/test-server.js'), '--port', String(PORT)], {
+    cwd: fixtureRoot,
+    stdio: 'ignore'
+  });
+  await waitForServer();
+});
+
+test.afterAll(async () => {
+  server?.kill();
+  if (fixtureRoot) await fs.rm(fixtureRoot, { recursive: true, force: true });
+});
+
+test('probe-streams.py records the status and ICY bitrate of each stream', async () => {
+  test.setTimeout(60_000);
+  const streamsDir = path.join(fixtureRoot, 'streams');
+  await run(python, [path.join(repoRoot, 'tools/probe-streams.py'), streamsDir, '--timeout', String(PROBE_TIMEOUT_SECONDS)]);
+  const health = JSON.parse(await fs.readFile(path.join(streamsDir, 'health.json'), 'utf8')).streams;
+
+  expect(health[STREAMS.ok]).toMatchObject({ status: 'ok', httpStatus: 200, contentType: 'audio/mpeg', bitrate: 128 });
+  expect(health[STREAMS.playlist]).toMatchObject({ status: 'ok', bitrate: 128, resolvedUrl: STREAMS.ok });
+  expect(health[STREAMS.slow]).toMatchObject({ status: 'slow', bitrate: 128 });
+  expect(health[STREAMS.slow].firstByteMs).toBeGreaterThanOrEqual(SLOW_DELAY_MS - 100);
+  expect(health[STREAMS.timeout].status).toBe('timeout');
+  expect(health[STREAMS.dead]).toMatchObject({ status: 'http-error', httpStatus: 404 });
+  expect(health[STREAMS.notAudio].status).toBe('not-audio');
+  expect(health[STREAMS.unreachable].status).toBe('unreachable');
+});
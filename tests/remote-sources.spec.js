@@ -0,0 +1,185 @@
+import { expect, test } from '@playwright/test';
+import { execFile, spawn } from 'node:child_process';
+import fs from 'node:fs/promises';
+import os from 'node:os';
+import path from 'node:path';
+import { fileURLToPath } from 'node:url';
+import { promisify } from 'node:util';
+
+// Verifies the --remote mode of the generator tools against tools/test-server.js.
+// The server is started on its own port with a temporary folder as its root, so
+// it serves a small mixes/ tree of tagged MP3 fixtures with directory listings
+// and byte ranges. generate-manifest.py --remote must build the same manifests
+// from Range reads of the file headers that a local run writes, and
+// RemoteFile (tools/remote.py) must handle 206 and 416 responses.
+
+const run = promisify(execFile);
+const repoRoot = path.resolve(path.dirname(fileURLToPath(import.meta.url)), '..');
+const python = process.env.PYTHON || 'python3';
+const PORT = 4175;
+const BASE_URL = `http://127.0.0.1:${PORT}`;
+
+// MPEG-1 Layer III 128 kbps 44.1 kHz frames (as in test-server.js's fake
+// Icecast stream); 300 of them span more than one RemoteFile block
+const FRAME_BYTES = 417;
+const FRAME_COUNT = 300;
+
+function id3Frame(id, text) {
+  const body = Buffer.concat([Buffer.from([0]), Buffer.from(text, 'latin1')]);
+  const header = Buffer.alloc(10);
+  header.write(id, 0, 'latin1');
+  header.writeUInt32BE(body.length, 4);
+  return Buffer.concat([header, body]);
+}
+
+function makeMp3({ title, artist }) {
+  const frames = Buffer.concat([id3Frame('TIT2', title), id3Frame('TPE1', artist)]);
+  const tag = Buffer.alloc(10);
+  tag.write('ID3', 0, 'latin1');
+  tag[3] = 3;
+  // Syncsafe size: 7 bits per byte
+  for (let i = 0; i < 4; i += 1) {
+    tag[6 + i] = (frames.length >> (7 * (3 - i))) & 0x7f;
+  }
+  const audio = Buffer.alloc(FRAME_BYTES * FRAME_COUNT);
+  for (let i = 0; i < FRAME_COUNT; i += 1) {
+    audio.writeUInt32BE(0xfffb9064, i * FRAME_BYTES);
+  }
+  return { data: Buffer.concat([tag, frames, audio]), audioBytes: audio.length };
+}
+
+const FIXTURES = {
+  'mixes/djone/alpha.mp3': makeMp3({ title: 'Alpha Mix', artist: 'DJ One' }),
+  'mixes/moreDJs/djtwo/beta.mp3': makeMp3({ title: 'Beta Mix', artist: 'DJ Two' })
+};
+
+let fixtureRoot;
+let server;
+
+async function waitForServer() {
+  const deadline = Date.now() + 10_000;
+  while (Date.now() < deadline) {
+    try {
+      const response = await fetch(`${BASE_URL}/mixes/`);
+      if (response.ok) return;
+    } catch {
+      // Not listening yet
+    }
+    await new Promise(resolve => setTimeout(resolve, 100));
+  }
+  throw new Error(`test-server.js did not start on port ${PORT}`);
+}
+
+test.beforeAll(async () => {
+  fixtureRoot = await fs.mkdtemp(path.join(os.tmpdir(), 'remote-sources-'));
+  for (const [name, { data }] of Object.entries(FIXTURES)) {
+    await fs.mkdir(path.join(fixtureRoot, path.dirname(name)), { recursive: true });
+    await fs.writeFile(path.join(fixtureRoot, name), data);
+  }
+  await fs.writeFile(path.join(fixtureRoot, 'mixes/djone/empty.bin'), Buffer.alloc(0));
+  server = spawn(process.execPath, [path.join(repoRoot, 'tools/test-server.js'), '--port', String(PORT)], {
+    cwd: fixtureRoot,
+    stdio: 'ignore'
+  });
+  await waitForServer();
+});
+
+test.afterAll(async () => {
+  server?.kill();
+  if (fixtureRoot) await fs.rm(fixtureRoot, { recursive: true, force: true });
+});
+
+test('test-server answers Range requests with 206 and unsatisfiable ones with 416', async () => {
+  const { data } = FIXTURES['mixes/djone/alpha.mp3'];
+  const url = `${BASE_URL}/mixes/djone/alpha.mp3`;
+
+  const partial = await fetch(url, { headers: { Range: 'bytes=3-9' } });
+  expect(partial.status).toBe(206);
+  expect(partial.headers.get('content-range')).toBe(`bytes 3-9/${data.length}`);
+  expect(Buffer.from(await partial.arrayBuffer())).toEqual(data.subarray(3, 10));
+
+  const suffix = await fetch(url, { headers: { Range: 'bytes=-4' } });
+  expect(suffix.status).toBe(206);
+  expect(Buffer.from(await suffix.arrayBuffer())).toEqual(data.subarray(data.length - 4));
+
+  const beyond = await fetch(url, { headers: { Range: `bytes=${data.length}-` } });
+  expect(beyond.status).toBe(416);
+  expect(beyond.headers.get('content-range')).toBe(`bytes */${data.length}`);
+});
+
+test('RemoteFile reads across blocks and treats 416 as end of file', async () => {
+  const script = `
+import json, sys
+sys.path.insert(0, 'tools')
+from remote import BLOCK_SIZE, RemoteFile, Session
+
+base = sys.argv[1]
+with Session() as session:
+    with RemoteFile(session, base + '/mixes/djone/alpha.mp3') as f:
+        head = f.read(10)
+        f.seek(BLOCK_SIZE - 5)
+        straddle = f.read(10)
+        f.seek(-4, 2)
+        tail = f.read()
+        f.seek(f.size + 100)
+        past_end = f.read(10)
+        size = f.size
+    with RemoteFile(session, base + '/mixes/djone/empty.bin') as f:
+        empty = f.read(10)
+        empty_size = f.size
+print(json.dumps({'blockSize': BLOCK_SIZE, 'head': head.hex(), 'straddle': straddle.hex(), 'tail': tail.hex(),
+                  'pastEnd': past_end.hex(), 'size': size, 'empty': empty.hex(), 'emptySize': empty_size}))
+`;
+  const { stdout } = await run(python, ['-c', script, BASE_URL], { cwd: repoRoot });
+  const result = JSON.parse(stdout);
+  const { data } = FIXTURES['mixes/djone/alpha.mp3'];
+
+  expect(result.size).toBe(data.length);
+  expect(result.head).toBe(data.subarray(0, 10).toString('hex'));
+  expect(result.straddle).toBe(data.subarray(result.blockSize - 5, result.blockSize + 5).toString('hex'));
+  expect(result.tail).toBe(data.subarray(data.length - 4).toString('hex'));
+  expect(result.pastEnd).toBe('');
+  // A zero-length file answers every Range request with 416
+  expect(result.empty).toBe('');
+  expect(result.emptySize).toBe(0);
+});
+
+test('generate-manifest.py --remote writes manifests from the remote headers', async () => {
+  const outDir = path.join(fixtureRoot, 'out');
+  await run(python, [path.join(repoRoot, 'tools/generate-manifest.py'), '--remote', `${BASE_URL}/mixes/`, outDir], {
+    cwd: fixtureRoot,
+    env: { ...process.env, MIX_CATALOG: path.join(fixtureRoot, 'catalog.sqlite') }
+  });
+
+  const expected = [
+    ['djone', 'alpha', 'Alpha Mix', 'DJ One'],
+    ['moreDJs/djtwo', 'beta', 'Beta Mix', 'DJ Two']
+  ];
+  for (const [folder, file, name, artist] of expected) {
+    const manifest = JSON.parse(await fs.readFile(path.join(outDir, folder, 'manifest.json'), 'utf8'));
+    expect(manifest.mixes).toHaveLength(1);
+    const [mix] = manifest.mixes;
+    expect(mix).toMatchObject({ name, artist, file, audioFile: `${file}.mp3` });
+    expect(mix.downloads.map(d => d.file)).toEqual([`${file}.mp3`]);
+    // No Xing header, so the duration is estimated from the 128 kbps bitrate
+    const seconds = FIXTURES[`mixes/${folder}/${file}.mp3`].audioBytes * 8 / 128_000;
+    expect(Math.abs(mix.duration - seconds)).toBeLessThan(0.1);
+  }
+});
+
+test('local and remote runs of generate-manifest.py agree on tags and durations', async () => {
+  const remoteDir = path.join(fixtureRoot, 'out-remote');
+  const env = { ...process.env, MIX_CATALOG: path.join(fixtureRoot, 'catalog.sqlite') };
+  await run(python, [path.join(repoRoot, 'tools/generate-manifest.py'), '--remote', `${BASE_URL}/mixes/`, remoteDir],
+    { cwd: fixtureRoot, env });
+  // A local run writes manifest.json next to the audio
+  await run(python, [path.join(repoRoot, 'tools/generate-manifest.py'), path.join(fixtureRoot, 'mixes')],
+    { cwd: fixtureRoot, env });
+
+  const pick = ({ name, artist, duration }) => ({ name, artist, duration });
+  for (const folder of ['djone', 'moreDJs/djtwo']) {
+    const remote = JSON.parse(await fs.readFile(path.join(remoteDir, folder, 'manifest.json'), 'utf8'));
+    const local = JSON.parse(await fs.readFile(path.join(fixtureRoot, 'mixes', folder, 'manifest.json'), 'utf8'));
+    expect(local.mixes.map(pick)).toEqual(remote.mixes.map(pick));
+  }
+});
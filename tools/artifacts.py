@@ -0,0 +1,98 @@
+"""
+Content-addressed names for derived artifacts, for long-lived HTTP caching.
+
+With --hashed, generate-peaks.py writes <mix>.<hash>.peaks.json, where hash
+is the first HASH_CHARS hex digits of the SHA-256 of the file's content,
+instead of <mix>.peaks.json (shared covers, cover.<hash>.<ext>, and sprite
+atlases, covers.sprite.<hash>.webp, were already named this way by
+generate-covers.py). A changed artifact gets a new name, so .htaccess can
+serve these files as immutable and only the small manifests that point at
+them need revalidating.
+
+generate-manifest.py points each mix at the newest version (peaksFile) and
+deletes superseded versions once they are older than GRACE_SECONDS, so a
+client holding a stale manifest still finds the files it names;
+generate-covers.py does the same for sprite atlases.
+"""
+
+import hashlib
+import os
+import re
+import time
+from pathlib import Path
+
+HASH_CHARS = 16
+GRACE_SECONDS = 7 * 24 * 3600
+PEAKS_SUFFIX = '.peaks.json'
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_CHARS]
+
+
+def hashed_pattern(suffix):
+    """Regex matching <base>.<hash><suffix>, with groups base and hash."""
+    return re.compile(rf'^(?P<base>.+)\.(?P<hash>[0-9a-f]{{{HASH_CHARS}}}){re.escape(suffix)}$')
+
+
+def write_hashed(folder, base_name, suffix, data):
+    """
+    Write data (bytes) as <base_name>.<hash><suffix> in folder; returns the file name.
+
+    An existing file with the same name already holds the same content, so it
+    is only touched, which keeps it the newest version for latest_versions().
+    """
+    path = Path(folder) / f"{base_name}.{content_hash(data)}{suffix}"
+    if path.exists():
+        os.utime(path)
+    else:
+        temp_path = path.with_name(path.name + '.tmp')
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    return path.name
+
+
+def hashed_versions(folder, suffix):
+    """Return {base_name: [(mtime, name), ...]} for the hashed files in folder, newest first."""
+    pattern = hashed_pattern(suffix)
+    versions = {}
+    folder = Path(folder)
+    if not folder.is_dir():
+        return versions
+    for entry in os.scandir(folder):
+        match = pattern.match(entry.name)
+        if match and entry.is_file():
+            versions.setdefault(match['base'], []).append((entry.stat().st_mtime, entry.name))
+    for entries in versions.values():
+        entries.sort(reverse=True)
+    return versions
+
+
+def latest_versions(folder, suffix):
+    """Return {base_name: name of the newest hashed file}."""
+    return {base: entries[0][1] for base, entries in hashed_versions(folder, suffix).items()}
+
+
+def collect_garbage(folder, suffix, keep, grace=GRACE_SECONDS, base=None):
+    """
+    Delete hashed files in folder that are not in keep and older than grace seconds.
+
+    With base, only <base>.<hash><suffix> files are considered. Returns
+    (files_removed, bytes_freed). Files without a hash in their name are
+    never touched.
+    """
+    removed = freed = 0
+    cutoff = time.time() - grace
+    for name_base, entries in hashed_versions(folder, suffix).items():
+        if base is not None and name_base != base:
+            continue
+        for mtime, name in entries:
+            if name in keep or mtime > cutoff:
+                continue
+            path = Path(folder) / name
+            size = path.stat().st_size
+            path.unlink(missing_ok=True)
+            removed += 1
+            freed += size
+    return removed, freed
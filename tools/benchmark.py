@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Benchmark the audio tools against synthetic media and check their output.
+Requires: ffmpeg, ffprobe (with libmp3lame, aac, flac and libopus encoders)
+
+Usage:
+    ./tools/benchmark.py [options]
+
+Options:
+    --durations LIST     Fixture lengths in seconds (default 60,600,3600,21600)
+    --quick              Same as --durations 60,600
+    --formats LIST       Fixture formats (default mp3,flac,m4a,opus)
+    --repeat N           Timed runs per benchmark; the median is reported (default 3)
+    --output FILE        Results JSON (default tools/.bench/results.json)
+    --baseline FILE      Earlier results JSON; medians more than --threshold
+                         slower are reported as regressions
+    --threshold X        Allowed slowdown against the baseline (default 0.25 = 25%)
+    --update-golden      Rewrite tools/benchmark-golden.json from this run
+
+Fixtures are generated once with ffmpeg lavfi sources into tools/.bench/:
+a 440Hz tone with a slow volume swell (so peaks have shape), tagged with
+title/artist/genre/date/comment, with an embedded 600x600 JPEG cover
+(MP3, FLAC and M4A; Ogg Opus cannot carry an attached picture through
+ffmpeg). Existing fixtures are reused, so only the first run with the
+6-hour fixtures pays for encoding them.
+
+Per-function benchmarks time get_audio_peaks (generate-peaks.py),
+get_audio_metadata (generate-manifest.py), read_cover (generate-covers.py)
+and mediatags.read_tags on every fixture. End-to-end benchmarks run
+generate-manifest, generate-peaks, generate-covers (each with --stats, so the
+per-stage breakdown lands in the results) over the fixture folder, and
+generate-search-index over a synthetic tree of 200 DJs x 50 mixes.
+
+Outputs are compared with tools/benchmark-golden.json: tags exactly,
+durations within 0.5s, peaks within 0.05 per value, the search index by
+hash, the manifest without the fields that change with the encoder
+build (see ENCODER_FIELDS). Extracted covers must match the embedded JPEG
+byte for byte. Exits non-zero on a golden mismatch, on an output that has
+no golden yet (run once with --update-golden on a host with the full
+ffmpeg build to record it) or on a regression, so it can gate a deploy.
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+TOOLS_DIR = Path(__file__).resolve().parent
+BENCH_DIR = TOOLS_DIR / '.bench'
+GOLDEN_PATH = TOOLS_DIR / 'benchmark-golden.json'
+
+DURATIONS = (60, 600, 3600, 21600)
+QUICK_DURATIONS = (60, 600)
+FORMATS = ('mp3', 'flac', 'm4a', 'opus')
+REPEAT = 3
+THRESHOLD = 0.25
+DURATION_TOLERANCE = 0.5
+PEAK_TOLERANCE = 0.05
+SEARCH_DJS = 200
+SEARCH_MIXES = 50
+FIXTURE_DJ = 'benchdj'
+
+TAGS = {
+    'title': 'Benchmark Mix',
+    'artist': 'Bench DJ',
+    'genre': 'Test Tone',
+    'date': '2024',
+    'comment': 'Generated by tools/benchmark.py',
+}
+ENCODERS = {
+    'mp3': ['-c:a', 'libmp3lame', '-b:a', '192k', '-id3v2_version', '3'],
+    'flac': ['-c:a', 'flac'],
+    'm4a': ['-c:a', 'aac', '-b:a', '160k'],
+    'opus': ['-c:a', 'libopus', '-b:a', '96k'],
+}
+COVER_FORMATS = {'mp3', 'flac', 'm4a'}
+# Manifest fields that depend on the encoder's output bytes or padding, left
+# out of the golden outputs: mix fields, then fields of each download
+ENCODER_FIELDS = ('duration', 'durationFormatted')
+ENCODER_DOWNLOAD_FIELDS = ('bytes', 'sha256')
+
+
+def load_tool(filename):
+    """Import a hyphenated tool script as a module."""
+    name = filename.replace('-', '_').removesuffix('.py')
+    spec = importlib.util.spec_from_file_location(name, TOOLS_DIR / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def sha256_file(path):
+    """Hex SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def ffmpeg(args):
+    """Run ffmpeg quietly, raising on failure."""
+    result = subprocess.run(['ffmpeg', '-v', 'error', '-y'] + args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode('utf-8', 'replace')[:300])
+
+
+def make_cover(path):
+    """Write a 600x600 test-pattern JPEG."""
+    if not path.exists():
+        ffmpeg(['-f', 'lavfi', '-i', 'testsrc=size=600x600:rate=1', '-frames:v', '1', '-q:v', '4', str(path)])
+    return path
+
+
+def make_fixture(folder, fmt, duration, cover):
+    """Generate one tagged fixture, reusing it if it already exists."""
+    path = folder / f"bench-{duration}s.{fmt}"
+    if path.exists():
+        return path
+    source = f"sine=frequency=440:sample_rate=44100:duration={duration},volume='0.2+0.7*abs(sin(PI*t/30))':eval=frame"
+    args = ['-f', 'lavfi', '-i', source]
+    if fmt in COVER_FORMATS:
+        args += ['-i', str(cover), '-map', '0:a', '-map', '1:v', '-c:v', 'copy', '-disposition:v', 'attached_pic']
+    args += ENCODERS[fmt]
+    for name, value in TAGS.items():
+        args += ['-metadata', f"{name}={value}"]
+    temp = path.with_name(f".tmp-{path.name}")
+    started = time.perf_counter()
+    ffmpeg(args + [str(temp)])
+    temp.rename(path)
+    print(f"  Generated {path.name} in {time.perf_counter() - started:.1f}s")
+    return path
+
+
+def make_search_tree(root):
+    """Write a synthetic mixes/ tree of manifests for the search-index benchmark."""
+    mixes = root / 'mixes'
+    if (mixes / '.complete').exists():
+        return root
+    for d in range(SEARCH_DJS):
+        dj = mixes / ('moreDJs' if d % 4 else '') / f"dj{d:03d}"
+        dj.mkdir(parents=True, exist_ok=True)
+        manifest = {'generated': True, 'mixes': [
+            {
+                'name': f"Mix {m} by DJ {d}",
+                'file': f"dj{d:03d}-mix{m:02d}",
+                'audioFile': f"dj{d:03d}-mix{m:02d}.mp3",
+                'duration': 3600.0 + m,
+                'durationFormatted': f"1:00:{m:02d}",
+                'artist': f"DJ {d}",
+                'genre': ('Techno', 'House', 'Trance', 'Drum and Bass')[m % 4],
+                'comment': f"Recorded live, set {m}",
+                'downloads': [{'file': f"dj{d:03d}-mix{m:02d}.mp3", 'label': 'MP3'}],
+            }
+            for m in range(SEARCH_MIXES)
+        ]}
+        with open(dj / 'manifest.json', 'w') as f:
+            json.dump(manifest, f, indent=2)
+    (mixes / '.complete').touch()
+    return root
+
+
+def timed(fn, repeat):
+    """Call fn repeat times; return (last_result, [seconds, ...])."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return result, times
+
+
+def summarise(times):
+    """Median/min/max of a list of timings."""
+    return {
+        'runs': [round(t, 4) for t in times],
+        'median': round(statistics.median(times), 4),
+        'min': round(min(times), 4),
+        'max': round(max(times), 4),
+    }
+
+
+def bench_functions(fixtures, cover, repeat):
+    """Time the per-file functions on every fixture; returns (timings, outputs, cover_failures)."""
+    peaks_tool = load_tool('generate-peaks.py')
+    manifest_tool = load_tool('generate-manifest.py')
+    covers_tool = load_tool('generate-covers.py')
+    import mediatags
+
+    cover_hash = sha256_file(cover)
+    timings = {}
+    outputs = {}
+    cover_failures = []
+    for path in fixtures:
+        key = f"{path.suffix[1:]}/{path.stem.split('-')[1]}"
+
+        (peaks, duration), times = timed(lambda: peaks_tool.get_audio_peaks(str(path)), repeat)
+        timings[f"get_audio_peaks/{key}"] = summarise(times)
+        outputs[f"peaks/{key}"] = {'peaks': peaks, 'duration': duration}
+
+        meta, times = timed(lambda: manifest_tool.get_audio_metadata(path), repeat)
+        timings[f"get_audio_metadata/{key}"] = summarise(times)
+        outputs[f"metadata/{key}"] = meta
+
+        data, times = timed(lambda: covers_tool.read_cover(path), repeat)
+        timings[f"read_cover/{key}"] = summarise(times)
+        expected = cover_hash if path.suffix[1:] in COVER_FORMATS else None
+        found = hashlib.sha256(data).hexdigest() if data else None
+        if found != expected:
+            cover_failures.append(f"read_cover/{key}: expected {expected}, got {found}")
+
+        if path.suffix.lower() in mediatags.SUPPORTED_EXTENSIONS:
+            tags, times = timed(lambda: mediatags.read_tags(path), repeat)
+            timings[f"read_tags/{key}"] = summarise(times)
+            outputs[f"tags/{key}"] = tags
+
+        print(f"  {path.name}: peaks {timings[f'get_audio_peaks/{key}']['median']:.3f}s, "
+              f"metadata {timings[f'get_audio_metadata/{key}']['median']:.3f}s, "
+              f"cover {timings[f'read_cover/{key}']['median']:.4f}s")
+    return timings, outputs, cover_failures
+
+
+def run_tool(args, cwd, env):
+    """Run a tool script, raising with its output if it fails."""
+    result = subprocess.run([sys.executable] + args, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    if result.returncode != 0:
+        raise RuntimeError(f"{args[0]} failed:\n{result.stdout.decode('utf-8', 'replace')[-1000:]}")
+
+
+def bench_tools(fixture_root, search_root, repeat):
+    """Time each tool end to end; returns (timings, outputs)."""
+    work = BENCH_DIR / 'work'
+    env = dict(os.environ, MIX_CATALOG=str(work / 'catalog.sqlite'))
+    timings = {}
+    outputs = {}
+
+    runs = {
+        'generate-manifest': ['--source', str(fixture_root), '{out}'],
+        'generate-peaks': ['--force', '--source', str(fixture_root), '{out}'],
+        'generate-covers': ['--source', str(fixture_root), '{out}'],
+    }
+    for tool, args in runs.items():
+        times = []
+        stats = None
+        for _ in range(repeat):
+            # Fresh output folder and catalog each run so every run is cold
+            shutil.rmtree(work, ignore_errors=True)
+            out = work / 'out'
+            out.mkdir(parents=True)
+            stats_path = work / 'stats.json'
+            cmd = [str(TOOLS_DIR / f"{tool}.py")] + [a.replace('{out}', str(out)) for a in args]
+            started = time.perf_counter()
+            run_tool(cmd + ['--stats', str(stats_path)], work, env)
+            times.append(time.perf_counter() - started)
+            with open(stats_path) as f:
+                stats = json.load(f)
+        timings[tool] = dict(summarise(times), stats={k: stats[k] for k in ('stages', 'bytesRead', 'bytesWritten', 'peakRss')})
+        print(f"  {tool}: {timings[tool]['median']:.2f}s")
+
+    manifest_path = work / 'out' / 'moreDJs' / FIXTURE_DJ / 'manifest.json'
+    shutil.rmtree(work, ignore_errors=True)
+    work.mkdir(parents=True)
+    run_tool([str(TOOLS_DIR / 'generate-manifest.py'), '--source', str(fixture_root), str(work / 'out')], work, env)
+    with open(manifest_path) as f:
+        outputs['manifest'] = [golden_mix(mix) for mix in json.load(f)['mixes']]
+
+    search_cmd = [str(TOOLS_DIR / 'generate-search-index.py'), str(search_root)]
+    _, times = timed(lambda: run_tool(search_cmd, search_root, env), repeat)
+    timings['generate-search-index'] = summarise(times)
+    outputs['search-index'] = sha256_file(search_root / 'mixes' / 'search-index.json')
+    print(f"  generate-search-index: {timings['generate-search-index']['median']:.2f}s "
+          f"({SEARCH_DJS} DJs x {SEARCH_MIXES} mixes)")
+    return timings, outputs
+
+
+def golden_mix(mix):
+    """A manifest mix entry without its ENCODER_FIELDS and ENCODER_DOWNLOAD_FIELDS."""
+    entry = {k: v for k, v in mix.items() if k not in ENCODER_FIELDS}
+    entry['downloads'] = [{k: v for k, v in download.items() if k not in ENCODER_DOWNLOAD_FIELDS}
+                          for download in mix.get('downloads', [])]
+    return entry
+
+
+def compare_golden(outputs, golden):
+    """Return a list of mismatches between this run's outputs and the golden outputs."""
+    failures = []
+    for key, expected in sorted(golden.items()):
+        if key not in outputs:
+            continue  # fixture not part of this run
+        actual = outputs[key]
+        if key.startswith('peaks/'):
+            if abs(actual['duration'] - expected['duration']) > DURATION_TOLERANCE:
+                failures.append(f"{key}: duration {actual['duration']} != {expected['duration']}")
+            elif not actual['peaks'] or len(actual['peaks']) != len(expected['peaks']):
+                failures.append(f"{key}: {len(actual['peaks'] or [])} peaks != {len(expected['peaks'])}")
+            else:
+                worst = max(abs(a - b) for a, b in zip(actual['peaks'], expected['peaks']))
+                if worst > PEAK_TOLERANCE:
+                    failures.append(f"{key}: peaks differ by up to {worst:.3f}")
+        elif key.startswith('metadata/'):
+            for field, value in expected.items():
+                if field == 'duration':
+                    if abs((actual or {}).get('duration', 0) - value) > DURATION_TOLERANCE:
+                        failures.append(f"{key}: duration {(actual or {}).get('duration')} != {value}")
+                elif (actual or {}).get(field) != value:
+                    failures.append(f"{key}: {field} {(actual or {}).get(field)!r} != {value!r}")
+        elif actual != expected:
+            failures.append(f"{key}: output differs from golden")
+    return failures
+
+
+def compare_baseline(results, baseline, threshold):
+    """Return regressions: benchmarks whose median grew by more than threshold."""
+    regressions = []
+    for section in ('functions', 'tools'):
+        for name, current in results[section].items():
+            previous = baseline.get(section, {}).get(name)
+            if not previous or previous['median'] <= 0:
+                continue
+            change = current['median'] / previous['median'] - 1
+            if change > threshold:
+                regressions.append({'benchmark': f"{section}/{name}", 'baseline': previous['median'],
+                                    'median': current['median'], 'change': round(change, 3)})
+    return regressions
+
+
+def parse_args(argv):
+    """Parse command-line options into a dict."""
+    options = {'durations': DURATIONS, 'formats': FORMATS, 'repeat': REPEAT, 'threshold': THRESHOLD,
+               'output': BENCH_DIR / 'results.json', 'baseline': None, 'update_golden': False}
+    i = 0
+    while i < len(argv):
+        name, eq, value = argv[i].partition('=')
+        if name in ('--durations', '--formats', '--repeat', '--output', '--baseline', '--threshold') and not eq:
+            if i + 1 >= len(argv):
+                print(f"Error: {name} requires a value")
+                sys.exit(1)
+            value = argv[i + 1]
+            i += 1
+        if name == '--durations':
+            options['durations'] = tuple(int(d) for d in value.split(','))
+        elif name == '--quick':
+            options['durations'] = QUICK_DURATIONS
+        elif name == '--formats':
+            options['formats'] = tuple(f for f in value.split(',') if f in ENCODERS)
+        elif name == '--repeat':
+            options['repeat'] = max(1, int(value))
+        elif name == '--output':
+            options['output'] = Path(value)
+        elif name == '--baseline':
+            options['baseline'] = Path(value)
+        elif name == '--threshold':
+            options['threshold'] = float(value)
+        elif name == '--update-golden':
+            options['update_golden'] = True
+        else:
+            print(f"Error: unknown option {argv[i]}")
+            sys.exit(1)
+        i += 1
+    return options
+
+
+def main():
+    options = parse_args(sys.argv[1:])
+    if not shutil.which('ffmpeg') or not shutil.which('ffprobe'):
+        print("Error: ffmpeg and ffprobe are required")
+        sys.exit(1)
+    sys.path.insert(0, str(TOOLS_DIR))
+
+    cache = BENCH_DIR / 'fixtures'
+    cache.mkdir(parents=True, exist_ok=True)
+    print("Generating fixtures...")
+    cover = make_cover(BENCH_DIR / 'cover.jpg')
+    fixtures = [make_fixture(cache, fmt, d, cover)
+                for d in options['durations'] for fmt in options['formats']]
+
+    # The tools scan whole folders, so link this run's fixtures into their own DJ folder
+    fixture_root = BENCH_DIR / 'run'
+    shutil.rmtree(fixture_root, ignore_errors=True)
+    (fixture_root / FIXTURE_DJ).mkdir(parents=True)
+    for fixture in fixtures:
+        (fixture_root / FIXTURE_DJ / fixture.name).symlink_to(fixture)
+    search_root = make_search_tree(BENCH_DIR / 'search')
+
+    print(f"\nFunctions ({options['repeat']} runs each)...")
+    function_timings, outputs, cover_failures = bench_functions(fixtures, cover, options['repeat'])
+
+    print(f"\nTools ({options['repeat']} runs each)...")
+    tool_timings, tool_outputs = bench_tools(fixture_root, search_root, options['repeat'])
+    outputs.update(tool_outputs)
+
+    version = subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE).stdout.decode().splitlines()[0]
+    results = {
+        'generated': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'host': platform.node(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'ffmpeg': version,
+        'cpus': os.cpu_count(),
+        'durations': list(options['durations']),
+        'formats': list(options['formats']),
+        'functions': function_timings,
+        'tools': tool_timings,
+    }
+
+    failures = list(cover_failures)
+    missing = []
+    if options['update_golden']:
+        golden = {}
+        if GOLDEN_PATH.exists():
+            with open(GOLDEN_PATH) as f:
+                golden = json.load(f)
+        golden.update(outputs)
+        with open(GOLDEN_PATH, 'w') as f:
+            json.dump(golden, f, indent=1, sort_keys=True)
+        print(f"\nUpdated {GOLDEN_PATH.name} ({len(outputs)} outputs)")
+    elif GOLDEN_PATH.exists():
+        with open(GOLDEN_PATH) as f:
+            golden = json.load(f)
+        failures += compare_golden(outputs, golden)
+        missing = sorted(set(outputs) - set(golden))
+    else:
+        missing = sorted(outputs)
+    results['golden'] = {'failures': failures, 'missing': missing}
+
+    regressions = []
+    if options['baseline']:
+        with open(options['baseline']) as f:
+            regressions = compare_baseline(results, json.load(f), options['threshold'])
+    results['regressions'] = regressions
+
+    options['output'].parent.mkdir(parents=True, exist_ok=True)
+    with open(options['output'], 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {options['output']}")
+
+    for failure in failures:
+        print(f"GOLDEN MISMATCH {failure}")
+    if missing:
+        print(f"GOLDEN MISSING {len(missing)} outputs not in {GOLDEN_PATH.name} ({', '.join(missing[:4])}"
+              f"{', ...' if len(missing) > 4 else ''}); run with --update-golden to record them")
+    for regression in regressions:
+        print(f"REGRESSION {regression['benchmark']}: {regression['baseline']:.3f}s -> "
+              f"{regression['median']:.3f}s (+{regression['change'] * 100:.0f}%)")
+    if failures or missing or regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+"""
+Persistent catalog of audio files shared by the generator tools.
+
+Backed by a SQLite database (tools/.catalog.sqlite, or $MIX_CATALOG) that records, for every
+audio file a tool has looked at:
+
+    path          absolute path of the audio file
+    dj            DJ folder name
+    routing       'main' (mixes/<dj>) or 'moreDJs' (mixes/moreDJs/<dj>)
+    size, mtime   from stat(); a change triggers a fingerprint check
+    fingerprint   SHA-1 of the size plus the first and last 64KB
+    tags          probed text tags (JSON), duration in seconds
+    artifacts     files derived from it (peaks, covers, ...) with the
+                  fingerprint they were derived from
+    checksums     SHA-256 of the whole file, valid for the size and mtime
+                  it was computed at
+
+Tags are probed at most once per file version across all tools: a file whose
+size and mtime are unchanged is never re-read. Any change of size or mtime
+drops the cached tags and duration, since a tag edit can rewrite bytes the
+fingerprint does not cover; a file with the same fingerprint keeps its
+content-keyed artifacts (e.g. the PCM cache). A whole-file checksum is only
+recomputed when the size or mtime changes.
+
+Also home to the config and DJ folder discovery shared by the tools.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import mediatags
+import supervise
+import toolstats
+
+AUDIO_EXTENSIONS = {'.mp3', '.flac', '.m4a', '.opus'}
+RENDITION_PATTERN = re.compile(r'\.(\d+)k\.opus$', re.IGNORECASE)  # <mix>.64k.opus from generate-renditions.py
+CATALOG_PATH = Path(os.environ.get('MIX_CATALOG') or Path(__file__).parent / '.catalog.sqlite')
+FINGERPRINT_BYTES = 64 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path        TEXT PRIMARY KEY,
+    dj          TEXT,
+    routing     TEXT,
+    size        INTEGER NOT NULL,
+    mtime       INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    tags        TEXT,
+    duration    REAL,
+    probed      REAL
+);
+CREATE INDEX IF NOT EXISTS files_dj ON files (dj);
+CREATE TABLE IF NOT EXISTS artifacts (
+    path        TEXT NOT NULL,
+    kind        TEXT NOT NULL,
+    artifact    TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (path, kind)
+);
+CREATE TABLE IF NOT EXISTS checksums (
+    path        TEXT PRIMARY KEY,
+    size        INTEGER NOT NULL,
+    mtime       INTEGER NOT NULL,
+    sha256      TEXT NOT NULL
+);
+"""
+
+
+def load_config():
+    """Load audio source configuration, merging deployed config with local tool config."""
+    config = {}
+    for config_path in [Path('mixes/audio-source-config.json'), Path('tools/tool-config.json')]:
+        if config_path.exists():
+            try:
+                with open(config_path) as f:
+                    config.update(json.load(f))
+            except Exception as e:
+                print(f"Warning: Could not load {config_path}: {e}")
+    return config or None
+
+
+def rendition_bitrate(name):
+    """Bitrate in kbps if name is a generated low-bitrate rendition, else None."""
+    match = RENDITION_PATTERN.search(str(name))
+    return int(match.group(1)) if match else None
+
+
+def find_dj_directories(base_directory, extensions=AUDIO_EXTENSIONS):
+    """Find all directories containing audio files, including nested ones in moreDJs/."""
+    dj_dirs = []
+    for entry in Path(base_directory).iterdir():
+        if entry.is_dir() and not entry.name.startswith('.'):
+            folders = [s for s in entry.iterdir() if s.is_dir()] if entry.name == 'moreDJs' else [entry]
+            for folder in folders:
+                if any(f.suffix.lower() in extensions for f in folder.iterdir() if f.is_file()):
+                    dj_dirs.append(folder)
+    return sorted(dj_dirs, key=lambda p: p.name.lower())
+
+
+def resolve_dj_folders(directory=None, djs=(), source=None, config=None, extensions=AUDIO_EXTENSIONS):
+    """
+    Return [(name, source_folder, output_folder)] the way the generator tools pick folders.
+
+    With a source directory (argument or config source_directory) each DJ
+    folder in it is read and written to its routed output folder under
+    directory (default mixes/); otherwise DJ folders under directory
+    (default .) are used in place. djs limits the result to those names.
+    Exits with an error message when a folder is missing.
+    """
+    output_dir = Path(directory) if directory else None
+    source_dir = Path(source) if source else None
+    if source_dir is None and config and 'source_directory' in config:
+        source_dir = Path(config['source_directory'])
+        if output_dir is None:
+            output_dir = Path('mixes')
+            print(f"No output directory specified, defaulting to: {output_dir}")
+    output_dir = output_dir or Path('.')
+
+    if source_dir:
+        if not source_dir.exists():
+            raise SystemExit(f"Error: source directory {source_dir} does not exist")
+        main_djs = config.get('main_djs', []) if config else []
+        return [(folder.name, folder, routed_output(folder.name, output_dir, main_djs)[1])
+                for folder in sorted(source_dir.iterdir())
+                if folder.is_dir() and not folder.name.startswith('.') and (not djs or folder.name in djs)]
+
+    if djs:
+        for dj in djs:
+            if not (output_dir / dj).is_dir():
+                raise SystemExit(f"Error: DJ folder not found: {dj}")
+        return [(dj, output_dir / dj, output_dir / dj) for dj in djs]
+    return [(str(folder.relative_to(output_dir)), folder, folder)
+            for folder in find_dj_directories(output_dir, extensions)]
+
+
+def routed_output(dj, output_dir, main_djs):
+    """Return (routing, output_folder) for a DJ: main DJs in output_dir/, others in output_dir/moreDJs/."""
+    if dj in main_djs:
+        return 'main', Path(output_dir) / dj
+    return 'moreDJs', Path(output_dir) / 'moreDJs' / dj
+
+
+def folder_routing(folder):
+    """Routing of an in-place DJ folder, from its position under moreDJs/."""
+    return 'moreDJs' if Path(folder).parent.name == 'moreDJs' else 'main'
+
+
+def fingerprint(path, size=None):
+    """SHA-1 of the file size and its first and last FINGERPRINT_BYTES."""
+    size = Path(path).stat().st_size if size is None else size
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_BYTES))
+        if size > FINGERPRINT_BYTES:
+            f.seek(max(FINGERPRINT_BYTES, size - FINGERPRINT_BYTES))
+            digest.update(f.read(FINGERPRINT_BYTES))
+    return digest.hexdigest()
+
+
+def file_sha256(path):
+    """SHA-256 of a whole file, hashed from a memory map (hashlib drops the GIL, so threads hash in parallel)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if hasattr(data, 'madvise'):
+                    data.madvise(mmap.MADV_SEQUENTIAL)
+                digest.update(data)
+    return digest.hexdigest()
+
+
+def probe_tags(path):
+    """Read text tags from the container header, without a duration."""
+    return mediatags.read_tags(path)
+
+
+def probe_ffprobe(path):
+    """Return (tags, duration) from ffprobe, with tag names lower-cased."""
+    result = supervise.run(
+        ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', str(path)],
+        stage='probe'
+    )
+    data = json.loads(result.stdout.decode('utf-8'))
+    fmt = data.get('format', {})
+    tags = {}
+    for name, value in fmt.get('tags', {}).items():
+        tags.setdefault(name.lower(), value)
+    return tags, float(fmt.get('duration', 0))
+
+
+def probe_metadata(path, f=None, url=None):
+    """
+    Return (tags, duration) read natively from the container header.
+
+    f is an optional seekable file object to read instead of path (see
+    mediatags.read_tags()). Containers mediatags cannot parse fall back to
+    ffprobe on url, or on path, so local and remote files get the same tags
+    and durations.
+    """
+    try:
+        with toolstats.stage('probe'):
+            return mediatags.read_tags(path, f), mediatags.read_duration(path, f)
+    except mediatags.TagError:
+        return probe_ffprobe(url or path)
+
+
+class Catalog:
+    """SQLite-backed file catalog; safe to share between threads."""
+
+    def __init__(self, path=CATALOG_PATH):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.db.commit()
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _row(self, key):
+        return self.db.execute('SELECT * FROM files WHERE path = ?', (key,)).fetchone()
+
+    def refresh(self, path, dj=None, routing=None):
+        """
+        Bring a file's row up to date with the file on disk and return it.
+
+        Unchanged size/mtime: the row is returned as is. Otherwise the cached
+        tags and duration are dropped so the next lookup probes again; the
+        fingerprint is recomputed, and artifacts recorded against it stay
+        valid while it matches.
+        """
+        path = Path(path)
+        key = str(path.resolve())
+        st = path.stat()
+        with self.lock:
+            row = self._row(key)
+            if row and row['size'] == st.st_size and row['mtime'] == st.st_mtime_ns:
+                if (dj and row['dj'] != dj) or (routing and row['routing'] != routing):
+                    self.db.execute('UPDATE files SET dj = coalesce(?, dj), routing = coalesce(?, routing) WHERE path = ?',
+                                    (dj, routing, key))
+                    self.db.commit()
+                    row = self._row(key)
+                return row
+
+        digest = fingerprint(path, st.st_size)
+        with self.lock:
+            row = self._row(key)
+            if row and row['fingerprint'] == digest:
+                self.db.execute('UPDATE files SET size = ?, mtime = ?, tags = NULL, duration = NULL, probed = NULL, '
+                                'dj = coalesce(?, dj), routing = coalesce(?, routing) WHERE path = ?',
+                                (st.st_size, st.st_mtime_ns, dj, routing, key))
+            else:
+                self.db.execute('INSERT OR REPLACE INTO files (path, dj, routing, size, mtime, fingerprint) '
+                                'VALUES (?, ?, ?, ?, ?, ?)',
+                                (key, dj or (row['dj'] if row else None), routing or (row['routing'] if row else None),
+                                 st.st_size, st.st_mtime_ns, digest))
+            self.db.commit()
+            return self._row(key)
+
+    def metadata(self, path, dj=None, routing=None, need_duration=False):
+        """
+        Return {'tags': {...}, 'duration': seconds_or_None, 'cached': bool} for a file.
+
+        Tags come from the catalog when the file is unchanged; otherwise the
+        container header is read natively, falling back to ffprobe. With
+        need_duration and no cached duration, probe_metadata() reads both.
+        """
+        row = self.refresh(path, dj, routing)
+        tags = json.loads(row['tags']) if row['tags'] is not None else None
+        duration = row['duration']
+        if tags is not None and (duration is not None or not need_duration):
+            return {'tags': tags, 'duration': duration, 'cached': True}
+
+        if tags is None and not need_duration:
+            try:
+                tags = probe_tags(path)
+            except (mediatags.TagError, OSError):
+                tags = None
+        if tags is None or need_duration:
+            tags, duration = probe_metadata(path)
+
+        with self.lock:
+            self.db.execute('UPDATE files SET tags = ?, duration = ?, probed = ? WHERE path = ? AND fingerprint = ?',
+                            (json.dumps(tags, ensure_ascii=False), duration, time.time(),
+                             row['path'], row['fingerprint']))
+            self.db.commit()
+        return {'tags': tags, 'duration': duration, 'cached': False}
+
+    def update_tags(self, path, tags):
+        """
+        Record tags just written to a file.
+
+        The audio is unchanged, so the cached duration is kept and artifacts
+        derived from the previous version are carried over to the new fingerprint.
+        """
+        path = Path(path)
+        key = str(path.resolve())
+        st = path.stat()
+        digest = fingerprint(path, st.st_size)
+        with self.lock:
+            row = self._row(key)
+            if row is None:
+                return
+            merged = json.loads(row['tags']) if row['tags'] is not None else {}
+            merged.update(tags)
+            self.db.execute('UPDATE files SET size = ?, mtime = ?, fingerprint = ?, tags = ?, probed = ? WHERE path = ?',
+                            (st.st_size, st.st_mtime_ns, digest, json.dumps(merged, ensure_ascii=False),
+                             time.time(), key))
+            self.db.execute('UPDATE artifacts SET fingerprint = ? WHERE path = ? AND fingerprint = ?',
+                            (digest, key, row['fingerprint']))
+            self.db.commit()
+
+    def forget_tags(self, path):
+        """Drop a file's cached tags so the next lookup probes it again."""
+        with self.lock:
+            self.db.execute('UPDATE files SET tags = NULL, duration = NULL WHERE path = ?',
+                            (str(Path(path).resolve()),))
+            self.db.commit()
+
+    def record_artifact(self, path, kind, artifact):
+        """Record that artifact (e.g. kind 'peaks') was derived from the current version of path."""
+        row = self.refresh(path)
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO artifacts (path, kind, artifact, fingerprint) VALUES (?, ?, ?, ?)',
+                            (row['path'], kind, str(Path(artifact).resolve()), row['fingerprint']))
+            self.db.commit()
+
+    def artifacts(self, path):
+        """Return {kind: artifact} for artifacts derived from the current version of path."""
+        row = self.refresh(path)
+        with self.lock:
+            rows = self.db.execute('SELECT kind, artifact FROM artifacts WHERE path = ? AND fingerprint = ?',
+                                   (row['path'], row['fingerprint'])).fetchall()
+        return {r['kind']: r['artifact'] for r in rows}
+
+    def checksum(self, path):
+        """
+        Return {'bytes': size, 'sha256': hex digest, 'cached': bool} for a file's whole content.
+
+        The digest is reused while the file's size and mtime are unchanged,
+        so unchanged files are never read again.
+        """
+        path = Path(path)
+        key = str(path.resolve())
+        st = path.stat()
+        with self.lock:
+            row = self.db.execute('SELECT sha256 FROM checksums WHERE path = ? AND size = ? AND mtime = ?',
+                                  (key, st.st_size, st.st_mtime_ns)).fetchone()
+        if row:
+            return {'bytes': st.st_size, 'sha256': row['sha256'], 'cached': True}
+
+        digest = file_sha256(path)
+        after = path.stat()
+        if (after.st_size, after.st_mtime_ns) == (st.st_size, st.st_mtime_ns):  # Not modified while hashing
+            with self.lock:
+                self.db.execute('INSERT OR REPLACE INTO checksums (path, size, mtime, sha256) VALUES (?, ?, ?, ?)',
+                                (key, st.st_size, st.st_mtime_ns, digest))
+                self.db.commit()
+        return {'bytes': after.st_size, 'sha256': digest, 'cached': False}
+
+    def prune(self, folder, present):
+        """Delete rows for files in folder that are no longer on disk; present is the set of live paths."""
+        prefix = str(Path(folder).resolve()) + '/'
+        live = {str(Path(p).resolve()) for p in present}
+        with self.lock:
+            rows = self.db.execute("SELECT path FROM files WHERE substr(path, 1, ?) = ? "
+                                   "UNION SELECT path FROM checksums WHERE substr(path, 1, ?) = ?",
+                                   (len(prefix), prefix, len(prefix), prefix)).fetchall()
+            gone = [(r['path'],) for r in rows if r['path'] not in live and '/' not in r['path'][len(prefix):]]
+            self.db.executemany('DELETE FROM files WHERE path = ?', gone)
+            self.db.executemany('DELETE FROM artifacts WHERE path = ?', gone)
+            self.db.executemany('DELETE FROM checksums WHERE path = ?', gone)
+            self.db.commit()
+        return len(gone)
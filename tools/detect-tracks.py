@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Suggest track boundaries for mixes that have no .tracks.txt.
+Requires: ffmpeg
+
+Usage:
+    ./tools/detect-tracks.py [directory] [dj_name ...]
+    ./tools/detect-tracks.py --source /path/to/audio [directory] [dj_name ...]
+    ./tools/detect-tracks.py --force --pcm-cache --jobs 4 [directory]
+    ./tools/detect-tracks.py --retry-failed [directory]
+
+Folders are found the same way as the other generator tools (see
+resolve_dj_folders() in tools/catalog.py). For each mix without a
+<mix>.tracks.txt, writes <mix>.tracks.json:
+
+    {"duration": 3600.5, "suggested": true,
+     "tracks": [{"start": 0}, {"start": 312.0, "confidence": 0.83}, ...]}
+
+One ffmpeg decode splits the mono signal into BANDS log-spaced bands and
+streams out their mean power at FRAME_RATE, so only a few bytes per second
+of audio reach Python however long the mix. The log levels are averaged
+over WINDOW_SECONDS windows and standardized per band, giving a coarse
+spectral envelope per window. A track change shows up as a point where the
+windows before it are similar to each other and unlike the windows after
+it: the novelty curve is a Gaussian-tapered checkerboard kernel slid along
+the diagonal of the cosine self-similarity matrix. That kernel is separable,
+so it is computed as the squared length of the tapered sum of the following
+windows minus that of the preceding ones, without building the matrix.
+Peaks of the curve at least MIN_TRACK_SECONDS apart and above MIN_NOVELTY of
+the strongest become track starts, with their relative novelty as confidence.
+
+With --pcm-cache, local files are decoded through the shared decoded-PCM
+cache (see tools/pcmcache.py). A .tracks.json is skipped while it is newer
+than its audio, unless --force. ffmpeg runs under tools/supervise.py; files
+that fail are quarantined and skipped until they change, unless
+--retry-failed.
+
+generate-manifest.py sets hasSuggestedTracks on mixes with a .tracks.json
+(and no .tracks.txt), and the player lists the suggested starts as chapters.
+"""
+
+import argparse
+import array
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import supervise
+from catalog import load_config, rendition_bitrate, resolve_dj_folders
+from pcmcache import SAMPLE_FORMAT, SAMPLE_RATE, PCMCache
+
+AUDIO_EXTENSIONS = ('.mp3', '.flac', '.m4a', '.wav', '.opus')
+BAND_RATE = SAMPLE_RATE     # Hz: bands are filtered at the PCM cache's rate
+BANDS = 8                   # Log-spaced bands between LOWEST_HZ and HIGHEST_HZ
+LOWEST_HZ = 60
+HIGHEST_HZ = 5000
+FRAME_RATE = 20             # Band levels per second from ffmpeg
+WINDOW_SECONDS = 2          # Levels are averaged over windows of this length
+KERNEL_WINDOWS = 16         # Windows compared on each side of a candidate boundary
+MIN_TRACK_SECONDS = 90      # Closest two suggested boundaries may be
+MIN_NOVELTY = 0.3           # Boundaries need this fraction of the strongest novelty
+PRECISION = 2               # Decimal digits for confidences
+
+
+def band_edges():
+    """(low, high) cutoffs in Hz of each of BANDS log-spaced bands."""
+    ratio = HIGHEST_HZ / LOWEST_HZ
+    edges = [LOWEST_HZ * ratio ** (i / BANDS) for i in range(BANDS + 1)]
+    return [(round(low), round(high)) for low, high in zip(edges, edges[1:])]
+
+
+def decode_bands(input_args, duration=None, size=None):
+    """
+    Decode with ffmpeg into BANDS channels of mean band power at FRAME_RATE.
+
+    Each channel is the mono signal at BAND_RATE, band-filtered and squared
+    with amultiply in ffmpeg (native, unlike a per-sample aeval expression),
+    so resampling down to FRAME_RATE leaves its mean power. Returns one
+    array of levels per band.
+    """
+    graph = [f"[0:a]aformat=channel_layouts=mono,aresample={BAND_RATE},asplit={BANDS}"
+             + ''.join(f"[in{i}]" for i in range(BANDS))]
+    for i, (low, high) in enumerate(band_edges()):
+        graph.append(f"[in{i}]highpass=f={low},lowpass=f={high},asplit=2[band{i}][copy{i}]")
+        graph.append(f"[band{i}][copy{i}]amultiply,aresample={FRAME_RATE}[out{i}]")
+    graph.append(''.join(f"[out{i}]" for i in range(BANDS)) + f"amerge=inputs={BANDS}[out]")
+
+    result = supervise.run([
+        'ffmpeg', *input_args,
+        '-filter_complex', ';'.join(graph),
+        '-map', '[out]',
+        '-f', 'f32le',  # 32-bit float little-endian, channels interleaved
+        '-v', 'error',
+        '-'
+    ], stage='decode', duration=duration, size=size)
+    stdout = result.stdout
+    if result.returncode != 0 and not stdout:
+        raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip() or f"ffmpeg exited {result.returncode}")
+
+    levels = array.array('f')
+    levels.frombytes(stdout[:len(stdout) // (4 * BANDS) * 4 * BANDS])
+    if sys.byteorder == 'big':
+        levels.byteswap()
+    return [levels[i::BANDS] for i in range(BANDS)]
+
+
+def window_features(bands):
+    """Unit-length vectors of per-band standardized log power, one per WINDOW_SECONDS window."""
+    frames = WINDOW_SECONDS * FRAME_RATE
+    count = len(bands[0]) // frames
+    if not count:
+        return []
+    columns = []
+    for levels in bands:
+        column = [math.log10(max(0, sum(levels[w * frames:(w + 1) * frames]) / frames) + 1e-12) for w in range(count)]
+        mean = sum(column) / count
+        spread = math.sqrt(sum((v - mean) ** 2 for v in column) / count) or 1
+        columns.append([(v - mean) / spread for v in column])
+    features = []
+    for vector in zip(*columns):
+        length = math.sqrt(sum(v * v for v in vector)) or 1
+        features.append([v / length for v in vector])
+    return features
+
+
+def novelty_curve(features, width=KERNEL_WINDOWS):
+    """
+    Checkerboard-kernel novelty at each window boundary of features.
+
+    With the kernel w(a)w(b), w(a) = sign(a) * gaussian(a), over cosine
+    similarities of unit vectors, the novelty at i equals the squared length
+    of sum(w(a) * features[i + a]). Boundaries closer than width to either
+    end score 0.
+    """
+    taper = [math.exp(-0.5 * ((a + 0.5) / (width / 2)) ** 2) for a in range(width)]
+    curve = [0.0] * len(features)
+    dims = len(features[0]) if features else 0
+    for i in range(width, len(features) - width + 1):
+        total = [0.0] * dims
+        for a, weight in enumerate(taper):
+            after, before = features[i + a], features[i - 1 - a]
+            for d in range(dims):
+                total[d] += weight * (after[d] - before[d])
+        curve[i] = sum(t * t for t in total)
+    return curve
+
+
+def pick_boundaries(curve, seconds_per_point=WINDOW_SECONDS):
+    """Return [(seconds, confidence)] of the strongest novelty peaks, MIN_TRACK_SECONDS apart, in time order."""
+    strongest = max(curve, default=0)
+    if strongest <= 0:
+        return []
+    spacing = max(1, int(MIN_TRACK_SECONDS / seconds_per_point))
+    picked = []
+    for i in sorted(range(len(curve)), key=lambda i: -curve[i]):
+        if curve[i] < MIN_NOVELTY * strongest:
+            break
+        if i < spacing or any(abs(i - j) < spacing for j in picked):
+            continue
+        picked.append(i)
+    return [(i * seconds_per_point, round(curve[i] / strongest, PRECISION)) for i in sorted(picked)]
+
+
+def detect_tracks(audio_path, pcm_cache=None):
+    """Return the .tracks.json data for one audio file."""
+    if pcm_cache is not None:
+        with pcm_cache.open(audio_path) as pcm:
+            input_args = ['-f', SAMPLE_FORMAT, '-ar', str(pcm.sample_rate), '-ac', '1', '-i', str(pcm.path)]
+            bands = decode_bands(input_args, duration=pcm.duration)
+    else:
+        bands = decode_bands(['-i', str(audio_path)], size=os.path.getsize(audio_path))
+    if not bands[0]:
+        raise RuntimeError('no samples')
+    duration = round(len(bands[0]) / FRAME_RATE, 1)
+    tracks = [{'start': 0}]
+    for start, confidence in pick_boundaries(novelty_curve(window_features(bands))):
+        if start < duration - MIN_TRACK_SECONDS:
+            tracks.append({'start': start, 'confidence': confidence})
+    return {'duration': duration, 'suggested': True, 'tracks': tracks}
+
+
+def write_tracks(path, data):
+    """Write .tracks.json through a temporary name, so a killed run leaves no partial file."""
+    temp_path = path.with_name(path.name + '.tmp')
+    with open(temp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+
+def pending_mixes(source_folder, output_folder, force=False):
+    """Return [(source, target)] of the mixes in source_folder that need a .tracks.json."""
+    pending = {}
+    for path in sorted(Path(source_folder).iterdir()):
+        if path.suffix.lower() not in AUDIO_EXTENSIONS or not path.is_file() or rendition_bitrate(path.name):
+            continue
+        if path.stem in pending or (Path(output_folder) / f"{path.stem}.tracks.txt").exists():
+            continue
+        target = Path(output_folder) / f"{path.stem}.tracks.json"
+        if not force and target.exists() and target.stat().st_mtime >= path.stat().st_mtime:
+            continue
+        pending[path.stem] = (path, target)
+    return list(pending.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Suggest track boundaries for mixes without a tracklist')
+    parser.add_argument('directory', nargs='?', help='Output directory (default: mixes/ with a config, else .)')
+    parser.add_argument('djs', nargs='*', help='Only these DJ folders')
+    parser.add_argument('--source', help='Read audio from this directory')
+    parser.add_argument('--force', action='store_true', help='Analyse mixes whose .tracks.json is up to date')
+    parser.add_argument('--pcm-cache', action='store_true', help='Decode through the shared decoded-PCM cache')
+    parser.add_argument('--jobs', type=int, default=supervise.MAX_PROCESSES, help='Mixes analysed at once')
+    parser.add_argument('--retry-failed', action='store_true', help='Try quarantined files again')
+    args = parser.parse_args()
+    supervise.renice()
+    quarantine = supervise.Quarantine('detect-tracks', retry=args.retry_failed)
+    pcm_cache = PCMCache() if args.pcm_cache else None
+
+    tasks = []
+    quarantined = 0
+    for name, source_folder, output_folder in resolve_dj_folders(args.directory, args.djs, args.source, load_config()):
+        if not Path(source_folder).is_dir():
+            continue
+        for source, target in pending_mixes(source_folder, output_folder, args.force):
+            if quarantine.holds(source):
+                quarantined += 1
+                continue
+            tasks.append((name, source, target))
+
+    print(f"{len(tasks)} mixes to analyse" + (f", {quarantined} quarantined" if quarantined else '')
+          + f" ({args.jobs} at once)")
+    started = time.perf_counter()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {pool.submit(detect_tracks, source, pcm_cache): (name, source, target)
+                   for name, source, target in tasks}
+        for future in as_completed(futures):
+            name, source, target = futures[future]
+            try:
+                data = future.result()
+                target.parent.mkdir(parents=True, exist_ok=True)
+                write_tracks(target, data)
+                quarantine.release(source)
+                print(f"  {name}/{target.name}: {len(data['tracks'])} tracks in {data['duration']:.0f}s")
+            except Exception as e:
+                failed += 1
+                quarantine.add(source, e)
+                print(f"  {name}/{target.name}: ERROR: {e}")
+    print(f"\nAnalysed {len(tasks) - failed} mixes in {time.perf_counter() - started:.1f}s"
+          + (f", {failed} failed" if failed else ''))
+    quarantine.report()
+
+
+if __name__ == '__main__':
+    main()
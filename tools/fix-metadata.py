@@ -1,14 +1,50 @@
 #!/usr/bin/env python3
-"""Write metadata tags to media files based on HTML data."""
+"""
+Write metadata tags to media files based on HTML data.
+
+Usage:
+    ./tools/fix-metadata.py [--apply] [--force] [--jobs N] [--source DIR] [--output DIR] [--restart] [DJ ...]
+
+DJ folders are found the same way as generate-manifest.py: with a
+source_directory in mixes/audio-source-config.json (or tools/tool-config.json,
+or --source) audio is read from there and each DJ's index.html is looked up
+in its output folder (main_djs in mixes/, everyone else in mixes/moreDJs/)
+and then next to the audio. Without a source directory the DJ folders under
+--output (default mixes/) are processed in place.
+
+Tags are probed concurrently and recorded in the shared file catalog
+(tools/catalog.py), keyed by path, size and content fingerprint. A rerun
+takes unchanged files' tags from the catalog instead of probing them again,
+so an interrupted --apply resumes where it stopped and files already fixed
+are skipped. --restart drops the cached tags and probes every file again.
+
+Tags are read and written natively (tools/mediatags.py): when the new tags
+fit in the existing ID3/FLAC padding or MP4 free space only the header
+region is patched, so a multi-hundred-MB mix costs kilobytes of I/O. Files
+the native writer cannot handle fall back to an ffmpeg -c copy remux.
+--jobs N processes files in parallel (default: CPU count). --stats out.json
+writes per-file timings and --profile out.prof runs under cProfile (see
+tools/toolstats.py).
+"""
 
 import os
-import subprocess
+import json
 import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from html.parser import HTMLParser
 import shutil
 import argparse
 
+import mediatags
+import supervise
+import toolstats
+from catalog import Catalog, find_dj_directories, folder_routing, load_config, routed_output
+
+STATS = toolstats.Stats('fix-metadata')
+
 class MixHTMLParser(HTMLParser):
     def __init__(self):
         super().__init__()
@@ -69,13 +105,17 @@ def find_media_files(directory):
     return files
 
 def get_current_metadata(filepath):
-    """Get current metadata from file."""
+    """Get current metadata from file, reading the tag header natively when possible."""
     try:
-        result = subprocess.run(
+        tags = mediatags.read_tags(filepath)
+        return {'title': tags.get('title', ''), 'artist': tags.get('artist', '')}
+    except (mediatags.TagError, OSError):
+        pass
+    try:
+        result = supervise.run(
             ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', str(filepath)],
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            stage='probe'
         )
-        import json
         data = json.loads(result.stdout.decode('utf-8'))
         tags = data.get('format', {}).get('tags', {})
         return {
@@ -86,7 +126,27 @@ def get_current_metadata(filepath):
         return {'title': '', 'artist': ''}
 
 def write_metadata(filepath, title, artist, dry_run=True):
-    """Write metadata to file using ffmpeg."""
+    """
+    Write title/artist tags to file.
+
+    Returns (method, bytes_written) where method is 'in-place', 'rewrite'
+    (native) or 'remux' (ffmpeg fallback), or None on error.
+    """
+    if dry_run:
+        return 'dry-run', 0
+    
+    try:
+        return mediatags.write_tags(filepath, {'title': title, 'artist': artist})
+    except mediatags.TagError as e:
+        print(f"  {filepath.name}: {e}, falling back to ffmpeg")
+    except OSError as e:
+        print(f"  ERROR: {e}")
+        return None
+    
+    return write_metadata_ffmpeg(filepath, title, artist)
+
+def write_metadata_ffmpeg(filepath, title, artist):
+    """Write metadata to file by remuxing it with ffmpeg."""
     ext = filepath.suffix.lower()
     temp_file = filepath.with_suffix(f'.tmp{ext}')
     
@@ -103,56 +163,61 @@ def write_metadata(filepath, title, artist, dry_run=True):
     
     cmd.append(str(temp_file))
     
-    if dry_run:
-        print(f"  Would run: ffmpeg ... -metadata title=\"{title}\" -metadata artist=\"{artist}\" ...")
-        return True
-    
     try:
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        result = supervise.run(cmd, size=filepath.stat().st_size)
         if result.returncode == 0:
             # Replace original with temp
+            written = temp_file.stat().st_size
             shutil.move(str(temp_file), str(filepath))
-            return True
+            return 'remux', written
         else:
             print(f"  ERROR: {result.stderr.decode('utf-8')[:200]}")
             if temp_file.exists():
                 temp_file.unlink()
-            return False
+            return None
     except Exception as e:
         print(f"  ERROR: {e}")
         if temp_file.exists():
             temp_file.unlink()
-        return False
+        return None
 
-def main():
-    parser = argparse.ArgumentParser(description='Fix metadata tags based on HTML data')
-    parser.add_argument('--apply', action='store_true', help='Actually write changes (default is dry-run)')
-    parser.add_argument('--force', action='store_true', help='Overwrite existing metadata even if present')
-    args = parser.parse_args()
-    
-    dry_run = not args.apply
-    
-    if dry_run:
-        print("DRY RUN - no changes will be made. Use --apply to write changes.\n")
+def format_bytes(n):
+    """Human-readable byte count."""
+    for unit in ('B', 'KB', 'MB'):
+        if n < 1024:
+            return f"{n:.0f}{unit}" if unit == 'B' else f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}GB"
+
+def find_dj_folders(output_dir, source_dir, main_djs, specific_djs):
+    """Return [(dj, routing, media_dir, index_html)] using the same routing as generate-manifest.py."""
+    if source_dir:
+        folders = [d for d in sorted(source_dir.iterdir()) if d.is_dir() and not d.name.startswith('.')]
     else:
-        print("APPLYING CHANGES\n")
+        folders = find_dj_directories(output_dir)
+    if specific_djs:
+        folders = [d for d in folders if d.name in specific_djs]
     
-    base_dir = Path(__file__).parent
-    dj_dirs = ['trip', 'izmar', 'aboo']
-    
-    updated = 0
-    skipped = 0
-    errors = 0
-    
-    for dj in dj_dirs:
-        dj_path = base_dir / dj
-        if not dj_path.exists():
-            continue
-            
-        index_html = dj_path / 'index.html'
-        if not index_html.exists():
+    result = []
+    for folder in folders:
+        if source_dir:
+            routing, routed = routed_output(folder.name, output_dir, main_djs)
+            candidates = [routed / 'index.html', folder / 'index.html']
+        else:
+            routing = folder_routing(folder)
+            candidates = [folder / 'index.html']
+        index_html = next((c for c in candidates if c.exists()), None)
+        result.append((folder.name, routing, folder, index_html))
+    return result
+
+def collect_tasks(dj_folders):
+    """Return [(dj, routing, filepath, html_name, dj_name)] for every media file with an index.html."""
+    tasks = []
+    for dj, routing, dj_path, index_html in dj_folders:
+        if index_html is None:
+            print(f"SKIP {dj}: no index.html")
             continue
-            
+        
         with open(index_html, 'r') as f:
             parser_obj = MixHTMLParser()
             parser_obj.feed(f.read())
@@ -171,32 +236,140 @@ def main():
             html_name = html.get('name_html', base)  # Fall back to filename
             
             for filepath in files:
-                current = get_current_metadata(filepath)
-                needs_update = False
-                
-                if not current['title']:
-                    needs_update = True
-                elif args.force and current['title'].lower() != html_name.lower():
-                    needs_update = True
-                
-                if not needs_update:
-                    print(f"SKIP {dj}/{filepath.name}: already has title=\"{current['title']}\"")
-                    skipped += 1
-                    continue
-                
-                print(f"UPDATE {dj}/{filepath.name}:")
-                print(f"  title: \"{current['title']}\" -> \"{html_name}\"")
-                print(f"  artist: \"{current['artist']}\" -> \"{dj_name}\"")
-                
-                if write_metadata(filepath, html_name, dj_name, dry_run):
-                    updated += 1
-                else:
-                    errors += 1
+                tasks.append((dj, routing, filepath, html_name, dj_name))
+    return tasks
+
+def probe_file(task, catalog):
+    """Return (metadata, cached) for a file, probing only if the catalog has no tags for this version."""
+    dj, routing, filepath, _, _ = task
+    try:
+        with STATS.file(filepath):
+            probed = catalog.metadata(filepath, dj, routing)
+    except Exception:
+        return get_current_metadata(filepath), False
+    tags = probed['tags']
+    return {'title': tags.get('title', ''), 'artist': tags.get('artist', '')}, probed['cached']
+
+def update_file(task, current, catalog, dry_run):
+    """Write one file's new tags; returns (outcome, lines, bytes_written)."""
+    dj, _, filepath, html_name, dj_name = task
+    lines = [
+        f"UPDATE {dj}/{filepath.name}:",
+        f"  title: \"{current['title']}\" -> \"{html_name}\"",
+        f"  artist: \"{current['artist']}\" -> \"{dj_name}\"",
+    ]
+    with STATS.file(filepath) as record:
+        result = write_metadata(filepath, html_name, dj_name, dry_run)
+        if result is not None:
+            record.wrote(result[1])
+    if result is None:
+        return 'error', lines, 0
+    method, written = result
+    if dry_run:
+        lines.append(f"  Would write: title=\"{html_name}\" artist=\"{dj_name}\"")
+    else:
+        catalog.update_tags(filepath, {'title': html_name, 'artist': dj_name})
+        lines.append(f"  {method}: wrote {format_bytes(written)} of {format_bytes(filepath.stat().st_size)}")
+    return 'updated', lines, written
+
+def main():
+    parser = argparse.ArgumentParser(description='Fix metadata tags based on HTML data')
+    parser.add_argument('djs', nargs='*', help='Only process these DJ folders')
+    parser.add_argument('--apply', action='store_true', help='Actually write changes (default is dry-run)')
+    parser.add_argument('--force', action='store_true', help='Overwrite existing metadata even if present')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 4, help='Files processed in parallel')
+    parser.add_argument('--source', help='Read audio from this directory (default: source_directory from config)')
+    parser.add_argument('--output', default='mixes', help='Manifest directory holding DJ folders (default: mixes)')
+    parser.add_argument('--restart', action='store_true', help='Ignore cached tags and probe every file again')
+    parser.add_argument('--stats', metavar='FILE', help='Write per-file timings as JSON')
+    parser.add_argument('--profile', metavar='FILE', help='Run under cProfile and write the profile')
+    args = parser.parse_args()
+    toolstats.run_main(lambda: fix_metadata(args), STATS, args.stats, args.profile)
+
+def fix_metadata(args):
+    """Probe every file and write the tags that need fixing."""
+    dry_run = not args.apply
+    
+    if dry_run:
+        print("DRY RUN - no changes will be made. Use --apply to write changes.\n")
+    else:
+        print("APPLYING CHANGES\n")
+    
+    config = load_config() or {}
+    output_dir = Path(args.output)
+    source_dir = Path(args.source) if args.source else None
+    if source_dir is None and 'source_directory' in config:
+        source_dir = Path(config['source_directory'])
+    if source_dir and not source_dir.exists():
+        print(f"Error: source directory {source_dir} does not exist")
+        sys.exit(1)
+    if not source_dir and not output_dir.exists():
+        print(f"Error: {output_dir} does not exist")
+        sys.exit(1)
+    
+    timings = {}
+    started = time.perf_counter()
+    dj_folders = find_dj_folders(output_dir, source_dir, config.get('main_djs', []), args.djs)
+    if args.djs and not dj_folders:
+        print(f"Error: No matching DJ folders found for: {', '.join(args.djs)}")
+        sys.exit(1)
+    tasks = collect_tasks(dj_folders)
+    timings['discover'] = time.perf_counter() - started
+    
+    catalog = Catalog()
+    if args.restart:
+        for task in tasks:
+            catalog.forget_tags(task[2])
+    
+    with catalog, ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        started = time.perf_counter()
+        probed = list(pool.map(lambda task: probe_file(task, catalog), tasks))
+        timings['probe'] = time.perf_counter() - started
+        from_catalog = sum(1 for _, cached in probed if cached)
+        
+        pending = []
+        skipped = 0
+        for task, (current, _) in zip(tasks, probed):
+            dj, _, filepath, html_name, dj_name = task
+            needs_update = False
+            
+            if not current['title']:
+                needs_update = True
+            elif args.force and current['title'].lower() != html_name.lower():
+                needs_update = True
+            
+            if needs_update:
+                pending.append((task, current))
+            else:
+                print(f"SKIP {dj}/{filepath.name}: already has title=\"{current['title']}\"")
+                skipped += 1
+        
+        started = time.perf_counter()
+        counts = {'updated': 0, 'error': 0}
+        total_written = 0
+        total_size = 0
+        results = pool.map(lambda item: update_file(item[0], item[1], catalog, dry_run), pending)
+        for (task, _), (outcome, lines, written) in zip(pending, results):
+            for line in lines:
+                print(line)
+            counts[outcome] += 1
+            if outcome == 'updated':
+                total_written += written
+                total_size += task[2].stat().st_size
+        timings['write'] = time.perf_counter() - started
+    
+    updated = counts['updated']
+    errors = counts['error']
     
     print(f"\n{'Would update' if dry_run else 'Updated'}: {updated}")
     print(f"Skipped (already tagged): {skipped}")
+    if not dry_run and updated:
+        print(f"Bytes written: {format_bytes(total_written)} (files total {format_bytes(total_size)})")
     if errors:
         print(f"Errors: {errors}")
+    print(f"Timings: discover {timings['discover']:.2f}s, "
+          f"probe {timings['probe']:.2f}s ({len(tasks) - from_catalog} probed, {from_catalog} from catalog), "
+          f"write {timings['write']:.2f}s")
     
     if dry_run and updated > 0:
         print("\nRun with --apply to write changes.")
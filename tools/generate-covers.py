@@ -6,94 +6,573 @@ Scans audio files for embedded cover art and extracts them to separate image fil
 with the same basename as the audio file.
 
 Usage:
-    ./tools/generate-covers.py [root_dir] [dj_name ...]
-    ./tools/generate-covers.py --source /path/to/audio [output_dir]
+    ./tools/generate-covers.py [options] [root_dir] [dj_name ...]
+    ./tools/generate-covers.py [options] --source /path/to/audio [output_dir]
+
+Options:
+    --jobs N               Files processed at once (default: CPU count)
+    --thumb-format FORMAT  Thumbnail format: webp (default) or avif
+    --no-thumbs            Extract covers only
+    --dedupe[=N]           Merge covers whose perceptual hashes differ by at most
+                           N bits (0-2, default 2) into one shared file
+    --no-sprite            Skip the sprite atlas and placeholders
+    --retry-failed         Try quarantined audio files and covers again
+    --stats FILE           Write per-file timings (see tools/toolstats.py)
+    --profile FILE         Run under cProfile and write the profile
 
 If root_dir is not specified, defaults to 'mixes/' when audio-source-config.json
 is present, otherwise current directory.
 If --source is specified, reads audio from source and writes covers to output directory.
+
+Cover art is read straight from the container headers (ID3v2 APIC, FLAC
+PICTURE, MP4 covr) without spawning anything; ffmpeg is only used, in a
+single spawn per file, for containers mediatags.py cannot parse.
+
+Each cover also gets a set of thumbnails (<base>.w96.webp, .w192, .w384; never
+upscaled) written by one ffmpeg spawn per cover. Thumbnails are only rebuilt
+when the cover is newer. covers.json in each DJ folder records every cover
+and thumbnail with its dimensions and byte size; generate-manifest.py copies
+the thumbnail list into manifest.json so clients can pick the smallest
+variant that fits.
+
+--dedupe computes a 64-bit perceptual hash (dHash) of every cover in a DJ
+folder and merges covers that look the same (series artwork reused across
+many mixes) into one content-addressed file, cover.<sha256>.<ext>, keeping the
+largest version. Only covers within N bits of that kept image join it, so
+similar-looking covers of a series never chain into one group. covers.json
+maps each mix to the shared file (so later runs neither re-extract nor
+re-dedupe it), and the bytes saved are reported. Per-mix copies and their
+thumbnails are listed as retired in covers.json and deleted by the first
+run after GRACE_SECONDS (see tools/artifacts.py), so clients holding an
+older manifest still find them.
+
+Every ffmpeg run goes through tools/supervise.py with the short probe
+timeout. An audio file whose extraction times out, or a cover whose hash,
+sprite cell or thumbnails time out, is quarantined and skipped until it
+changes, unless --retry-failed.
+
+Every DJ folder also gets a sprite atlas, covers.sprite.<hash>.webp, holding a
+64x64 crop of each cover, so a list view can paint every cover with one
+request. Each cover gets an inline placeholder: its dominant colour and a
+blurhash (4x3 components, ~20 characters). Atlas coordinates and
+placeholders go into covers.json and from there into manifest.json. The atlas
+is only rebuilt when the set of covers changes; superseded atlases are
+deleted once they are older than GRACE_SECONDS.
 """
 
-import subprocess
+import hashlib
+import json
+import math
 import sys
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import mediatags
+import supervise
+import toolstats
+from artifacts import GRACE_SECONDS, collect_garbage
+from catalog import find_dj_directories, load_config
+
 AUDIO_EXTENSIONS = {'.mp3', '.m4a', '.flac', '.ogg', '.wav'}
+COVER_EXTENSIONS = ['.jpg', '.png', '.bmp', '.gif', '.webp']
+THUMB_WIDTHS = (96, 192, 384)
+DEDUPE_THRESHOLD = 2      # Max differing dHash bits between a cover and the kept image
+MAX_DEDUPE_THRESHOLD = 2  # Looser tolerances merge distinct artwork of a series
+SPRITE_CELL = 64          # Sprite atlas cell size in pixels
+SPRITE_MAX_COLUMNS = 16
+BLURHASH_COMPONENTS = (4, 3)
+BLURHASH_CHARS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+THUMB_CODECS = {
+    'webp': ['-c:v', 'libwebp', '-quality', '75', '-compression_level', '6'],
+    'avif': ['-c:v', 'libaom-av1', '-still-picture', '1', '-crf', '32', '-cpu-used', '6'],
+}
+
+STATS = toolstats.Stats('generate-covers')
+QUARANTINE = supervise.Quarantine('generate-covers')
+
+def extract_cover_ffmpeg(audio_path):
+    """Extract cover art bytes with a single ffmpeg spawn, or None if there is no cover."""
+    result = supervise.run(
+        ['ffmpeg', '-v', 'error', '-i', str(audio_path), '-an', '-map', '0:v:0?',
+         '-c:v', 'copy', '-frames:v', '1', '-f', 'image2pipe', 'pipe:1'],
+        stage='probe'
+    )
+    if result.returncode != 0 or not result.stdout:
+        return None
+    return result.stdout
 
-def has_cover_art(audio_path):
-    """Check if audio file has embedded cover art, return codec name if found."""
+def read_cover(audio_path):
+    """Return embedded cover bytes, parsing headers in-process and falling back to ffmpeg."""
     try:
-        result = subprocess.run(
-            ['ffprobe', '-v', 'error', '-show_entries', 'stream=codec_name,codec_type',
-             '-of', 'default=noprint_wrappers=1', str(audio_path)],
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+        return mediatags.read_cover(audio_path)
+    except mediatags.TagError:
+        return extract_cover_ffmpeg(audio_path)
+
+def extract_cover_file(audio_path, output_folder):
+    """
+    Extract the cover of one audio file into output_folder.
+    
+    Returns (status, message) where status is 'extracted', 'no_art' or 'failed'.
+    """
+    with STATS.file(audio_path) as record:
+        try:
+            data = read_cover(audio_path)
+        except supervise.ProcessTimeout as e:
+            QUARANTINE.add(audio_path, e)
+            return 'failed', f"{audio_path.name}: {e}"
+        except Exception as e:
+            return 'failed', f"{audio_path.name}: {e}"
+        if not data:
+            return 'no_art', None
+        
+        output_path = output_folder / f"{audio_path.stem}{mediatags.image_extension(data)}"
+        try:
+            with open(output_path, 'wb') as f:
+                f.write(data)
+        except OSError as e:
+            return 'failed', f"{audio_path.name}: {e}"
+        record.wrote(len(data))
+        return 'extracted', output_path.name
+
+def thumb_path(cover_path, width, thumb_format):
+    """Path of the thumbnail of cover_path at the given width."""
+    base_name = cover_path.name[:-len(cover_path.suffix)]
+    return cover_path.with_name(f"{base_name}.w{width}.{thumb_format}")
+
+def thumb_widths(size):
+    """Thumbnail widths for a cover of the given (width, height); never upscales."""
+    if not size:
+        return list(THUMB_WIDTHS)
+    widths = [w for w in THUMB_WIDTHS if w <= size[0]]
+    return widths or [size[0]]
+
+def make_thumbnails(cover_path, thumb_format):
+    """
+    Write any missing or stale thumbnails of one cover with a single ffmpeg spawn.
+    
+    Returns (written_count, error_message_or_None).
+    """
+    with open(cover_path, 'rb') as f:
+        size = mediatags.image_size(f.read())
+    cover_mtime = cover_path.stat().st_mtime
+    
+    stale = []
+    for width in thumb_widths(size):
+        target = thumb_path(cover_path, width, thumb_format)
+        if not target.exists() or target.stat().st_mtime < cover_mtime:
+            stale.append((width, target))
+    if not stale:
+        return 0, None
+    
+    # One decode, split into every width
+    labels = ''.join(f"[s{i}]" for i in range(len(stale)))
+    graph = f"[0:v]split={len(stale)}{labels}" if len(stale) > 1 else "[0:v]null[s0]"
+    for i, (width, _) in enumerate(stale):
+        graph += f";[s{i}]scale={width}:-2:flags=lanczos[o{i}]"
+    
+    cmd = ['ffmpeg', '-v', 'error', '-y', '-i', str(cover_path), '-filter_complex', graph]
+    for i, (_, target) in enumerate(stale):
+        cmd += ['-map', f"[o{i}]", '-frames:v', '1'] + THUMB_CODECS[thumb_format] + [str(target)]
+    
+    with STATS.file(cover_path) as record:
+        try:
+            result = supervise.run(cmd, stage='probe')
+        except supervise.ProcessTimeout as e:
+            QUARANTINE.add(cover_path, e)
+            return 0, f"{cover_path.name}: {e}"
+        except OSError as e:
+            return 0, f"{cover_path.name}: {e}"
+        if result.returncode != 0:
+            return 0, f"{cover_path.name}: {result.stderr.decode('utf-8', 'replace')[:200]}"
+        record.read(cover_path.stat().st_size)
+        record.wrote(sum(target.stat().st_size for _, target in stale if target.exists()))
+    return len(stale), None
+
+def describe_image(path):
+    """Return {file, width, height, bytes} for an image file."""
+    with open(path, 'rb') as f:
+        size = mediatags.image_size(f.read())
+    entry = {'file': path.name}
+    if size:
+        entry['width'], entry['height'] = size
+    entry['bytes'] = path.stat().st_size
+    return entry
+
+def load_cover_index(folder):
+    """Load covers.json from a previous run, returning {base_name: entry}."""
+    covers_path = folder / 'covers.json'
+    if not covers_path.exists():
+        return {}
+    try:
+        with open(covers_path) as f:
+            return json.load(f).get('covers', {})
+    except Exception as e:
+        print(f"  Warning: Could not load {covers_path}: {e}")
+        return {}
+
+def load_sprite_section(folder):
+    """Return the sprite section of a previous covers.json, or None."""
+    try:
+        with open(folder / 'covers.json') as f:
+            return json.load(f).get('sprite')
+    except (OSError, ValueError):
+        return None
+
+def load_retired(folder):
+    """Return the retired section of a previous covers.json: {cover_name: unix time retired}."""
+    try:
+        with open(folder / 'covers.json') as f:
+            return json.load(f).get('retired', {})
+    except (OSError, ValueError):
+        return {}
+
+def find_cover(folder, base_name, index=None):
+    """Return the cover file for base_name in folder (possibly a shared one), or None."""
+    entry = (index or {}).get(base_name)
+    if entry and (folder / entry['file']).exists():
+        return folder / entry['file']
+    for ext in COVER_EXTENSIONS:
+        potential = folder / f"{base_name}{ext}"
+        if potential.exists():
+            return potential
+    return None
+
+def cover_phash(cover_path):
+    """
+    64-bit difference hash of a cover: shrink to 9x8 greyscale and compare
+    neighbouring pixels. Similar images give hashes a few bits apart.
+    Returns None if ffmpeg fails; a cover it times out on is quarantined.
+    """
+    try:
+        result = supervise.run(
+            ['ffmpeg', '-v', 'error', '-i', str(cover_path), '-frames:v', '1',
+             '-vf', 'scale=9:8:flags=area,format=gray', '-f', 'rawvideo', 'pipe:1'],
+            stage='probe'
         )
-        lines = result.stdout.strip().split('\n')
-        codec_name = None
-        for i, line in enumerate(lines):
-            if line.startswith('codec_name='):
-                codec_name = line.split('=')[1]
-            elif line.startswith('codec_type=video') and codec_name:
-                return codec_name
+    except supervise.ProcessTimeout as e:
+        QUARANTINE.add(cover_path, e)
         return None
-    except Exception as e:
-        print(f"  Error probing {audio_path}: {e}")
+    pixels = result.stdout
+    if result.returncode != 0 or len(pixels) < 72:
         return None
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
 
-def get_image_extension(codec_name):
-    """Map codec name to file extension."""
-    codec_map = {
-        'mjpeg': '.jpg',
-        'png': '.png',
-        'bmp': '.bmp',
-        'gif': '.gif',
-    }
-    return codec_map.get(codec_name.lower(), '.jpg')
+def group_similar(hashes, threshold, rank):
+    """
+    Group paths whose hashes are within threshold bits of the group's kept image.
+    
+    The highest-ranked (by rank(path)) ungrouped path becomes the kept image
+    of a new group and takes every ungrouped path within threshold of its own
+    hash; similarity is never chained through other members. Returns
+    [(kept, [paths])] for groups of more than one path.
+    """
+    remaining = sorted(hashes, key=rank, reverse=True)
+    groups = []
+    while remaining:
+        kept = remaining.pop(0)
+        group = [kept] + [p for p in remaining if bin(hashes[kept] ^ hashes[p]).count('1') <= threshold]
+        remaining = [p for p in remaining if p not in group]
+        if len(group) > 1:
+            groups.append((kept, group))
+    return groups
+
+def remove_cover_files(cover_path):
+    """Delete a cover and all of its thumbnails."""
+    for thumb_format in THUMB_CODECS:
+        for width in THUMB_WIDTHS:
+            thumb_path(cover_path, width, thumb_format).unlink(missing_ok=True)
+    cover_path.unlink(missing_ok=True)
+
+def sweep_retired(output_folder, retired, in_use):
+    """
+    Delete retired covers (and their thumbnails) retired more than GRACE_SECONDS ago.
+    
+    Covers in in_use are never deleted and stop being retired. Updates retired
+    in place and returns the number of covers deleted.
+    """
+    cutoff = time.time() - GRACE_SECONDS
+    removed = 0
+    for name, retired_at in list(retired.items()):
+        path = output_folder / name
+        if path in in_use:
+            del retired[name]
+        elif retired_at < cutoff:
+            remove_cover_files(path)
+            del retired[name]
+            removed += 1
+    return removed
 
-def extract_cover(audio_path, output_path):
-    """Extract cover art from audio file."""
+def dedupe_covers(output_folder, base_names, index, pool, threshold, retired):
+    """
+    Merge visually identical covers into shared content-addressed files.
+    
+    Updates index in place so each merged mix points at the shared file, adds
+    the merged copies to retired (see sweep_retired()), and returns
+    (merged_mix_count, bytes_saved, phashes).
+    """
+    covers = {b: find_cover(output_folder, b, index) for b in base_names}
+    covers = {b: c for b, c in covers.items() if c}
+    unique = sorted(c for c in set(covers.values()) if not QUARANTINE.holds(c))
+    
+    phashes = {}
+    for path, phash in zip(unique, pool.map(cover_phash, unique)):
+        if phash is None:
+            print(f"  Could not hash {path.name}")
+        else:
+            phashes[path] = phash
+    
+    # Keep the largest image; ties go to the bigger file, then the name
+    def quality(path):
+        with open(path, 'rb') as f:
+            size = mediatags.image_size(f.read()) or (0, 0)
+        return size[0] * size[1], path.stat().st_size, path.name
+    qualities = {path: quality(path) for path in phashes}
+    
+    merged = 0
+    saved = 0
+    for best, group in group_similar(phashes, threshold, qualities.get):
+        with open(best, 'rb') as f:
+            data = f.read()
+        shared = output_folder / f"cover.{hashlib.sha256(data).hexdigest()[:16]}{mediatags.image_extension(data)}"
+        before = sum(p.stat().st_size for p in group)
+        if not shared.exists():
+            with open(shared, 'wb') as f:
+                f.write(data)
+        
+        members = [b for b, c in covers.items() if c in group]
+        for base_name in members:
+            index[base_name] = {'file': shared.name}
+        for path in group:
+            if path != shared:
+                retired.setdefault(path.name, int(time.time()))
+        
+        merged += len(members)
+        saved += before - shared.stat().st_size
+        phashes[shared] = phashes.get(best)
+        print(f"  Shared cover {shared.name}: {len(members)} mixes, {len(group)} files merged")
+    
+    return merged, saved, phashes
+
+def decode_cell(cover_path):
+    """Decode a cover to a SPRITE_CELL square of raw RGB bytes (centre crop), or None (quarantined on a timeout)."""
     try:
-        result = subprocess.run(
-            ['ffmpeg', '-y', '-i', str(audio_path), '-an', '-c:v', 'copy', str(output_path)],
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+        result = supervise.run(
+            ['ffmpeg', '-v', 'error', '-i', str(cover_path), '-frames:v', '1',
+             '-vf', f"scale={SPRITE_CELL}:{SPRITE_CELL}:force_original_aspect_ratio=increase:flags=area,"
+                    f"crop={SPRITE_CELL}:{SPRITE_CELL}",
+             '-pix_fmt', 'rgb24', '-f', 'rawvideo', 'pipe:1'],
+            stage='probe'
         )
-        return result.returncode == 0 and output_path.exists()
-    except Exception as e:
-        print(f"  Error extracting from {audio_path}: {e}")
-        return False
-
-def find_dj_folders(root_dir):
-     """Find DJ folders (directories containing audio files), including nested ones in moreDJs/."""
-     dj_folders = []
-     for item in sorted(root_dir.iterdir()):
-         if item.is_dir() and not item.name.startswith('.'):
-             if item.name == 'moreDJs':
-                 # Scan subdirectories within moreDJs
-                 for subitem in sorted(item.iterdir()):
-                     if subitem.is_dir():
-                         has_audio = any(
-                             f.suffix.lower() in AUDIO_EXTENSIONS 
-                             for f in subitem.iterdir() if f.is_file()
-                         )
-                         if has_audio:
-                             dj_folders.append(subitem)
-             else:
-                 # Check all root-level directories
-                 has_audio = any(
-                     f.suffix.lower() in AUDIO_EXTENSIONS 
-                     for f in item.iterdir() if f.is_file()
-                 )
-                 if has_audio:
-                     dj_folders.append(item)
-     return dj_folders
-
-def process_folder(folder):
+    except supervise.ProcessTimeout as e:
+        QUARANTINE.add(cover_path, e)
+        return None
+    if result.returncode != 0 or len(result.stdout) != SPRITE_CELL * SPRITE_CELL * 3:
+        return None
+    return result.stdout
+
+def dominant_colour(pixels):
+    """Most common colour (by 4-bit-per-channel bucket, averaged within it) as #rrggbb."""
+    buckets = {}
+    for i in range(0, len(pixels), 3):
+        r, g, b = pixels[i], pixels[i + 1], pixels[i + 2]
+        key = (r >> 4, g >> 4, b >> 4)
+        total = buckets.setdefault(key, [0, 0, 0, 0])
+        total[0] += r
+        total[1] += g
+        total[2] += b
+        total[3] += 1
+    r, g, b, n = max(buckets.values(), key=lambda t: t[3])
+    return f"#{r // n:02x}{g // n:02x}{b // n:02x}"
+
+def _encode83(value, length):
+    return ''.join(BLURHASH_CHARS[(value // 83 ** (length - 1 - i)) % 83] for i in range(length))
+
+def _srgb_to_linear(value):
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+def _linear_to_srgb(value):
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+def blurhash(pixels, size, components=BLURHASH_COMPONENTS):
+    """Encode square RGB pixels as a blurhash string (see blurha.sh)."""
+    # Average down to 16x16 first; a blurhash cannot hold more detail anyway
+    step = max(1, size // 16)
+    small = size // step
+    linear = []
+    for y in range(small):
+        for x in range(small):
+            total = [0, 0, 0]
+            for dy in range(step):
+                row = ((y * step + dy) * size + x * step) * 3
+                for dx in range(step):
+                    for c in range(3):
+                        total[c] += pixels[row + dx * 3 + c]
+            linear.append([_srgb_to_linear(t / (step * step)) for t in total])
+    
+    cx, cy = components
+    factors = []
+    for j in range(cy):
+        for i in range(cx):
+            norm = 1 if i == 0 and j == 0 else 2
+            acc = [0.0, 0.0, 0.0]
+            for y in range(small):
+                basis_y = math.cos(math.pi * j * y / small)
+                for x in range(small):
+                    basis = norm * math.cos(math.pi * i * x / small) * basis_y
+                    pixel = linear[y * small + x]
+                    for c in range(3):
+                        acc[c] += basis * pixel[c]
+            factors.append([a / (small * small) for a in acc])
+    
+    dc, ac = factors[0], factors[1:]
+    result = _encode83((cx - 1) + (cy - 1) * 9, 1)
+    actual_max = max(abs(v) for f in ac for v in f) if ac else 0
+    quantised_max = max(0, min(82, int(actual_max * 166 - 0.5)))
+    max_value = (quantised_max + 1) / 166
+    result += _encode83(quantised_max, 1)
+    result += _encode83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    
+    def quantise(v):
+        signed_sqrt = math.copysign(abs(v / max_value) ** 0.5, v)
+        return max(0, min(18, int(signed_sqrt * 9 + 9.5)))
+    
+    for f in ac:
+        result += _encode83(quantise(f[0]) * 19 * 19 + quantise(f[1]) * 19 + quantise(f[2]), 2)
+    return result
+
+def sprite_signature(covers):
+    """Fingerprint of the covers going into an atlas (names, sizes, mtimes)."""
+    digest = hashlib.sha256()
+    for cover in covers:
+        stat = cover.stat()
+        digest.update(f"{cover.name}:{stat.st_size}:{int(stat.st_mtime)}\n".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def build_sprite(output_folder, covers, pool, previous):
+    """
+    Build the sprite atlas and placeholders for a list of unique cover files.
+    
+    previous is the sprite section of the last covers.json; if the covers have
+    not changed it is returned as-is. Returns the new sprite section:
+    {file, width, height, cell, signature, cells: {cover_name: {x, y, color, blurhash}}}.
+    """
+    signature = sprite_signature(covers)
+    if (previous and previous.get('signature') == signature
+            and (output_folder / previous.get('file', '')).exists()):
+        return previous
+    
+    cells = {}
+    decoded = []
+    for cover, pixels in zip(covers, pool.map(decode_cell, covers)):
+        if pixels:
+            decoded.append((cover, pixels))
+        else:
+            print(f"  Could not decode {cover.name} for sprite")
+    if not decoded:
+        return None
+    
+    columns = min(SPRITE_MAX_COLUMNS, math.ceil(math.sqrt(len(decoded))))
+    rows = math.ceil(len(decoded) / columns)
+    width, height = columns * SPRITE_CELL, rows * SPRITE_CELL
+    atlas = bytearray(width * height * 3)
+    row_bytes = SPRITE_CELL * 3
+    
+    for n, (cover, pixels) in enumerate(decoded):
+        x, y = (n % columns) * SPRITE_CELL, (n // columns) * SPRITE_CELL
+        for line in range(SPRITE_CELL):
+            start = ((y + line) * width + x) * 3
+            atlas[start:start + row_bytes] = pixels[line * row_bytes:(line + 1) * row_bytes]
+        cells[cover.name] = {
+            'x': x,
+            'y': y,
+            'color': dominant_colour(pixels),
+            'blurhash': blurhash(pixels, SPRITE_CELL)
+        }
+    
+    sprite_path = output_folder / f"covers.sprite.{hashlib.sha256(atlas).hexdigest()[:16]}.webp"
+    if not sprite_path.exists():
+        try:
+            result = supervise.run(
+                ['ffmpeg', '-v', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                 '-s', f"{width}x{height}", '-i', 'pipe:0', '-frames:v', '1',
+                 '-c:v', 'libwebp', '-quality', '70', str(sprite_path)],
+                stage='probe', input=bytes(atlas)
+            )
+        except supervise.ProcessTimeout as e:
+            print(f"  Sprite failed: {e}")
+            return None
+        if result.returncode != 0:
+            print(f"  Sprite failed: {result.stderr.decode('utf-8', 'replace')[:200]}")
+            return None
+    
+    # Superseded atlases stay for clients holding an older manifest
+    collect_garbage(output_folder, '.webp', keep={sprite_path.name}, base='covers.sprite')
+    
+    print(f"  Sprite: {sprite_path.name} ({len(decoded)} covers, {sprite_path.stat().st_size / 1024:.1f} KB)")
+    return {
+        'file': sprite_path.name,
+        'width': width,
+        'height': height,
+        'cell': SPRITE_CELL,
+        'signature': signature,
+        'cells': cells
+    }
+
+def write_cover_index(output_folder, base_names, thumb_format, index=None, phashes=None, sprite=None, retired=None):
+    """Write covers.json describing every cover and its thumbnails in output_folder."""
+    covers = {}
+    found = {b: find_cover(output_folder, b, index) for b in sorted(base_names)}
+    references = {}
+    for cover in found.values():
+        references[cover] = references.get(cover, 0) + 1
+    
+    for base_name, cover in found.items():
+        if not cover:
+            continue
+        entry = describe_image(cover)
+        if references[cover] > 1:
+            entry['shared'] = True
+        if phashes and phashes.get(cover) is not None:
+            entry['phash'] = f"{phashes[cover]:016x}"
+        # List existing thumbnails of every format, the current one first
+        formats = [thumb_format] if thumb_format else []
+        formats += [f for f in THUMB_CODECS if f != thumb_format]
+        thumbs = [thumb_path(cover, w, f) for f in formats for w in THUMB_WIDTHS]
+        thumbs = [describe_image(t) for t in thumbs if t.exists()]
+        if thumbs:
+            entry['thumbs'] = thumbs
+        cell = sprite['cells'].get(cover.name) if sprite else None
+        if cell:
+            entry['sprite'] = {'x': cell['x'], 'y': cell['y']}
+            entry['placeholder'] = {'color': cell['color'], 'blurhash': cell['blurhash']}
+        covers[base_name] = entry
+    
+    cover_index = {'version': 1, 'covers': covers}
+    if sprite:
+        cover_index['sprite'] = sprite
+    if retired:
+        cover_index['retired'] = retired
+    with open(output_folder / 'covers.json', 'w') as f:
+        json.dump(cover_index, f, indent=2)
+    return covers
+
+def process_folder(folder, options=None):
     """Process all audio files in a folder, extracting cover art (read and write in same folder)."""
-    return process_folder_split(folder, folder)
+    return process_folder_split(folder, folder, options)
 
-def process_folder_split(source_folder, output_folder):
-    """Process audio files from source folder, write covers to output folder."""
+def process_folder_split(source_folder, output_folder, options=None):
+    """Process audio files from source folder, write covers and thumbnails to output folder."""
+    options = options or default_options()
     audio_files = sorted([
         f for f in source_folder.iterdir() 
         if f.is_file() and f.suffix.lower() in AUDIO_EXTENSIONS
@@ -102,75 +581,139 @@ def process_folder_split(source_folder, output_folder):
     extracted = 0
     skipped = 0
     no_art = 0
+    pending = []
+    index = load_cover_index(output_folder)
+    previous_sprite = load_sprite_section(output_folder)
+    retired = load_retired(output_folder)
     
     for audio_file in audio_files:
         base_name = audio_file.stem
         
-        # Check if cover already exists in output folder
-        existing_cover = None
-        for ext in ['.jpg', '.png', '.bmp', '.gif']:
-            potential = output_folder / f"{base_name}{ext}"
-            if potential.exists():
-                existing_cover = potential
-                break
-        
-        if existing_cover:
+        # Check if cover already exists in output folder (own or shared)
+        if find_cover(output_folder, base_name, index):
             skipped += 1
             continue
-        
-        # Check for embedded cover art
-        codec = has_cover_art(audio_file)
-        if not codec:
-            no_art += 1
+        reason = QUARANTINE.holds(audio_file)
+        if reason:
+            print(f"  Skipping {audio_file.name} (quarantined: {reason})")
             continue
         
-        # Extract cover art
-        ext = get_image_extension(codec)
-        output_path = output_folder / f"{base_name}{ext}"
+        pending.append(audio_file)
+    
+    thumb_format = options['thumbs']
+    with ThreadPoolExecutor(max_workers=options['jobs']) as pool:
+        results = pool.map(lambda f: extract_cover_file(f, output_folder), pending)
+        for status, message in results:
+            if status == 'extracted':
+                print(f"  Extracted: {message}")
+                extracted += 1
+            elif status == 'no_art':
+                no_art += 1
+            else:
+                print(f"  Failed: {message}")
         
-        if extract_cover(audio_file, output_path):
-            print(f"  Extracted: {output_path.name}")
-            extracted += 1
-        else:
-            print(f"  Failed: {audio_file.name}")
+        base_names = {f.stem for f in audio_files}
+        phashes = None
+        if options['dedupe'] is not None:
+            merged, saved, phashes = dedupe_covers(output_folder, base_names, index, pool, options['dedupe'], retired)
+            if merged:
+                print(f"  Deduplicated: {merged} mixes share covers, {saved / 1024:.1f} KB saved")
+            options['bytes_saved'] = options.get('bytes_saved', 0) + saved
+        
+        current = {c for c in (find_cover(output_folder, b, index) for b in base_names) if c}
+        removed = sweep_retired(output_folder, retired, current)
+        if removed:
+            print(f"  Removed {removed} covers retired by --dedupe")
+        covers = sorted(c for c in current if not QUARANTINE.holds(c))
+        sprite = None
+        if options['sprite'] and covers:
+            sprite = build_sprite(output_folder, covers, pool, previous_sprite)
+        
+        if thumb_format:
+            thumbs_written = 0
+            for written, error in pool.map(lambda c: make_thumbnails(c, thumb_format), covers):
+                thumbs_written += written
+                if error:
+                    print(f"  Thumbnail failed: {error}")
+            if thumbs_written:
+                print(f"  Thumbnails: {thumbs_written} written")
+    
+    if base_names:
+        write_cover_index(output_folder, base_names, thumb_format, index, phashes, sprite, retired)
     
     return extracted, skipped, no_art
 
-def load_config():
-    """Load audio source configuration, merging deployed config with local tool config."""
-    import json
-    config = {}
-    for config_path in [Path('mixes/audio-source-config.json'), Path('tools/tool-config.json')]:
-        if config_path.exists():
-            try:
-                with open(config_path) as f:
-                    config.update(json.load(f))
-            except Exception as e:
-                print(f"Warning: Could not load {config_path}: {e}")
-    return config or None
-
-def main():
+def print_summary(extracted, skipped, no_art, options):
+    """Print the end-of-run summary line."""
+    summary = f"\nSummary: {extracted} extracted, {skipped} skipped, {no_art} without art"
+    if options['dedupe'] is not None:
+        summary += f", {options.get('bytes_saved', 0) / 1024:.1f} KB saved by deduplication"
+    print(summary)
+
+def default_options():
+    """Options used when none are given on the command line."""
+    return {'jobs': os.cpu_count() or 4, 'thumbs': 'webp', 'dedupe': None, 'sprite': True}
+
+def parse_options(argv):
+    """Split tool options out of argv, returning (remaining_args, options)."""
+    args = []
+    options = default_options()
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        name, _, value = arg.partition('=')
+        if name in ('--jobs', '--thumb-format') and not value:
+            if i + 1 >= len(argv):
+                print(f"Error: {name} requires a value")
+                sys.exit(1)
+            value = argv[i + 1]
+            i += 1
+        if name == '--jobs':
+            options['jobs'] = max(1, int(value))
+        elif name == '--thumb-format':
+            if value not in THUMB_CODECS:
+                print(f"Error: unknown thumbnail format {value} (use {', '.join(THUMB_CODECS)})")
+                sys.exit(1)
+            options['thumbs'] = value
+        elif arg == '--no-thumbs':
+            options['thumbs'] = None
+        elif arg == '--no-sprite':
+            options['sprite'] = False
+        elif arg == '--retry-failed':
+            QUARANTINE.retry = True
+        elif name == '--dedupe':
+            options['dedupe'] = int(value) if value else DEDUPE_THRESHOLD
+            if not 0 <= options['dedupe'] <= MAX_DEDUPE_THRESHOLD:
+                print(f"Error: --dedupe tolerance must be 0-{MAX_DEDUPE_THRESHOLD} bits")
+                sys.exit(1)
+        else:
+            args.append(arg)
+        i += 1
+    return args, options
+
+def main(argv):
     source_dir = None
     output_dir = None
     config = load_config()
     specific_djs = []
+    args, options = parse_options(argv)
     
     # Parse arguments
-    if len(sys.argv) > 1 and sys.argv[1] == '--source':
-        if len(sys.argv) < 3:
+    if args and args[0] == '--source':
+        if len(args) < 2:
             print("Error: --source requires a path argument")
             sys.exit(1)
-        source_dir = Path(sys.argv[2])
-        output_dir = Path(sys.argv[3]) if len(sys.argv) > 3 else Path.cwd()
+        source_dir = Path(args[1])
+        output_dir = Path(args[2]) if len(args) > 2 else Path.cwd()
         
         if not source_dir.exists():
             print(f"Error: source directory {source_dir} does not exist")
             sys.exit(1)
     else:
-        root_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else None
+        root_dir = Path(args[0]) if args else None
         # Any additional arguments are specific DJ folder names
-        if len(sys.argv) > 2:
-            specific_djs = sys.argv[2:]
+        if len(args) > 1:
+            specific_djs = args[1:]
         
         # Check config file (applies even when specific DJs are named)
         if config and 'source_directory' in config:
@@ -222,7 +765,7 @@ def main():
             output_folder.mkdir(parents=True, exist_ok=True)
             
             print(f"\nProcessing {source_name}/")
-            extracted, skipped, no_art = process_folder_split(source_folder, output_folder)
+            extracted, skipped, no_art = process_folder_split(source_folder, output_folder, options)
             total_extracted += extracted
             total_skipped += skipped
             total_no_art += no_art
@@ -232,7 +775,7 @@ def main():
             elif extracted == 0 and skipped > 0:
                 print(f"  All covers already extracted ({skipped} files)")
         
-        print(f"\nSummary: {total_extracted} extracted, {total_skipped} skipped, {total_no_art} without art")
+        print_summary(total_extracted, total_skipped, total_no_art, options)
         return
     
     # Original behavior: check if a specific DJ directory is given (has audio files directly)
@@ -244,8 +787,8 @@ def main():
     if has_audio:
         # Process just this directory
         print(f"\nProcessing {output_dir.name}/")
-        extracted, skipped, no_art = process_folder(output_dir)
-        print(f"\nSummary: {extracted} extracted, {skipped} skipped, {no_art} without art")
+        extracted, skipped, no_art = process_folder(output_dir, options)
+        print_summary(extracted, skipped, no_art, options)
         return
     
     # Otherwise find and process all DJ folders
@@ -260,7 +803,7 @@ def main():
                 print(f"Error: DJ folder not found: {dj_name}")
                 sys.exit(1)
     else:
-        dj_folders = find_dj_folders(output_dir)
+        dj_folders = find_dj_directories(output_dir, AUDIO_EXTENSIONS)
         if not dj_folders:
             print("No DJ folders found")
             sys.exit(0)
@@ -271,7 +814,7 @@ def main():
     
     for folder in dj_folders:
         print(f"\nProcessing {folder.name}/")
-        extracted, skipped, no_art = process_folder(folder)
+        extracted, skipped, no_art = process_folder(folder, options)
         total_extracted += extracted
         total_skipped += skipped
         total_no_art += no_art
@@ -281,7 +824,10 @@ def main():
         elif extracted == 0 and skipped > 0:
             print(f"  All covers already extracted ({skipped} files)")
     
-    print(f"\nSummary: {total_extracted} extracted, {total_skipped} skipped, {total_no_art} without art")
+    print_summary(total_extracted, total_skipped, total_no_art, options)
 
 if __name__ == '__main__':
-    main()
+    argv, stats_path, profile_path = toolstats.take_options(sys.argv[1:])
+    supervise.renice()
+    toolstats.run_main(lambda: main(argv), STATS, stats_path, profile_path)
+    QUARANTINE.report()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Generate mixes/hot.json: the most played mixes, for prefetching and cache warming.
+
+Usage:
+    ./tools/generate-hot.py [base_directory]
+    ./tools/generate-hot.py --top 30 --half-life 14 [base_directory]
+
+Default base directory is the current directory. Plays are read from the
+per-day rollups of beacon.log in base_directory/beacon-rollups/ (run
+rollup-beacons.py first); mix-play and daily-mix events both count. Each
+day's plays are weighted by 0.5 ** (age_days / half_life), so a mix played
+a lot a month ago ranks below one played steadily this week. Days older
+than --days are ignored.
+
+Each played mix is looked up in its DJ's manifest.json; plays of mixes that
+no longer exist (or that were logged by name rather than id) are dropped.
+hot.json lists the top --top mixes, best first:
+
+    id          <djPath>/<file>, as logged by the player
+    name, dj, djPath, file, duration
+    score       decayed play count, plays: raw plays within --days
+    peaks       URL of the .peaks.json, relative to the site root
+    cover       URL of the cover image, relative to the site root
+    audio       path of the audio file relative to a mixesBaseUrls entry
+    audioRange  Range header for the first --prefetch seconds of audio
+
+audioRange comes from the mix's .seek.bin when there is one
+(generate-seek-index.py); otherwise it covers PREFETCH_BYTES. The player
+prefetches the peaks and covers at idle; a proxy can be warmed by requesting
+each audio URL with its audioRange.
+"""
+
+import argparse
+import json
+import math
+import struct
+import time
+from datetime import date, datetime, timezone
+from pathlib import Path
+from urllib.parse import quote
+
+TOP = 20
+HALF_LIFE_DAYS = 7.0
+WINDOW_DAYS = 60
+PREFETCH_SECONDS = 30
+PREFETCH_BYTES = 1024 * 1024   # Without a seek index: about 26s at 320 kbps
+SEEK_HEADER = struct.Struct('<4sIIIIQI')   # See generate-seek-index.py
+
+
+def url_path(*parts):
+    return '/'.join(quote(part) for part in '/'.join(parts).split('/'))
+
+
+def load_plays(rollup_dir, today, window_days, half_life):
+    """Return {mix_id: [score, plays]} from the day rollups within the window."""
+    plays = {}
+    for path in sorted(Path(rollup_dir).glob('*.json')):
+        try:
+            day = date.fromisoformat(path.stem)
+        except ValueError:
+            continue  # state.json, undated.json
+        age = (today - day).days
+        if age < 0 or age >= window_days:
+            continue
+        with open(path) as f:
+            mixes = json.load(f).get('mixes', {})
+        weight = 0.5 ** (age / half_life)
+        for mix_id, count in mixes.items():
+            entry = plays.setdefault(mix_id, [0.0, 0])
+            entry[0] += count * weight
+            entry[1] += count
+    return plays
+
+
+def audio_range(dj_dir, mix, seconds):
+    """Return the Range header covering the first seconds of the mix's audio."""
+    seek_path = dj_dir / f"{mix['file']}.seek.bin"
+    if mix.get('hasSeekIndex') and mix['audioFile'].lower().endswith('.mp3') and seek_path.exists():
+        with open(seek_path, 'rb') as f:
+            magic, interval_ms, _, _, _, size, entries = SEEK_HEADER.unpack(f.read(SEEK_HEADER.size))
+            index = math.ceil(seconds * 1000 / interval_ms)
+            if magic == b'MSK1' and index < entries:
+                f.seek(SEEK_HEADER.size + index * 4)
+                end = struct.unpack('<I', f.read(4))[0]
+                return f"bytes=0-{end - 1}"
+            if magic == b'MSK1':
+                return f"bytes=0-{size - 1}"
+    return f"bytes=0-{PREFETCH_BYTES - 1}"
+
+
+class Manifests:
+    """DJ manifests under mixes/, loaded on first use and indexed by file."""
+
+    def __init__(self, mixes_dir):
+        self.mixes_dir = Path(mixes_dir)
+        self.djs = {}
+
+    def find(self, mix_id):
+        """Return (dj_dir, mix) for a <djPath>/<file> id, or None."""
+        dj_path, _, file = mix_id.rpartition('/')
+        if not dj_path or not file:
+            return None
+        if dj_path not in self.djs:
+            dj_dir = self.mixes_dir / dj_path
+            try:
+                with open(dj_dir / 'manifest.json') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                manifest = {}
+            self.djs[dj_path] = (dj_dir, {m['file']: m for m in manifest.get('mixes', []) if m.get('file')})
+        dj_dir, mixes = self.djs[dj_path]
+        mix = mixes.get(file)
+        return (dj_dir, mix) if mix else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate mixes/hot.json from beacon.log play counts')
+    parser.add_argument('base_directory', nargs='?', default='.', help='Site root (default: .)')
+    parser.add_argument('--rollups', help='Rollup directory (default: base_directory/beacon-rollups)')
+    parser.add_argument('--top', type=int, default=TOP, help='Number of mixes to list')
+    parser.add_argument('--half-life', type=float, default=HALF_LIFE_DAYS, help='Days for a play to lose half its weight')
+    parser.add_argument('--days', type=int, default=WINDOW_DAYS, help='Ignore plays older than this')
+    parser.add_argument('--prefetch', type=float, default=PREFETCH_SECONDS, help='Seconds of audio in audioRange')
+    args = parser.parse_args()
+
+    base_directory = Path(args.base_directory)
+    rollup_dir = Path(args.rollups) if args.rollups else base_directory / 'beacon-rollups'
+    mixes_dir = base_directory / 'mixes'
+    if not rollup_dir.is_dir():
+        print(f"No rollups in {rollup_dir} (run tools/rollup-beacons.py first)")
+        return
+
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    plays = load_plays(rollup_dir, now.date(), args.days, args.half_life)
+    manifests = Manifests(mixes_dir)
+
+    hot = []
+    unknown = 0
+    for mix_id, (score, count) in sorted(plays.items(), key=lambda item: -item[1][0]):
+        if len(hot) >= args.top:
+            break
+        found = manifests.find(mix_id)
+        if not found:
+            unknown += 1
+            continue
+        dj_dir, mix = found
+        dj_path = mix_id.rpartition('/')[0]
+        entry = {
+            'id': mix_id,
+            'name': mix.get('name', mix['file']),
+            'dj': Path(dj_path).name,
+            'djPath': dj_path,
+            'file': mix['file'],
+            'duration': mix.get('duration', 0),
+            'score': round(score, 2),
+            'plays': count,
+            'audio': url_path(dj_path, mix['audioFile']),
+            'audioRange': audio_range(dj_dir, mix, args.prefetch)
+        }
+        peaks_file = mix.get('peaksFile') or f"{mix['file']}.peaks.json"
+        if (dj_dir / peaks_file).exists():
+            entry['peaks'] = url_path('mixes', dj_path, peaks_file)
+        if mix.get('coverFile'):
+            entry['cover'] = url_path('mixes', dj_path, mix['coverFile'])
+        hot.append(entry)
+
+    output_path = mixes_dir / 'hot.json'
+    with open(output_path, 'w') as f:
+        json.dump({
+            'generated': now.isoformat(timespec='seconds'),
+            'halfLifeDays': args.half_life,
+            'mixes': hot
+        }, f, indent=2, ensure_ascii=False)
+    print(f"Wrote {len(hot)} of {len(plays)} played mixes to {output_path} "
+          f"({unknown} unknown ids skipped, {time.perf_counter() - started:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
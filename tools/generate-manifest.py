@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 """
 Generate manifest.json files from audio file metadata.
-Requires: ffprobe (part of ffmpeg)
+Requires: ffprobe (part of ffmpeg), for containers mediatags.py cannot read
 
 Usage: 
     ./tools/generate-manifest.py [directory] [dj_name ...]
     ./tools/generate-manifest.py --source /path/to/audio [output_directory]
+    ./tools/generate-manifest.py --remote https://host/mixes/ [output_directory] [dj_name ...]
 
 Default directory is 'mixes/' when audio-source-config.json is present,
 otherwise current directory.
@@ -14,40 +15,82 @@ Scans DJ subdirectories, reads metadata from audio files, writes manifest.json.
 If --source is specified, reads audio files from source directory and writes
 manifests to the output directory (or current directory if not specified).
 This allows separating audio files from generated artifacts.
+
+If --remote is specified, reads an HTTP mirror of mixes/ (with directory
+listings and Range support, e.g. one of the mixesBaseUrls) and writes
+manifests to the output directory in the same <dj>/ and moreDJs/<dj>/
+layout. Only the header of each audio file is fetched (see tools/remote.py).
+
+Mixes with content-hashed peaks (generate-peaks.py --hashed) get a peaksFile
+entry naming the newest version; older versions are deleted once they are
+past the grace period in tools/artifacts.py. Mixes with a .tracks.json from
+detect-tracks.py (and no .tracks.txt) get hasSuggestedTracks.
+
+Tags and durations are read from the container header (mediatags.py), for
+local and remote files alike, with ffprobe only for containers it cannot
+parse. They are cached in the shared file catalog (tools/catalog.py), so
+only new or changed files are read.
+
+Alongside manifest.json, manifest.summary.json lists just what the mix list
+needs (name, duration, artist, genre, cover) and points at detail pages of
+PAGE_SIZE full entries, which the player fetches when a mix is played, so
+first paint for a DJ with hundreds of mixes has a bounded payload.
+
+Each download of a local mix is listed with its byte size and SHA-256, so
+proxies and clients can verify and deduplicate cached copies. Checksums are
+cached in the catalog by size and mtime, so unchanged files are hashed once.
+
+--stats out.json writes per-file timings; --profile out.prof runs under
+cProfile (see tools/toolstats.py).
 """
 
-import subprocess
 import json
 import os
 import sys
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import toolstats
+from artifacts import PEAKS_SUFFIX, collect_garbage, latest_versions, write_hashed
+from catalog import (AUDIO_EXTENSIONS, RENDITION_PATTERN, Catalog, file_sha256, find_dj_directories, folder_routing,
+                     load_config, probe_metadata, rendition_bitrate, routed_output)
+from remote import Session
+
+REMOTE_JOBS = 8  # Remote files probed at once (connections per host are capped separately)
+CHECKSUM_JOBS = 4  # Downloads hashed at once
+PAGE_SIZE = 50     # Mixes per detail page of the summary manifest
+PAGE_SUFFIX = '.page.json'
+SUMMARY_FIELDS = ('file', 'name', 'duration', 'durationFormatted', 'artist', 'genre', 'coverFile')
+
+STATS = toolstats.Stats('generate-manifest')
+
 def natural_sort_key(s):
     """Generate sort key that handles numeric sequences naturally."""
     return [int(text) if text.isdigit() else text.lower() 
             for text in re.split(r'(\d+)', s)]
 
-def get_audio_metadata(audio_path):
-    """Extract metadata from audio file using ffprobe."""
+def get_audio_metadata(audio_path, catalog=None, routing=None, remote_dir=None):
+    """
+    Extract metadata from audio file, via the file catalog when given (its header otherwise).
+    
+    With remote_dir, audio_path is the name of a file in that remote folder.
+    """
     try:
-        proc = subprocess.Popen([
-            'ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format',
-            str(audio_path)
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, _ = proc.communicate()
-        
-        data = json.loads(stdout.decode('utf-8'))
-        fmt = data.get('format', {})
-        tags = fmt.get('tags', {})
-        
-        # Handle case-insensitive tag names, fall back to album if no title
-        title = tags.get('title') or tags.get('TITLE') or tags.get('album') or tags.get('ALBUM') or ''
-        artist = tags.get('artist') or tags.get('ARTIST') or ''
-        genre = tags.get('genre') or tags.get('GENRE') or ''
-        date = tags.get('date') or tags.get('DATE') or ''
-        comment = tags.get('comment') or tags.get('COMMENT') or ''
-        duration = float(fmt.get('duration', 0))
+        if remote_dir:
+            tags, duration = remote_dir.metadata(audio_path)
+        elif catalog:
+            probed = catalog.metadata(audio_path, Path(audio_path).parent.name, routing, need_duration=True)
+            tags, duration = probed['tags'], probed['duration']
+        else:
+            tags, duration = probe_metadata(audio_path)
+        
+        # Tag names are lower-cased; fall back to album if no title
+        title = tags.get('title') or tags.get('album') or ''
+        artist = tags.get('artist') or ''
+        genre = tags.get('genre') or ''
+        date = tags.get('date') or ''
+        comment = tags.get('comment') or ''
         
         return {
             'title': title,
@@ -55,7 +98,7 @@ def get_audio_metadata(audio_path):
             'genre': genre,
             'date': date,
             'comment': comment,
-            'duration': duration
+            'duration': duration or 0.0
         }
     except Exception as e:
         print(f"  Error reading {audio_path}: {e}")
@@ -122,56 +165,212 @@ def extract_dj_and_mix_from_filename(filename, folder_name):
         # Replace hyphens with spaces
         return folder_name, display_name.replace('-', ' ')
 
-def find_best_audio_file(directory, base_name):
-    """Find the best audio file for a given base name (prefer FLAC for metadata, MP3 for playback)."""
+def find_best_audio_file(filenames, base_name):
+    """Find the best audio file name for a given base name among filenames (prefer FLAC for metadata, MP3 for playback)."""
     extensions = ['.flac', '.m4a', '.mp3', '.opus']
     for ext in extensions:
-        path = directory / f"{base_name}{ext}"
-        if path.exists():
-            return path
+        if f"{base_name}{ext}" in filenames:
+            return f"{base_name}{ext}"
     return None
 
-def find_download_files(directory, base_name):
-    """Find all download formats available for a mix."""
+def find_download_files(filenames, base_name):
+    """Find all download formats available for a mix among filenames."""
     extensions = [('.flac', 'FLAC'), ('.mp3', 'MP3'), ('.m4a', 'M4A'), ('.opus', 'OPUS')]
     downloads = []
     for ext, label in extensions:
-        path = directory / f"{base_name}{ext}"
-        if path.exists():
+        if f"{base_name}{ext}" in filenames:
             downloads.append({
                 'file': f"{base_name}{ext}",
                 'label': label
             })
     return downloads
 
-def process_directory(directory):
+def checksum_downloads(filenames, base_names, checksum):
+    """
+    Hash every download of the given mixes with checksum(filename), in a thread pool.
+    
+    Returns {filename: {'bytes', 'sha256'}}; files that cannot be read are left out.
+    """
+    names = sorted({d['file'] for base_name in base_names for d in find_download_files(filenames, base_name)})
+    
+    def safe_checksum(filename):
+        try:
+            return checksum(filename)
+        except OSError as e:
+            print(f"  Warning: Could not hash {filename}: {e}")
+            return None
+    
+    with ThreadPoolExecutor(max_workers=CHECKSUM_JOBS) as pool:
+        results = dict(zip(names, pool.map(safe_checksum, names)))
+    hashed = [r for r in results.values() if r and not r['cached']]
+    if hashed:
+        print(f"  Hashed {len(hashed)} downloads ({sum(r['bytes'] for r in hashed) / 1024 / 1024:.0f}MB)")
+    return {name: {'bytes': r['bytes'], 'sha256': r['sha256']} for name, r in results.items() if r}
+
+def find_renditions(directory):
+    """
+    Find low-bitrate renditions written by generate-renditions.py.
+    
+    Returns {base_name: [{'file', 'format', 'bitrate', 'bytes'}, ...]} sorted by bitrate.
+    """
+    renditions = {}
+    if not directory.exists():
+        return renditions
+    for f in directory.iterdir():
+        kbps = rendition_bitrate(f.name)
+        if kbps and f.is_file():
+            renditions.setdefault(RENDITION_PATTERN.sub('', f.name), []).append({
+                'file': f.name,
+                'format': 'opus',
+                'bitrate': kbps,
+                'bytes': f.stat().st_size
+            })
+    for entries in renditions.values():
+        entries.sort(key=lambda r: r['bitrate'])
+    return renditions
+
+def load_cover_index(directory):
+    """
+    Load covers.json written by generate-covers.py.
+    
+    Returns ({base_name: entry}, sprite_section_or_None).
+    """
+    covers_path = directory / 'covers.json'
+    if not covers_path.exists():
+        return {}, None
+    try:
+        with open(covers_path) as f:
+            data = json.load(f)
+        return data.get('covers', {}), data.get('sprite')
+    except Exception as e:
+        print(f"  Warning: Could not load {covers_path}: {e}")
+        return {}, None
+
+def process_directory(directory, catalog=None):
     """Process a DJ directory and generate manifest.json (read and write in same directory)."""
-    process_directory_split(directory, directory)
+    process_directory_split(directory, directory, catalog, folder_routing(directory))
 
-def process_directory_split(source_directory, output_directory):
-    """Process a DJ directory, reading audio from source, writing manifest to output."""
+def process_directory_split(source_directory, output_directory, catalog=None, routing=None):
+    """
+    Process a DJ directory, reading audio from source, writing manifest to output.
+    
+    With a catalog, tags and durations are only probed for new or changed
+    files, and the peaks/tracklist/cover files referenced by the manifest
+    are recorded as artifacts of the audio file they were derived from.
+    """
     source_directory = Path(source_directory)
+    audio_files = [f for f in source_directory.iterdir()
+                   if f.suffix.lower() in AUDIO_EXTENSIONS and not rendition_bitrate(f.name)]
+    
+    if catalog:
+        catalog.prune(source_directory, audio_files)
+    
+    def read_metadata(filename):
+        with STATS.file(source_directory / filename):
+            return get_audio_metadata(source_directory / filename, catalog, routing)
+    
+    def record_artifacts(filename, artifacts):
+        if catalog:
+            for kind, artifact in artifacts:
+                catalog.record_artifact(source_directory / filename, kind, artifact)
+    
+    def checksum(filename):
+        path = source_directory / filename
+        with STATS.file(path), toolstats.stage('hash'):
+            if catalog:
+                result = catalog.checksum(path)
+            else:
+                result = {'bytes': path.stat().st_size, 'sha256': file_sha256(path), 'cached': False}
+            if not result['cached']:
+                toolstats.read(result['bytes'])
+            return result
+    
+    write_manifest(source_directory.name, {f.name for f in audio_files}, output_directory,
+                   read_metadata, record_artifacts, checksum)
+
+def write_summary(output_directory, manifest, page_size=PAGE_SIZE):
+    """
+    Write manifest.summary.json and its detail pages next to manifest.json.
+    
+    The summary lists SUMMARY_FIELDS of each mix (plus info when it has a
+    date or comment), enough to draw the mix list, and names the pages:
+    page n holds the full manifest entries of mixes n*pageSize onwards, in
+    the same order. Pages are content-hashed (see tools/artifacts.py) and
+    superseded ones are deleted after the grace period.
+    """
+    mixes = manifest['mixes']
+    pages = [write_hashed(output_directory, f"manifest.{i // page_size}", PAGE_SUFFIX,
+                          json.dumps({'mixes': mixes[i:i + page_size]}, separators=(',', ':')).encode('utf-8'))
+             for i in range(0, len(mixes), page_size)]
+    
+    entries = []
+    for mix in mixes:
+        entry = {key: mix[key] for key in SUMMARY_FIELDS if key in mix}
+        if mix.get('date') or mix.get('comment'):
+            entry['info'] = True
+        entries.append(entry)
+    summary = {'generated': True, 'pageSize': page_size, 'pages': pages, 'mixes': entries}
+    if 'coverSprite' in manifest:
+        summary['coverSprite'] = manifest['coverSprite']
+    
+    with open(output_directory / 'manifest.summary.json', 'w') as f:
+        json.dump(summary, f, separators=(',', ':'))
+    collect_garbage(output_directory, PAGE_SUFFIX, keep=set(pages))
+    print(f"  Wrote manifest.summary.json ({len(pages)} detail pages)")
+
+def process_remote_directory(remote_dir, output_directory, jobs=REMOTE_JOBS):
+    """
+    Process a remote DJ folder (see tools/remote.py), writing manifest to output.
+    
+    Tags and durations come from Range reads of each file's header, jobs
+    files at a time; the audio itself is never downloaded.
+    """
+    filenames = {f for f in remote_dir.files if Path(f).suffix.lower() in AUDIO_EXTENSIONS and not rendition_bitrate(f)}
+    probe_names = sorted({find_best_audio_file(filenames, Path(f).stem) for f in filenames})
+    
+    def probe(filename):
+        with STATS.file(remote_dir.file_url(filename)):
+            return filename, get_audio_metadata(filename, remote_dir=remote_dir)
+    
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        probed = dict(pool.map(probe, probe_names))
+    
+    write_manifest(remote_dir.name, filenames, output_directory, probed.get)
+
+def write_manifest(dj_name, filenames, output_directory, read_metadata, record_artifacts=None, checksum=None):
+    """
+    Write manifest.json for one DJ folder.
+    
+    filenames are the audio files in the folder; read_metadata(filename)
+    returns get_audio_metadata() output for one of them, and
+    record_artifacts(filename, [(kind, path)]) is told which peaks,
+    tracklist and cover files the manifest references. checksum(filename)
+    returns {'bytes', 'sha256', 'cached'} for a download; the downloads of
+    the folder are hashed CHECKSUM_JOBS at a time.
+    """
     output_directory = Path(output_directory)
-    extensions = {'.mp3', '.flac', '.m4a', '.opus'}
     
-    # Find unique base names (without extension) in source directory
-    base_names = set()
-    for f in source_directory.iterdir():
-        if f.suffix.lower() in extensions:
-            base_names.add(f.stem)
+    # Find unique base names (without extension)
+    base_names = {Path(f).stem for f in filenames}
     
     if not base_names:
         print(f"  No audio files found")
         return
     
     mixes = []
+    renditions = find_renditions(output_directory)
+    cover_index, cover_sprite = load_cover_index(output_directory)
+    if cover_sprite and not (output_directory / cover_sprite['file']).exists():
+        cover_sprite = None
+    hashed_peaks = latest_versions(output_directory, PEAKS_SUFFIX)
+    checksums = checksum_downloads(filenames, base_names, checksum) if checksum else {}
     
     for base_name in sorted(base_names):
-        audio_file = find_best_audio_file(source_directory, base_name)
+        audio_file = find_best_audio_file(filenames, base_name)
         if not audio_file:
             continue
         
-        meta = get_audio_metadata(audio_file)
+        meta = read_metadata(audio_file)
         if not meta:
             continue
         
@@ -180,40 +379,57 @@ def process_directory_split(source_directory, output_directory):
             title = meta['title']
         else:
             # Fallback: extract from filename
-            _, mix_name = extract_dj_and_mix_from_filename(base_name, source_directory.name)
+            _, mix_name = extract_dj_and_mix_from_filename(base_name, dj_name)
             title = mix_name
         
         # Special case: strip "estimulo", "show", "estimuloshow" prefixes for estimulo
-        if source_directory.name.lower() == 'estimulo':
+        if dj_name.lower() == 'estimulo':
             cleaned = re.sub(r'^(estimuloshow|estimulo\s*show|estimulo|show)\s*', '', title, flags=re.IGNORECASE).strip()
             cleaned = cleaned.lstrip('_- ')
             if cleaned:
                 title = cleaned
         
-        # Check for peaks file in output directory
-        peaks_file = output_directory / f"{base_name}.peaks.json"
+        # Check for peaks file in output directory (the newest content-hashed
+        # version from generate-peaks.py --hashed wins over the fixed name)
+        peaks_file = output_directory / hashed_peaks.get(base_name, f"{base_name}{PEAKS_SUFFIX}")
         has_peaks = peaks_file.exists()
         
         # Check for tracklist file in output directory
         tracks_file = output_directory / f"{base_name}.tracks.txt"
         has_tracklist = tracks_file.exists()
+        has_suggested_tracks = not has_tracklist and (output_directory / f"{base_name}.tracks.json").exists()
+        
+        # Check for MP3 seek index (generate-seek-index.py) in output directory
+        seek_file = output_directory / f"{base_name}.seek.bin"
+        has_seek_index = f"{base_name}.mp3" in filenames and seek_file.exists()
+        
+        # Check for HLS package (package-hls.py) in output directory
+        hls_playlist = output_directory / f"{base_name}.hls" / 'index.m3u8'
+        has_hls = hls_playlist.exists()
         
-        # Check for cover art file in output directory
+        # Check for cover art file in output directory (covers.json may map
+        # the mix to a cover shared with other mixes)
         cover_file = None
-        for ext in ['.jpg', '.png', '.gif']:
-            potential = output_directory / f"{base_name}{ext}"
-            if potential.exists():
-                cover_file = f"{base_name}{ext}"
-                break
+        cover_info = cover_index.get(base_name, {})
+        if cover_info.get('file') and (output_directory / cover_info['file']).exists():
+            cover_file = cover_info['file']
+        else:
+            for ext in ['.jpg', '.png', '.gif', '.webp']:
+                potential = output_directory / f"{base_name}{ext}"
+                if potential.exists():
+                    cover_file = f"{base_name}{ext}"
+                    break
         
         # Find available download formats (check source directory)
-        downloads = find_download_files(source_directory, base_name)
+        downloads = find_download_files(filenames, base_name)
+        for download in downloads:
+            download.update(checksums.get(download['file'], {}))
         
         # Determine primary audio file (prefer MP3 for streaming)
-        primary_audio = f"{base_name}.mp3" if (source_directory / f"{base_name}.mp3").exists() else audio_file.name
+        primary_audio = f"{base_name}.mp3" if f"{base_name}.mp3" in filenames else audio_file
         
         # Use artist from metadata, fall back to folder name if empty
-        artist = meta['artist'] or source_directory.name
+        artist = meta['artist'] or dj_name
         
         mix_entry = {
             'name': title,
@@ -233,8 +449,33 @@ def process_directory_split(source_directory, output_directory):
             mix_entry['comment'] = meta['comment']
         if has_tracklist:
             mix_entry['hasTracklist'] = True
+        if has_suggested_tracks:
+            mix_entry['hasSuggestedTracks'] = True
+        if base_name in hashed_peaks:
+            mix_entry['peaksFile'] = hashed_peaks[base_name]
+        if has_seek_index:
+            mix_entry['hasSeekIndex'] = True
+        if has_hls:
+            mix_entry['hlsPlaylist'] = f"{base_name}.hls/index.m3u8"
+        if renditions.get(base_name):
+            mix_entry['renditions'] = renditions[base_name]
         if cover_file:
             mix_entry['coverFile'] = cover_file
+            if cover_info.get('file') == cover_file:
+                if cover_info.get('thumbs'):
+                    mix_entry['coverThumbs'] = cover_info['thumbs']
+                    if cover_info.get('width'):
+                        mix_entry['coverWidth'] = cover_info['width']
+                if cover_info.get('placeholder'):
+                    mix_entry['coverPlaceholder'] = cover_info['placeholder']
+                if cover_sprite and cover_info.get('sprite'):
+                    mix_entry['coverSprite'] = cover_info['sprite']
+        
+        if record_artifacts:
+            artifacts = [('peaks', peaks_file, has_peaks), ('tracklist', tracks_file, has_tracklist),
+                         ('seek', seek_file, has_seek_index), ('hls', hls_playlist, has_hls),
+                         ('cover', output_directory / (cover_file or ''), bool(cover_file))]
+            record_artifacts(audio_file, [(kind, artifact) for kind, artifact, exists in artifacts if exists])
         
         mixes.append(mix_entry)
         print(f"  {base_name}: \"{title}\" ({format_duration(meta['duration'])})")
@@ -247,52 +488,63 @@ def process_directory_split(source_directory, output_directory):
         'generated': True,
         'mixes': mixes
     }
+    if cover_sprite and any('coverSprite' in m for m in mixes):
+        manifest['coverSprite'] = {
+            'file': cover_sprite['file'],
+            'width': cover_sprite['width'],
+            'height': cover_sprite['height'],
+            'cell': cover_sprite['cell']
+        }
     
     manifest_path = output_directory / 'manifest.json'
     with open(manifest_path, 'w') as f:
         json.dump(manifest, f, indent=2)
     
     print(f"  Wrote manifest.json ({len(mixes)} mixes)")
+    write_summary(output_directory, manifest)
+    
+    # Superseded hashed peaks are kept for a grace period for clients still
+    # holding the previous manifest
+    removed, freed = collect_garbage(output_directory, PEAKS_SUFFIX, keep={m['peaksFile'] for m in mixes if 'peaksFile' in m})
+    if removed:
+        print(f"  Removed {removed} superseded peaks files ({freed / 1024:.0f} KB)")
 
-def find_dj_directories(base_directory):
-     """Find all directories containing audio files, including nested ones in moreDJs/."""
-     dj_dirs = []
-     extensions = {'.mp3', '.flac', '.m4a', '.opus'}
-     
-     for entry in base_directory.iterdir():
-         if entry.is_dir() and not entry.name.startswith('.'):
-             if entry.name == 'moreDJs':
-                 # Scan subdirectories within moreDJs
-                 for subentry in entry.iterdir():
-                     if subentry.is_dir():
-                         has_audio = any(f.suffix.lower() in extensions for f in subentry.iterdir() if f.is_file())
-                         if has_audio:
-                             dj_dirs.append(subentry)
-             else:
-                 # Check all root-level directories
-                 has_audio = any(f.suffix.lower() in extensions for f in entry.iterdir() if f.is_file())
-                 if has_audio:
-                     dj_dirs.append(entry)
-     
-     return sorted(dj_dirs, key=lambda p: p.name.lower())
-
-def load_config():
-    """Load audio source configuration, merging deployed config with local tool config."""
-    config = {}
-    for config_path in [Path('mixes/audio-source-config.json'), Path('tools/tool-config.json')]:
-        if config_path.exists():
-            try:
-                with open(config_path) as f:
-                    config.update(json.load(f))
-            except Exception as e:
-                print(f"Warning: Could not load {config_path}: {e}")
-    return config or None
+def main_remote(args):
+    """Handle --remote URL [output_directory] [dj_name ...]."""
+    if not args:
+        print("Error: --remote requires a base URL argument")
+        sys.exit(1)
+    base_url = args[0]
+    output_dir = Path(args[1]) if len(args) > 1 else Path('.')
+    specific_djs = args[2:]
+    
+    print(f"Reading audio from: {base_url}")
+    print(f"Writing manifests to: {output_dir}")
+    with Session() as session:
+        dj_dirs = session.list_dj_directories(base_url)
+        if specific_djs:
+            dj_dirs = [d for d in dj_dirs if d.name in specific_djs]
+            if not dj_dirs:
+                print(f"Error: No matching DJ folders found for: {', '.join(specific_djs)}")
+                sys.exit(1)
+        
+        # The remote tree is already laid out as mixes/, so mirror it
+        for remote_dir in dj_dirs:
+            output_path = output_dir / remote_dir.path
+            output_path.mkdir(parents=True, exist_ok=True)
+            print(f"\n=== {remote_dir.path} ===")
+            process_remote_directory(remote_dir, output_path)
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--remote':
+        main_remote(sys.argv[2:])
+        return
+    
     source_dir = None
     output_dir = None
     config = load_config()
     specific_djs = []
+    catalog = Catalog()
     
     # Parse arguments
     if len(sys.argv) > 1 and sys.argv[1] == '--source':
@@ -346,15 +598,12 @@ def main():
             source_name = source_folder.name
             
             # Determine correct output path: main DJs in output_dir/, others in output_dir/moreDJs/
-            if source_name in main_djs:
-                output_path = output_dir / source_name
-            else:
-                output_path = output_dir / 'moreDJs' / source_name
+            routing, output_path = routed_output(source_name, output_dir, main_djs)
             
             output_path.mkdir(parents=True, exist_ok=True)
             
             print(f"\n=== {source_name} ===")
-            process_directory_split(source_folder, output_path)
+            process_directory_split(source_folder, output_path, catalog, routing)
     else:
         # Original behavior: find and process all DJ directories in place
         if len(sys.argv) > 1 and (output_dir / 'manifest.json').parent != output_dir.parent:
@@ -363,7 +612,8 @@ def main():
             has_audio = any(f.suffix.lower() in extensions for f in output_dir.iterdir() if f.is_file())
             if has_audio:
                 print(f"\n=== {output_dir.name} ===")
-                process_directory(output_dir)
+                process_directory(output_dir, catalog)
+                catalog.close()
                 return
         
         # Otherwise, find and process all DJ directories
@@ -383,7 +633,10 @@ def main():
         for dj_dir in dj_dirs:
             relative = dj_dir.relative_to(output_dir)
             print(f"\n=== {relative} ===")
-            process_directory(dj_dir)
+            process_directory(dj_dir, catalog)
+    
+    catalog.close()
 
 if __name__ == '__main__':
-    main()
+    sys.argv[1:], stats_path, profile_path = toolstats.take_options(sys.argv[1:])
+    toolstats.run_main(main, STATS, stats_path, profile_path)
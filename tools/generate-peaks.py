@@ -6,68 +6,169 @@ Requires: ffmpeg
 Usage: 
     ./tools/generate-peaks.py [directory] [dj_name ...]
     ./tools/generate-peaks.py --source /path/to/audio [output_directory]
+    ./tools/generate-peaks.py --remote https://host/mixes/ [output_directory] [dj_name ...]
     ./tools/generate-peaks.py --force [directory] [dj_name ...]
+    ./tools/generate-peaks.py --pcm-cache [directory] [dj_name ...]
+    ./tools/generate-peaks.py --hashed [directory] [dj_name ...]
+    ./tools/generate-peaks.py --retry-failed [directory] [dj_name ...]
+    ./tools/generate-peaks.py --stats stats.json --profile peaks.prof [directory]
 
 Default directory is 'mixes/' when audio-source-config.json is present,
 otherwise current directory.
-Processes all .mp3 and .flac files, creates .peaks.json files.
+Processes all .mp3 and .flac files, creates .peaks.json files with the peaks
+and, from the same decode, low/mid/high band levels per peak (see BANDS).
 
 If --source is specified, reads audio from source and writes peaks to output directory.
+If --remote is specified, reads audio from an HTTP mirror of mixes/ (with
+directory listings and Range support) without downloading it first, and
+writes peaks to output directory in the same <dj>/ and moreDJs/<dj>/ layout
+(see tools/remote.py).
 If --force is specified, regenerates peaks even if they already exist.
+If --pcm-cache is specified, local files are decoded through the shared
+decoded-PCM cache (see tools/pcmcache.py): the first run decodes each file
+once into the cache, later runs (and other analysis passes) read the cached
+samples instead of running ffmpeg. Peaks are then taken from SAMPLE_RATE
+samples rather than from a decode at a few hundred Hz, so values can differ
+slightly from uncached runs.
+If --hashed is specified, peaks are written as <mix>.<hash>.peaks.json, named
+after a hash of their content, for immutable caching (see tools/artifacts.py);
+generate-manifest.py points each mix at its newest peaks file.
+ffmpeg runs under tools/supervise.py: decodes time out in proportion to the
+mix's duration, and files that fail are quarantined and skipped on later
+runs until they change, unless --retry-failed is specified.
+--stats out.json writes per-file timings; --profile out.prof runs under
+cProfile (see tools/toolstats.py).
 """
 
-import subprocess
+import array
 import json
+import math
 import os
 import sys
-import struct
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import mediatags
+import supervise
+import toolstats
+from artifacts import PEAKS_SUFFIX, latest_versions, write_hashed
+from catalog import load_config, rendition_bitrate
+from pcmcache import SAMPLE_FORMAT, SAMPLE_RATE, PCMCache
+from remote import Session
 
 SAMPLES_PER_PEAK = 1000  # Number of peaks to generate
 PRECISION = 3            # Decimal digits for peak values
+REMOTE_JOBS = 8          # Remote files decoded at once (connections per host are capped separately)
+PEAK_EXTENSIONS = ('.mp3', '.flac', '.m4a', '.wav', '.opus')
+BAND_RATE = SAMPLE_RATE  # Hz: bands are filtered at the PCM cache's rate
+BAND_LEVELS = 255        # Band levels are quantized to 0..BAND_LEVELS
+BANDS = [                # (name, low cutoff Hz, high cutoff Hz)
+    ('low', None, 250),
+    ('mid', 250, 2500),
+    ('high', 2500, None),
+]
+
+STATS = toolstats.Stats('generate-peaks')
+QUARANTINE = supervise.Quarantine('generate-peaks')
+
+def get_audio_peaks(audio_path, num_peaks=SAMPLES_PER_PEAK, duration=None, stream=None, pcm_cache=None):
+    """Extract peaks from audio file; returns (peaks, duration). See get_audio_waveform()."""
+    peaks, _, duration = get_audio_waveform(audio_path, num_peaks, duration, stream, pcm_cache)
+    return peaks, duration
 
-def get_audio_peaks(audio_path, num_peaks=SAMPLES_PER_PEAK):
-    """Extract peaks from audio file using ffmpeg."""
+def get_audio_waveform(audio_path, num_peaks=SAMPLES_PER_PEAK, duration=None, stream=None, pcm_cache=None):
+    """
+    Extract peaks and low/mid/high band levels from audio file using ffmpeg.
+    
+    audio_path may also be a URL. duration is probed when not given; with
+    stream (an iterable of byte chunks) the audio is piped to ffmpeg's stdin.
+    With pcm_cache (a PCMCache) a local file's samples come from the cache,
+    and only the band levels are computed by ffmpeg (from the cached PCM).
+    Returns (peaks, bands, duration); bands maps each of BANDS to a list of
+    levels aligned with peaks.
+    """
+    
+    if pcm_cache is not None:
+        with pcm_cache.open(audio_path) as pcm:
+            duration = duration or pcm.duration
+            if not pcm.samples:
+                return None, None, duration
+            peaks = peaks_from_samples(pcm.samples, num_peaks)
+            input_args = ['-f', SAMPLE_FORMAT, '-ar', str(pcm.sample_rate), '-ac', '1', '-i', str(pcm.path)]
+            frames = decode_levels(input_args, envelope_rate(num_peaks, duration), duration=duration)
+        return peaks, bands_from_frames(frames, num_peaks), duration
     
     # Get duration first
-    proc = subprocess.Popen([
-        'ffprobe', '-v', 'quiet', '-show_entries', 'format=duration',
-        '-of', 'default=noprint_wrappers=1:nokey=1', audio_path
-    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, _ = proc.communicate()
-    
-    duration = float(stdout.decode().strip())
-    
-    # Calculate samples needed (low sample rate for efficiency)
-    sample_rate = max(100, int(num_peaks / duration * 10))
-    
-    # Extract raw audio samples using ffmpeg
-    proc = subprocess.Popen([
-        'ffmpeg', '-i', audio_path,
-        '-ac', '1',  # mono
-        '-ar', str(sample_rate),  # low sample rate
-        '-f', 's16le',  # 16-bit signed little-endian
+    if duration is None:
+        stdout = supervise.run([
+            'ffprobe', '-v', 'quiet', '-show_entries', 'format=duration',
+            '-of', 'default=noprint_wrappers=1:nokey=1', audio_path
+        ], stage='probe').stdout
+        duration = float(stdout.decode().strip())
+    
+    # One decode gives the signal and the band levels at a low sample rate
+    input_args = ['-i', 'pipe:0' if stream is not None else audio_path]
+    frames = decode_levels(input_args, envelope_rate(num_peaks, duration), stream, duration)
+    if os.path.exists(audio_path):
+        toolstats.read(os.path.getsize(audio_path))
+    
+    if not frames[0]:
+        return None, None, duration
+    
+    return peaks_from_samples(frames[0], num_peaks), bands_from_frames(frames, num_peaks), duration
+
+def envelope_rate(num_peaks, duration):
+    """Sample rate of the decoded signal and band levels (low for efficiency)."""
+    return max(100, int(num_peaks / duration * 10))
+
+def decode_levels(input_args, sample_rate, stream=None, duration=None):
+    """
+    Decode with ffmpeg into 1 + len(BANDS) channels at sample_rate.
+    
+    Channel 0 is the mono signal. Each other channel is one band of BANDS:
+    the mono signal at BAND_RATE, band-filtered and squared in ffmpeg, so
+    resampling down to sample_rate leaves its mean power. Squaring with
+    amultiply is native code, where aeval=abs() evaluated an expression
+    per sample and dominated the decode. Samples are floats, so quiet bands
+    keep their precision once squared. duration (in seconds) sets the decode
+    timeout. Returns one array of samples per channel.
+    """
+    channels = len(BANDS) + 1
+    graph = [f"[0:a]aformat=channel_layouts=mono,aresample={BAND_RATE},asplit={channels}"
+             + ''.join(f"[in{i}]" for i in range(channels))]
+    graph.append(f"[in0]aresample={sample_rate}[out0]")
+    for i, (_, low, high) in enumerate(BANDS, 1):
+        filters = ([f"highpass=f={low}"] if low else []) + ([f"lowpass=f={high}"] if high else [])
+        graph.append(f"[in{i}]{','.join(filters)},asplit=2[band{i}][copy{i}]")
+        graph.append(f"[band{i}][copy{i}]amultiply,aresample={sample_rate}[out{i}]")
+    graph.append(''.join(f"[out{i}]" for i in range(channels)) + f"amerge=inputs={channels}[out]")
+    
+    result = supervise.run([
+        'ffmpeg', *input_args,
+        '-filter_complex', ';'.join(graph),
+        '-map', '[out]',
+        '-f', 'f32le',  # 32-bit float little-endian, channels interleaved
         '-v', 'quiet',
         '-'
-    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, _ = proc.communicate()
-    
-    # Parse samples
-    samples = []
-    data = stdout
-    for i in range(0, len(data) - 1, 2):
-        sample = struct.unpack('<h', data[i:i+2])[0]
-        samples.append(abs(sample) / 32768.0)  # Normalize to 0-1
+    ], stage='decode', input=stream, duration=duration)
+    stdout = result.stdout
+    if result.returncode != 0 and not stdout:
+        raise RuntimeError(f"ffmpeg exited {result.returncode}")
     
-    if not samples:
-        return None, duration
+    samples = array.array('f')
+    samples.frombytes(stdout[:len(stdout) // (4 * channels) * 4 * channels])
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    return [samples[i::channels] for i in range(channels)]
+
+def peaks_from_samples(samples, num_peaks):
+    """Reduce a sequence of samples (16-bit or float) to at most num_peaks peaks, normalized to 0-1."""
     
-    # Downsample to target number of peaks
+    # Downsample to target number of peaks (loudest sample in each chunk)
     chunk_size = max(1, len(samples) // num_peaks)
     peaks = []
     for i in range(0, len(samples), chunk_size):
         chunk = samples[i:i + chunk_size]
-        if chunk:
-            peaks.append(max(chunk))
+        peaks.append(max(max(chunk), -min(chunk)) / 32768.0)
     
     # Ensure we have exactly num_peaks
     if len(peaks) > num_peaks:
@@ -78,45 +179,131 @@ def get_audio_peaks(audio_path, num_peaks=SAMPLES_PER_PEAK):
     if max_peak > 0:
         peaks = [round(p / max_peak, PRECISION) for p in peaks]
     
-    return peaks, duration
+    return peaks
 
-def process_directory(directory, force=False):
+def bands_from_frames(frames, num_peaks):
+    """
+    Reduce decode_levels() band channels to at most num_peaks RMS levels per band.
+    
+    Each band is scaled to its own loudest chunk and quantized to 0-BAND_LEVELS,
+    so a bar's colour shows which bands are strong there relative to the rest
+    of the mix.
+    """
+    bands = {}
+    for (name, _, _), levels in zip(BANDS, frames[1:]):
+        chunk_size = max(1, len(levels) // num_peaks)
+        means = [math.sqrt(max(0, sum(levels[i:i + chunk_size]) / len(levels[i:i + chunk_size])))
+                 for i in range(0, len(levels), chunk_size)][:num_peaks]
+        loudest = max(means, default=0)
+        bands[name] = [round(m / loudest * BAND_LEVELS) if loudest > 0 else 0 for m in means]
+    return bands
+
+def write_peaks(output_directory, base_name, data, hashed=False):
+    """Write peaks JSON as <base>.peaks.json, or as <base>.<hash>.peaks.json with hashed; returns the file name."""
+    if hashed:
+        return write_hashed(output_directory, base_name, PEAKS_SUFFIX, data.encode('utf-8'))
+    name = base_name + PEAKS_SUFFIX
+    with open(os.path.join(output_directory, name), 'w') as f:
+        f.write(data)
+    return name
+
+def process_directory(directory, force=False, pcm_cache=None, hashed=False):
     """Process all audio files in directory (read and write in same directory)."""
-    process_directory_split(directory, directory, force)
+    process_directory_split(directory, directory, force, pcm_cache, hashed)
 
-def process_directory_split(source_directory, output_directory, force=False):
+def process_directory_split(source_directory, output_directory, force=False, pcm_cache=None, hashed=False):
     """Process audio files from source directory, write peaks to output directory."""
     
-    extensions = ('.mp3', '.flac', '.m4a', '.wav', '.opus')
-    
+    hashed_peaks = latest_versions(output_directory, PEAKS_SUFFIX)
     for filename in sorted(os.listdir(source_directory)):
-        if not filename.lower().endswith(extensions):
+        if not filename.lower().endswith(PEAK_EXTENSIONS) or rendition_bitrate(filename):
             continue
             
         source_path = os.path.join(source_directory, filename)
-        peaks_path = os.path.join(output_directory, os.path.splitext(filename)[0] + '.peaks.json')
+        base_name = os.path.splitext(filename)[0]
+        peaks_path = os.path.join(output_directory, base_name + PEAKS_SUFFIX)
         
-        if os.path.exists(peaks_path) and not force:
+        if (os.path.exists(peaks_path) or base_name in hashed_peaks) and not force:
             print(f"Skipping {filename} (peaks file exists)")
             continue
+        reason = QUARANTINE.holds(source_path)
+        if reason:
+            print(f"Skipping {filename} (quarantined: {reason})")
+            continue
         
         print(f"Processing {filename}...", end=' ', flush=True)
         
-        try:
-            peaks, duration = get_audio_peaks(source_path)
-            if peaks:
-                with open(peaks_path, 'w') as f:
-                    json.dump({'peaks': peaks, 'duration': duration}, f)
-                print(f"OK ({len(peaks)} peaks, {duration:.0f}s)")
+        with STATS.file(source_path) as record:
+            try:
+                peaks, bands, duration = get_audio_waveform(source_path, pcm_cache=pcm_cache)
+                if peaks:
+                    data = json.dumps({'peaks': peaks, 'duration': duration, 'bands': bands})
+                    name = write_peaks(output_directory, base_name, data, hashed)
+                    record.wrote(len(data))
+                    print(f"OK ({len(peaks)} peaks, {duration:.0f}s{', ' + name if hashed else ''})")
+                    QUARANTINE.release(source_path)
+                else:
+                    QUARANTINE.add(source_path, 'no samples')
+                    print("FAILED (no samples)")
+            except Exception as e:
+                QUARANTINE.add(source_path, e)
+                print(f"ERROR: {e}")
+
+def process_remote_directory(remote_dir, output_directory, force=False, jobs=REMOTE_JOBS, hashed=False):
+    """
+    Generate peaks for the audio files in a remote DJ folder, writing to output directory.
+    
+    Durations come from Range reads of each file's header and the audio is
+    streamed into ffmpeg, jobs files at a time. MP4 files are handed to
+    ffmpeg as URLs instead, since their index may sit at the end of the file.
+    """
+    session = remote_dir.session
+    hashed_peaks = latest_versions(output_directory, PEAKS_SUFFIX)
+    pending = {}
+    for filename in remote_dir.files:
+        if not filename.lower().endswith(PEAK_EXTENSIONS) or rendition_bitrate(filename):
+            continue
+        base_name = os.path.splitext(filename)[0]
+        exists = os.path.exists(os.path.join(output_directory, base_name + PEAKS_SUFFIX)) or base_name in hashed_peaks
+        if (exists and not force) or base_name in pending:
+            print(f"Skipping {filename} (peaks file exists)")
+            continue
+        reason = QUARANTINE.holds(remote_dir.file_url(filename))
+        if reason:
+            print(f"Skipping {filename} (quarantined: {reason})")
+            continue
+        pending[base_name] = filename
+    
+    def generate(filename, base_name):
+        url = remote_dir.file_url(filename)
+        with STATS.file(url) as record:
+            _, duration = session.metadata(url, filename)
+            if os.path.splitext(filename)[1].lower() in mediatags.MP4_EXTENSIONS:
+                with session.slot(url):
+                    peaks, bands, duration = get_audio_waveform(url, duration=duration)
             else:
-                print("FAILED (no samples)")
-        except Exception as e:
-            print(f"ERROR: {e}")
+                peaks, bands, duration = get_audio_waveform(url, duration=duration, stream=session.stream(url))
+            if not peaks:
+                QUARANTINE.add(url, 'no samples')
+                return "FAILED (no samples)"
+            data = json.dumps({'peaks': peaks, 'duration': duration, 'bands': bands})
+            name = write_peaks(output_directory, base_name, data, hashed)
+            record.wrote(len(data))
+            QUARANTINE.release(url)
+            return f"OK ({len(peaks)} peaks, {duration:.0f}s{', ' + name if hashed else ''})"
+    
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(generate, filename, base_name): filename for base_name, filename in pending.items()}
+        for future in as_completed(futures):
+            try:
+                print(f"{futures[future]}: {future.result()}")
+            except Exception as e:
+                QUARANTINE.add(remote_dir.file_url(futures[future]), e)
+                print(f"{futures[future]}: ERROR: {e}")
 
 def find_dj_directories(base_directory):
      """Find all directories containing audio files, including nested ones in moreDJs/."""
      dj_dirs = []
-     extensions = ('.mp3', '.flac', '.m4a', '.wav', '.opus')
      
      for entry in sorted(os.listdir(base_directory)):
          path = os.path.join(base_directory, entry)
@@ -126,44 +313,54 @@ def find_dj_directories(base_directory):
                  for subentry in sorted(os.listdir(path)):
                      subpath = os.path.join(path, subentry)
                      if os.path.isdir(subpath):
-                         has_audio = any(f.lower().endswith(extensions) for f in os.listdir(subpath))
+                         has_audio = any(f.lower().endswith(PEAK_EXTENSIONS) for f in os.listdir(subpath))
                          if has_audio:
                              dj_dirs.append((subentry, subpath))
              else:
                  # Check all root-level directories
-                 has_audio = any(f.lower().endswith(extensions) for f in os.listdir(path))
+                 has_audio = any(f.lower().endswith(PEAK_EXTENSIONS) for f in os.listdir(path))
                  if has_audio:
                      dj_dirs.append((entry, path))
      
      return dj_dirs
 
-def load_config():
-    """Load audio source configuration, merging deployed config with local tool config."""
-    import json
-    config = {}
-    for config_path in ['mixes/audio-source-config.json', 'tools/tool-config.json']:
-        if os.path.exists(config_path):
-            try:
-                with open(config_path) as f:
-                    config.update(json.load(f))
-            except Exception as e:
-                print(f"Warning: Could not load {config_path}: {e}")
-    return config or None
-
-if __name__ == '__main__':
-    import json
+def main(argv):
     source_dir = None
     output_dir = None
     config = load_config()
     specific_djs = []
     force = False
     
-    # Extract --force flag from arguments
-    args = [a for a in sys.argv[1:] if a != '--force']
-    force = len(args) < len(sys.argv) - 1
+    # Extract --force, --pcm-cache, --hashed and --retry-failed flags from arguments
+    args = [a for a in argv if a not in ('--force', '--pcm-cache', '--hashed', '--retry-failed')]
+    force = '--force' in argv
+    hashed = '--hashed' in argv
+    QUARANTINE.retry = '--retry-failed' in argv
+    pcm_cache = PCMCache() if '--pcm-cache' in argv else None
     
     # Parse arguments
-    if args and args[0] == '--source':
+    if args and args[0] == '--remote':
+        if len(args) < 2:
+            print("Error: --remote requires a base URL argument")
+            sys.exit(1)
+        output_dir = args[2] if len(args) > 2 else '.'
+        specific_djs = args[3:]
+        with Session() as session:
+            print(f"Reading audio from: {args[1]}")
+            print(f"Writing peaks to: {output_dir}")
+            dj_dirs = session.list_dj_directories(args[1], PEAK_EXTENSIONS)
+            if specific_djs:
+                dj_dirs = [d for d in dj_dirs if d.name in specific_djs]
+                if not dj_dirs:
+                    print(f"Error: No matching DJ folders found for: {', '.join(specific_djs)}")
+                    sys.exit(1)
+            for remote_dir in dj_dirs:
+                output_path = os.path.join(output_dir, remote_dir.path)
+                os.makedirs(output_path, exist_ok=True)
+                print(f"\n=== {remote_dir.path} ===")
+                process_remote_directory(remote_dir, output_path, force, hashed=hashed)
+        return
+    elif args and args[0] == '--source':
         if len(args) < 2:
             print("Error: --source requires a path argument")
             sys.exit(1)
@@ -196,8 +393,9 @@ if __name__ == '__main__':
     
     if force:
         print("Force mode: regenerating all peaks files")
-    
-    extensions = ('.mp3', '.flac', '.m4a', '.wav', '.opus')
+    if pcm_cache:
+        entries, size = pcm_cache.size()
+        print(f"Using decoded-PCM cache: {pcm_cache.directory} ({entries} files, {size / 1024 / 1024:.0f}MB)")
     
     # If source specified, process from source to output
     if source_dir:
@@ -229,12 +427,12 @@ if __name__ == '__main__':
             os.makedirs(output_path, exist_ok=True)
             
             print(f"\n=== {source_name} ===")
-            process_directory_split(source_path, output_path, force)
+            process_directory_split(source_path, output_path, force, pcm_cache, hashed)
     else:
         # Original behavior: check if a specific DJ directory is given
-        if args and any(f.lower().endswith(extensions) for f in os.listdir(output_dir)):
+        if args and any(f.lower().endswith(PEAK_EXTENSIONS) for f in os.listdir(output_dir)):
             print(f"\n=== {os.path.basename(output_dir)} ===")
-            process_directory(output_dir, force)
+            process_directory(output_dir, force, pcm_cache, hashed)
         else:
             # Process all DJ directories
             if specific_djs:
@@ -252,4 +450,10 @@ if __name__ == '__main__':
             
             for name, path in dj_dirs:
                 print(f"\n=== {name} ===")
-                process_directory(path, force)
+                process_directory(path, force, pcm_cache, hashed)
+
+if __name__ == '__main__':
+    argv, stats_path, profile_path = toolstats.take_options(sys.argv[1:])
+    supervise.renice()
+    toolstats.run_main(lambda: main(argv), STATS, stats_path, profile_path)
+    QUARANTINE.report()
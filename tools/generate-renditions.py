@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Transcode low-bitrate Opus renditions of each mix for mobile listeners.
+Requires: ffmpeg (with libopus)
+
+Usage:
+    ./tools/generate-renditions.py [directory] [dj_name ...]
+    ./tools/generate-renditions.py --source /path/to/audio [directory] [dj_name ...]
+    ./tools/generate-renditions.py --bitrates 64,96 --jobs 4 --force [directory]
+    ./tools/generate-renditions.py --retry-failed [directory]
+
+Folders are found the same way as the other generator tools (see
+resolve_dj_folders() in tools/catalog.py). Each mix is encoded from its best
+source (FLAC, else M4A, else MP3) to <mix>.64k.opus and <mix>.96k.opus in the
+output folder, with tags copied and cover art dropped.
+
+Encodes run in a process pool (--jobs, default: the CPUs allowed by the
+cgroup) whose workers lower their CPU priority (nice NICE) and IO priority
+(lowest best-effort, with ionice when installed), so a batch can run on a
+live server. A rendition is skipped while it is newer than its source,
+unless --force. Files are encoded to a temporary name and renamed, so a
+killed run never leaves a truncated rendition that looks up to date.
+Encodes time out in proportion to the source's size (see tools/supervise.py);
+sources that fail are quarantined and skipped until they change, unless
+--retry-failed.
+
+generate-manifest.py lists the renditions of each mix with their bitrate and
+size, and the other tools ignore <mix>.<N>k.opus files.
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import supervise
+from catalog import load_config, rendition_bitrate, resolve_dj_folders
+
+BITRATES = (64, 96)      # kbps
+NICE = 10                # Added to the workers' CPU niceness
+SOURCE_EXTENSIONS = ['.flac', '.m4a', '.mp3', '.opus']   # In order of preference
+
+
+def rendition_path(output_folder, base_name, kbps):
+    return Path(output_folder) / f"{base_name}.{kbps}k.opus"
+
+
+def pick_sources(folder):
+    """Return {base_name: path} of the best source for each mix in folder."""
+    sources = {}
+    for path in sorted(Path(folder).iterdir()):
+        ext = path.suffix.lower()
+        if ext not in SOURCE_EXTENSIONS or not path.is_file() or rendition_bitrate(path.name):
+            continue
+        current = sources.get(path.stem)
+        if current is None or SOURCE_EXTENSIONS.index(ext) < SOURCE_EXTENSIONS.index(current.suffix.lower()):
+            sources[path.stem] = path
+    return sources
+
+
+def lower_priority():
+    """Process pool initializer: make this worker and the ffmpeg it starts yield to other work."""
+    supervise.renice(NICE)
+
+
+def encode(source, target, kbps):
+    """Encode one rendition (runs in a worker process); returns a one-line result."""
+    started = time.perf_counter()
+    temp_path = target.with_name(target.name + '.tmp')
+    cmd = [
+        'ffmpeg', '-v', 'error', '-y', '-i', str(source),
+        '-map', '0:a:0', '-map_metadata', '0',
+        '-c:a', 'libopus', '-b:a', f'{kbps}k', '-vbr', 'on',
+        '-f', 'opus', str(temp_path)
+    ]
+    try:
+        result = supervise.run(cmd, size=source.stat().st_size)
+    except supervise.ProcessTimeout:
+        temp_path.unlink(missing_ok=True)
+        raise
+    if result.returncode != 0:
+        temp_path.unlink(missing_ok=True)
+        raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip() or f"ffmpeg exited {result.returncode}")
+    os.replace(temp_path, target)
+    return f"OK ({target.stat().st_size / 1024 / 1024:.1f}MB, {time.perf_counter() - started:.1f}s)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Transcode low-bitrate Opus renditions of each mix')
+    parser.add_argument('directory', nargs='?', help='Output directory (default: mixes/ with a config, else .)')
+    parser.add_argument('djs', nargs='*', help='Only these DJ folders')
+    parser.add_argument('--source', help='Read audio from this directory')
+    parser.add_argument('--bitrates', default=','.join(map(str, BITRATES)), help='Comma-separated kbps list')
+    parser.add_argument('--force', action='store_true', help='Re-encode renditions that are up to date')
+    parser.add_argument('--jobs', type=int, default=supervise.MAX_PROCESSES, help='Encodes at once')
+    parser.add_argument('--retry-failed', action='store_true', help='Try quarantined sources again')
+    args = parser.parse_args()
+    quarantine = supervise.Quarantine('generate-renditions', retry=args.retry_failed)
+    bitrates = [int(b) for b in args.bitrates.split(',') if b.strip()]
+
+    tasks = []
+    skipped = quarantined = 0
+    for name, source_folder, output_folder in resolve_dj_folders(args.directory, args.djs, args.source, load_config()):
+        for base_name, source in pick_sources(source_folder).items():
+            if quarantine.holds(source):
+                quarantined += 1
+                continue
+            for kbps in bitrates:
+                target = rendition_path(output_folder, base_name, kbps)
+                if not args.force and target.exists() and target.stat().st_mtime >= source.stat().st_mtime:
+                    skipped += 1
+                    continue
+                tasks.append((name, source, target, kbps))
+
+    print(f"{len(tasks)} renditions to encode, {skipped} up to date"
+          + (f", {quarantined} sources quarantined" if quarantined else '')
+          + f" ({args.jobs} at once, nice +{NICE})")
+    started = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=lower_priority) as pool:
+        futures = {}
+        for name, source, target, kbps in tasks:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            futures[pool.submit(encode, source, target, kbps)] = (name, source, target)
+        for future in as_completed(futures):
+            name, source, target = futures[future]
+            try:
+                print(f"  {name}/{target.name}: {future.result()}")
+                quarantine.release(source)
+            except Exception as e:
+                failed += 1
+                quarantine.add(source, e)
+                print(f"  {name}/{target.name}: ERROR: {e}")
+    print(f"\nEncoded {len(tasks) - failed} renditions in {time.perf_counter() - started:.1f}s"
+          + (f", {failed} failed" if failed else ''))
+    quarantine.report()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,29 @@ Generate search-index.json files for mixes and streams.
 
 Usage: 
     python3 generate-search-index.py [base_directory]
+    python3 generate-search-index.py --include-dead [base_directory]
 
 Default base directory is current directory.
 Reads manifest.json from each DJ subdirectory in mixes/, outputs mixes/search-index.json.
 Reads manifest.json and all preset .json files from streams/, outputs streams/search-index.json.
+When streams/manifest.json points at a bundle.json (generate-streams-manifest.py --bundle),
+presets are read from the bundle in one go instead of file by file.
+
+If streams/health.json exists (written by probe-streams.py), streams that failed
+the last probe are left out of the index and slow ones are marked and listed
+after the healthy streams of their preset. Streams it has no result for (added
+since the last probe) are kept. --include-dead keeps failed streams.
+
+The mixes index is versioned: its version is a hash of its content, it is
+also written as the immutable mixes/search-index.<version>.json, and
+mixes/search-index.latest.json names that file, the version, its mix count and,
+for each of the KEEP_VERSIONS previous versions, a delta file
+search-index.<from>.<to>.delta.json with the entries added, changed and
+removed (keyed by dj/file) since then. Clients holding a copy of a listed
+version patch it instead of fetching the full index. Deltas that are not
+much smaller than the index are not offered. Each version's entry digests
+are kept, sorted, in mixes/.search-index/<version>.tsv and are read line by
+line when diffing, so only the current index is ever held in memory.
 
 Note: This script reads manifests from the specified directory (or current directory)
 and writes search-index.json files there. It doesn't need source/output separation since
@@ -15,9 +34,20 @@ manifests are generated artifacts, not audio files.
 """
 
 import json
+import os
 import sys
+import time
 from pathlib import Path
 
+from artifacts import GRACE_SECONDS, content_hash, hashed_versions, write_hashed
+from streamhealth import FAILED_STATUSES, load_health, stream_status
+
+KEEP_VERSIONS = 5         # Previous versions a delta is written from
+MAX_DELTA_RATIO = 0.5     # Deltas at least this fraction of the full index are not offered
+VERSIONS_DIRECTORY = '.search-index'
+LATEST_FILE = 'search-index.latest.json'
+DELTA_SUFFIX = '.delta.json'
+
 def process_manifest(manifest_path, dj_path, all_mixes):
     """Process a single manifest.json and add mixes to the list."""
     print(f"Reading {dj_path}/manifest.json...")
@@ -36,16 +66,132 @@ def process_manifest(manifest_path, dj_path, all_mixes):
             'duration': mix.get('durationFormatted', ''),
             'audioFile': mix.get('audioFile', ''),
             'coverFile': mix.get('coverFile', ''),
-            'downloads': mix.get('downloads', [])
+            'downloads': [{'file': d['file'], 'label': d['label']} for d in mix.get('downloads', [])]
         }
         if mix.get('hasTracklist'):
             entry['hasTracklist'] = True
+        if mix.get('hasSuggestedTracks'):
+            entry['hasSuggestedTracks'] = True
+        if mix.get('peaksFile'):
+            entry['peaksFile'] = mix['peaksFile']
         all_mixes.append(entry)
     
     print(f"  Added {len(manifest.get('mixes', []))} mixes")
 
-def process_streams(streams_directory, all_streams):
+def entry_key(entry):
+    return f"{entry['dj']}/{entry['file']}"
+
+def read_digests(path):
+    """Yield (key, digest) from a version's digest file, in key order, one line at a time."""
+    with open(path) as f:
+        for line in f:
+            key, digest = line.rstrip('\n').rsplit('\t', 1)
+            yield json.loads(key), digest
+
+def diff_version(path, current):
+    """
+    Diff an older version's digest file against current, [(key, digest, entry)] sorted by key.
+    
+    Returns (added entries, changed entries, removed keys).
+    """
+    added, changed, removed = [], [], []
+    old = read_digests(path)
+    old_item = next(old, None)
+    for key, digest, entry in current:
+        while old_item is not None and old_item[0] < key:
+            removed.append(old_item[0])
+            old_item = next(old, None)
+        if old_item is not None and old_item[0] == key:
+            if old_item[1] != digest:
+                changed.append(entry)
+            old_item = next(old, None)
+        else:
+            added.append(entry)
+    while old_item is not None:
+        removed.append(old_item[0])
+        old_item = next(old, None)
+    return added, changed, removed
+
+def write_versions(mixes_directory, all_mixes, index_size, version, index_file):
+    """Write the digests of this version, deltas from the previous KEEP_VERSIONS and the latest pointer to index_file."""
+    versions_directory = mixes_directory / VERSIONS_DIRECTORY
+    versions_directory.mkdir(exist_ok=True)
+    current = sorted((entry_key(entry), content_hash(json.dumps(entry, sort_keys=True).encode('utf-8')), entry)
+                     for entry in all_mixes)
+    
+    previous = sorted((path for path in versions_directory.glob('*.tsv') if path.stem != version),
+                      key=lambda path: path.stat().st_mtime, reverse=True)
+    deltas = {}
+    for path in previous[:KEEP_VERSIONS]:
+        added, changed, removed = diff_version(path, current)
+        data = json.dumps({'from': path.stem, 'to': version, 'added': added, 'changed': changed,
+                           'removed': removed}, separators=(',', ':'))
+        if len(data) >= index_size * MAX_DELTA_RATIO:
+            print(f"  No delta from {path.stem}: {len(added)} added, {len(changed)} changed, {len(removed)} removed")
+            continue
+        name = f"search-index.{path.stem}.{version}{DELTA_SUFFIX}"
+        with open(mixes_directory / name, 'w') as f:
+            f.write(data)
+        deltas[path.stem] = name
+        print(f"  Delta from {path.stem}: {len(added)} added, {len(changed)} changed, {len(removed)} removed, "
+              f"{len(data) / 1024:.1f} KB")
+    
+    digests_path = versions_directory / f"{version}.tsv"
+    temp_path = digests_path.with_name(digests_path.name + '.tmp')
+    with open(temp_path, 'w') as f:
+        for key, digest, _ in current:
+            f.write(f"{json.dumps(key)}\t{digest}\n")
+    os.replace(temp_path, digests_path)
+    for path in previous[KEEP_VERSIONS:]:
+        path.unlink(missing_ok=True)
+    
+    latest = {'version': version, 'file': index_file, 'count': len(all_mixes), 'deltas': deltas}
+    temp_path = mixes_directory / (LATEST_FILE + '.tmp')
+    with open(temp_path, 'w') as f:
+        json.dump(latest, f, separators=(',', ':'))
+    os.replace(temp_path, mixes_directory / LATEST_FILE)
+    
+    # Earlier full versions and deltas stay for clients that read an older pointer
+    cutoff = time.time() - GRACE_SECONDS
+    for path in mixes_directory.glob(f"search-index.*{DELTA_SUFFIX}"):
+        if path.name not in deltas.values() and path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+    for mtime, name in hashed_versions(mixes_directory, '.json').get('search-index', []):
+        if name != index_file and mtime < cutoff:
+            (mixes_directory / name).unlink(missing_ok=True)
+
+def load_bundle_presets(streams_directory, manifest):
+    """
+    Load presets from bundle.json, expanding station ids.
+    
+    Returns {filename: preset data}, or None if no matching bundle exists.
+    """
+    bundle_info = manifest.get('bundle')
+    if not bundle_info:
+        return None
+    bundle_path = streams_directory / bundle_info.get('file', 'bundle.json')
+    if not bundle_path.exists():
+        print(f"  Warning: {bundle_path.name} not found, reading presets individually")
+        return None
+    
+    print(f"  Reading {bundle_path.name}...")
+    with open(bundle_path) as f:
+        bundle = json.load(f)
+    
+    stations = bundle.get('stations', [])
+    return {
+        preset['filename']: {
+            'name': preset.get('name', ''),
+            'streams': [stations[i] for i in preset.get('streams', [])]
+        }
+        for preset in bundle.get('presets', [])
+    }
+
+def process_streams(streams_directory, all_streams, include_dead=False):
     """Process all stream preset .json files and add streams to the list."""
+    health = load_health(streams_directory)
+    if health is not None:
+        print(f"Using probe results from {streams_directory / 'health.json'}")
     manifest_path = streams_directory / 'manifest.json'
     if not manifest_path.exists():
         print(f"Warning: {manifest_path} not found, skipping streams")
@@ -55,39 +201,62 @@ def process_streams(streams_directory, all_streams):
     with open(manifest_path) as f:
         manifest = json.load(f)
     
+    bundled = load_bundle_presets(streams_directory, manifest)
+    
     preset_count = 0
     stream_count = 0
+    hidden_count = 0
     
     for preset in manifest.get('presets', []):
         preset_filename = preset.get('filename', '')
         preset_name = preset.get('name', '')
         preset_path = streams_directory / preset_filename
         
-        if not preset_path.exists():
+        if bundled is not None and preset_filename in bundled:
+            preset_data = bundled[preset_filename]
+        elif not preset_path.exists():
             print(f"  Warning: {preset_filename} not found")
             continue
+        else:
+            print(f"  Reading {preset_filename}...")
+            with open(preset_path) as f:
+                preset_data = json.load(f)
         
-        print(f"  Reading {preset_filename}...")
-        with open(preset_path) as f:
-            preset_data = json.load(f)
-        
+        preset_streams = []
         for stream in preset_data.get('streams', []):
             # Extract only searchable fields
-            all_streams.append({
+            entry = {
                 'name': stream.get('name', ''),
                 'genre': stream.get('genre', ''),
                 'url': stream.get('m3u', ''),
                 'preset': preset_filename.replace('.streams', ''),
                 'presetLabel': preset_name
-            })
-            stream_count += 1
+            }
+            if health is not None:
+                status = stream_status(health, entry['url'])
+                if status in FAILED_STATUSES and not include_dead:
+                    hidden_count += 1
+                    continue
+                if status == 'slow':
+                    entry['slow'] = True
+            preset_streams.append(entry)
         
+        # Slow streams go after responsive ones (sort is stable)
+        preset_streams.sort(key=lambda s: s.get('slow', False))
+        all_streams.extend(preset_streams)
+        stream_count += len(preset_streams)
         preset_count += 1
     
     print(f"  Added {stream_count} streams from {preset_count} presets")
+    if hidden_count:
+        print(f"  Hid {hidden_count} streams that failed the last probe")
 
 def main():
-    base_directory = Path(sys.argv[1]) if len(sys.argv) > 1 else Path('.')
+    # Extract --include-dead flag from arguments
+    args = [a for a in sys.argv[1:] if a != '--include-dead']
+    include_dead = len(args) < len(sys.argv) - 1
+    
+    base_directory = Path(args[0]) if args else Path('.')
     
     # Process mixes
     print("=" * 60)
@@ -114,13 +283,19 @@ def main():
                     if manifest_path.exists():
                         process_manifest(manifest_path, entry.name, all_mixes)
         
-        # Write mixes search index
+        # Write mixes search index: immutable under its version for the
+        # latest pointer, and in place (atomically) for older clients
+        data = json.dumps(all_mixes, separators=(',', ':')).encode('utf-8')
+        index_file = write_hashed(mixes_directory, 'search-index', '.json', data)
         mixes_index_path = mixes_directory / 'search-index.json'
-        with open(mixes_index_path, 'w') as f:
-            json.dump(all_mixes, f, separators=(',', ':'))
+        temp_path = mixes_index_path.with_name(mixes_index_path.name + '.tmp')
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, mixes_index_path)
         
-        size_kb = mixes_index_path.stat().st_size / 1024
-        print(f"\nWrote mixes/search-index.json: {len(all_mixes)} mixes, {size_kb:.1f} KB")
+        version = content_hash(data)
+        print(f"\nWrote mixes/{index_file}: {len(all_mixes)} mixes, {len(data) / 1024:.1f} KB")
+        write_versions(mixes_directory, all_mixes, len(data), version, index_file)
     else:
         print(f"Warning: {mixes_directory} not found, skipping mixes")
     
@@ -133,7 +308,7 @@ def main():
     all_streams = []
     
     if streams_directory.exists():
-        process_streams(streams_directory, all_streams)
+        process_streams(streams_directory, all_streams, include_dead)
         
         # Write streams search index
         streams_index_path = streams_directory / 'search-index.json'
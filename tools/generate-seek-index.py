@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Generate .seek.bin time-to-byte-offset indexes for MP3 files.
+
+Usage:
+    ./tools/generate-seek-index.py [directory] [dj_name ...]
+    ./tools/generate-seek-index.py --source /path/to/audio [directory] [dj_name ...]
+    ./tools/generate-seek-index.py --force --interval 0.5 --jobs 4 [directory]
+
+Folders are found the same way as generate-peaks.py: with a source_directory
+in the config (or --source) audio is read from there and indexes are written
+to the routed output folder (main_djs in directory/, everyone else in
+directory/moreDJs/); otherwise DJ folders under directory (default: mixes/
+with a config, else the current directory) are indexed in place.
+
+Every MP3 frame header is parsed in-process over a memory-mapped file, so a
+multi-hour mix is indexed in well under a second and no ffmpeg is needed. VBR files
+without a TOC, where browsers and the stream proxy would otherwise guess a
+byte offset from the average bitrate, get exact frame positions.
+
+An index is rebuilt when it is older than its MP3, when the MP3's size no
+longer matches, or with --force. generate-manifest.py sets hasSeekIndex on
+mixes that have one.
+
+.seek.bin layout (little-endian):
+    0   4s   magic b'MSK1'
+    4   I    interval between entries, in milliseconds
+    8   I    sample rate
+    12  I    samples per frame
+    16  I    number of audio frames (excluding a Xing/Info/VBRI frame)
+    20  Q    size of the MP3 file in bytes
+    28  I    number of entries N
+    32  N*I  byte offset of the frame playing at i * interval
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import mediatags
+from catalog import load_config, resolve_dj_folders
+
+INTERVAL = 1.0   # Seconds between index entries
+MAGIC = b'MSK1'
+HEADER = struct.Struct('<4sIIIIQI')
+
+
+def scan_frames(path, interval=INTERVAL):
+    """
+    Scan an MP3's frame headers and return (sample_rate, samples_per_frame, frame_count, offsets).
+
+    offsets[i] is the byte offset of the frame that is playing at i * interval
+    seconds. Junk between frames (e.g. a stray tag) is skipped by resyncing.
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        end = len(data)
+        pos, frame = mediatags.find_mpeg_frame(data, mediatags.id3_end(data), end)
+        if frame is None:
+            raise mediatags.TagError('no MPEG audio frame found')
+        sample_rate, samples_per_frame = frame[3], frame[4]
+        if mediatags.mpeg_info_frames(data, pos, frame) is not None:
+            pos += frame[5]
+
+        step = interval * sample_rate
+        next_mark = 0.0
+        samples = 0
+        frames = 0
+        offsets = []
+        headers = {}  # A file uses a handful of distinct headers; parse each once
+        while pos + 4 <= end:
+            header = data[pos:pos + 4]
+            frame = headers.get(header)
+            if frame is None:
+                frame = mediatags.mpeg_frame(header)
+                if frame is None:
+                    pos, frame = mediatags.find_mpeg_frame(data, pos + 1, end)
+                    if frame is None:
+                        break
+                    header = data[pos:pos + 4]
+                headers[header] = frame
+            if pos + frame[5] > end:
+                break
+            samples += frame[4]
+            while next_mark < samples:
+                offsets.append(pos)
+                next_mark += step
+            frames += 1
+            pos += frame[5]
+    return sample_rate, samples_per_frame, frames, offsets
+
+
+def build_index(path, interval=INTERVAL):
+    """Return the .seek.bin bytes for an MP3 file."""
+    size = os.path.getsize(path)
+    if size > 0xffffffff:
+        raise ValueError('file too large for 32-bit offsets')
+    sample_rate, samples_per_frame, frames, offsets = scan_frames(path, interval)
+    header = HEADER.pack(MAGIC, round(interval * 1000), sample_rate, samples_per_frame, frames, size, len(offsets))
+    return header + struct.pack(f'<{len(offsets)}I', *offsets)
+
+
+def read_index_header(index_path):
+    """Return the header fields of a .seek.bin file as a dict, or None if unreadable."""
+    try:
+        with open(index_path, 'rb') as f:
+            fields = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return None
+    if fields[0] != MAGIC:
+        return None
+    names = ('magic', 'interval_ms', 'sample_rate', 'samples_per_frame', 'frames', 'size', 'entries')
+    return dict(zip(names, fields))
+
+
+def is_up_to_date(mp3_path, index_path, interval):
+    """Check whether index_path was built from the current mp3_path with this interval."""
+    header = read_index_header(index_path)
+    if header is None:
+        return False
+    st = os.stat(mp3_path)
+    return (header['size'] == st.st_size and header['interval_ms'] == round(interval * 1000)
+            and os.path.getmtime(index_path) >= st.st_mtime)
+
+
+def index_file(mp3_path, index_path, interval):
+    """Build and write one index; returns a one-line result (runs in a worker process)."""
+    started = time.perf_counter()
+    data = build_index(mp3_path, interval)
+    temp_path = f"{index_path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, index_path)
+    header = read_index_header(index_path)
+    duration = header['frames'] * header['samples_per_frame'] / header['sample_rate']
+    return (f"OK ({header['entries']} entries, {duration:.0f}s, {len(data) / 1024:.1f}KB, "
+            f"{time.perf_counter() - started:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate .seek.bin indexes for MP3 files')
+    parser.add_argument('directory', nargs='?', help='Output directory (default: mixes/ with a config, else .)')
+    parser.add_argument('djs', nargs='*', help='Only these DJ folders')
+    parser.add_argument('--source', help='Read audio from this directory')
+    parser.add_argument('--force', action='store_true', help='Rebuild indexes that are up to date')
+    parser.add_argument('--interval', type=float, default=INTERVAL, help='Seconds between entries')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='Files scanned in parallel')
+    args = parser.parse_args()
+
+    folders = resolve_dj_folders(args.directory, args.djs, args.source, load_config(), {'.mp3'})
+    if not folders:
+        print("No DJ folders found")
+        return
+
+    tasks = []
+    for name, source, output in folders:
+        for mp3_path in sorted(p for p in source.iterdir() if p.suffix.lower() == '.mp3'):
+            index_path = output / f"{mp3_path.stem}.seek.bin"
+            if not args.force and is_up_to_date(mp3_path, index_path, args.interval):
+                continue
+            tasks.append((name, mp3_path, index_path))
+
+    print(f"{len(tasks)} MP3 files to index ({args.jobs} at once)")
+    started = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {}
+        for name, mp3_path, index_path in tasks:
+            index_path.parent.mkdir(parents=True, exist_ok=True)
+            futures[pool.submit(index_file, mp3_path, index_path, args.interval)] = (name, mp3_path)
+        for future in as_completed(futures):
+            name, mp3_path = futures[future]
+            try:
+                print(f"  {name}/{mp3_path.name}: {future.result()}")
+            except Exception as e:
+                failed += 1
+                print(f"  {name}/{mp3_path.name}: ERROR: {e}")
+    print(f"\nIndexed {len(tasks) - failed} files in {time.perf_counter() - started:.1f}s"
+          + (f", {failed} failed" if failed else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,22 @@ Generate manifest.json for streams directory.
 
 Usage:
     python3 generate-streams-manifest.py
+    python3 generate-streams-manifest.py --bundle
 
 Scans /streams/ directory for .streams files, reads the 'name' field
 from each, and generates /streams/manifest.json listing them.
 
+With --bundle, also writes /streams/bundle.json (plus a precompressed
+bundle.json.gz) holding every preset in one payload. Stations shared by
+several presets are stored once in a global 'stations' table and presets
+list station ids. Each preset carries a content hash, repeated in
+manifest.json, so clients can revalidate a cached preset without
+refetching it.
+
+If /streams/health.json exists (written by probe-streams.py), each preset
+also records how many of its streams did not fail the last probe (healthy),
+and how many of those were never probed (unprobed), see tools/streamhealth.py.
+
 Preset file format expected:
     {
       "name": "Display Name",
@@ -17,11 +29,81 @@ Preset file format expected:
     }
 """
 
+import gzip
+import hashlib
 import json
+import sys
 from pathlib import Path
 
+from streamhealth import FAILED_STATUSES, load_health, stream_status
+
+
+def content_hash(value):
+    """Short stable hash of a JSON-serialisable value."""
+    canonical = json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+def build_bundle(presets):
+    """
+    Build the bundle payload from (manifest entry, preset data) pairs.
+
+    Identical station objects are deduplicated into one 'stations' table;
+    each preset refers to them by index.
+    """
+    stations = []
+    station_ids = {}
+    bundle_presets = []
+
+    for entry, data in presets:
+        ids = []
+        for stream in data['streams']:
+            key = json.dumps(stream, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+            if key not in station_ids:
+                station_ids[key] = len(stations)
+                stations.append(stream)
+            ids.append(station_ids[key])
+
+        bundle_preset = {
+            'filename': entry['filename'],
+            'name': data['name'],
+            'hash': entry['hash'],
+            'streams': ids
+        }
+        for key in ('category', 'tab'):
+            if key in data:
+                bundle_preset[key] = data[key]
+        bundle_presets.append(bundle_preset)
+
+    return {
+        'version': 1,
+        'stations': stations,
+        'presets': bundle_presets
+    }
+
+
+def write_bundle(streams_dir, bundle):
+    """Write bundle.json and a precompressed bundle.json.gz, returning the bundle hash."""
+    payload = json.dumps(bundle, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    bundle_path = streams_dir / 'bundle.json'
+    with open(bundle_path, 'wb') as f:
+        f.write(payload)
+
+    # mtime=0 keeps the .gz byte-identical when the bundle has not changed
+    gz_path = streams_dir / 'bundle.json.gz'
+    with open(gz_path, 'wb') as f:
+        f.write(gzip.compress(payload, compresslevel=9, mtime=0))
+
+    referenced = sum(len(p['streams']) for p in bundle['presets'])
+    print(f"Wrote {bundle_path} ({len(bundle['stations'])} stations for {referenced} preset entries, "
+          f"{len(payload) / 1024:.1f} KB, {gz_path.stat().st_size / 1024:.1f} KB gzipped)")
+
+    return hashlib.sha256(payload).hexdigest()[:16]
+
 
 def main():
+    bundle_mode = '--bundle' in sys.argv[1:]
     streams_dir = Path('streams')
     
     if not streams_dir.exists():
@@ -38,7 +120,12 @@ def main():
         print(f"No stream files found in {streams_dir}")
         return
     
+    health = load_health(streams_dir)
+    if health is not None:
+        print(f"Using probe results from {streams_dir / 'health.json'}")
+    
     streams = []
+    loaded = []
     
     for stream_file in stream_files:
         try:
@@ -46,11 +133,25 @@ def main():
                 data = json.load(f)
             
             if 'name' in data and isinstance(data.get('streams'), list):
-                streams.append({
+                entry = {
                     'filename': stream_file.name,
                     'name': data['name']
-                })
-                print(f"  {stream_file.name}: \"{data['name']}\"")
+                }
+                if health is not None:
+                    statuses = [stream_status(health, s.get('m3u', '')) for s in data['streams']]
+                    entry['total'] = len(statuses)
+                    entry['healthy'] = sum(1 for status in statuses if status not in FAILED_STATUSES)
+                    unprobed = statuses.count(None)
+                    if unprobed:
+                        entry['unprobed'] = unprobed
+                    print(f"  {stream_file.name}: \"{data['name']}\" ({entry['healthy']}/{entry['total']} healthy"
+                          + (f", {unprobed} unprobed)" if unprobed else ')'))
+                else:
+                    print(f"  {stream_file.name}: \"{data['name']}\"")
+                if bundle_mode:
+                    entry['hash'] = content_hash({k: v for k, v in data.items() if k != 'savedAt'})
+                    loaded.append((entry, data))
+                streams.append(entry)
             else:
                 print(f"  Skipped {stream_file.name}: missing 'name' or 'streams'")
         except json.JSONDecodeError as e:
@@ -70,6 +171,13 @@ def main():
         'presets': streams
     }
     
+    if bundle_mode:
+        loaded.sort(key=lambda p: p[0]['name'].lower())
+        manifest['bundle'] = {
+            'file': 'bundle.json',
+            'hash': write_bundle(streams_dir, build_bundle(loaded))
+        }
+    
     manifest_path = streams_dir / 'manifest.json'
     with open(manifest_path, 'w') as f:
         json.dump(manifest, f, indent=2)
@@ -0,0 +1,1001 @@
+"""
+Read and write embedded metadata directly in audio container headers.
+
+Shared by the generator tools so they do not need an ffprobe/ffmpeg spawn
+for information that sits in the first few kilobytes of a file.
+
+Supported containers:
+    ID3v2.2/2.3/2.4 tags (MP3, and the occasional ID3 tag in front of FLAC)
+    FLAC metadata blocks
+    MP4/M4A atoms (moov/udta/meta/ilst)
+
+Also reads durations from the same headers (Xing/VBRI or bitrate for MP3,
+STREAMINFO for FLAC, mvhd for MP4). The readers accept any seekable file
+object, so remote.py can run them over HTTP Range requests.
+
+Only the header region is read; audio data is never loaded. Tag writes
+patch the header in place when the new tags fit in the existing padding,
+and otherwise rewrite the file once with PADDING bytes of headroom so the
+next edit fits. Anything this module cannot parse raises TagError so
+callers can fall back to ffmpeg.
+"""
+
+import os
+import struct
+import zlib
+from pathlib import Path
+
+ID3_EXTENSIONS = {'.mp3'}
+FLAC_EXTENSIONS = {'.flac'}
+MP4_EXTENSIONS = {'.m4a', '.mp4', '.m4b'}
+SUPPORTED_EXTENSIONS = ID3_EXTENSIONS | FLAC_EXTENSIONS | MP4_EXTENSIONS
+
+FRONT_COVER = 3          # ID3/FLAC picture type for the front cover
+MAX_MOOV_SIZE = 64 * 1024 * 1024
+PADDING = 4096           # Headroom left after a tag block when the file is rewritten
+COPY_CHUNK = 1024 * 1024
+
+# Text tags understood by read_tags() / write_tags()
+TAG_FIELDS = ('title', 'artist', 'album', 'genre', 'date', 'comment')
+ID3_FRAMES = {
+    2: {'title': 'TT2', 'artist': 'TP1', 'album': 'TAL', 'genre': 'TCO', 'date': 'TYE', 'comment': 'COM'},
+    3: {'title': 'TIT2', 'artist': 'TPE1', 'album': 'TALB', 'genre': 'TCON', 'date': 'TYER', 'comment': 'COMM'},
+    4: {'title': 'TIT2', 'artist': 'TPE1', 'album': 'TALB', 'genre': 'TCON', 'date': 'TDRC', 'comment': 'COMM'},
+}
+VORBIS_FIELDS = {'title': 'TITLE', 'artist': 'ARTIST', 'album': 'ALBUM',
+                 'genre': 'GENRE', 'date': 'DATE', 'comment': 'COMMENT'}
+MP4_ITEMS = {'title': b'\xa9nam', 'artist': b'\xa9ART', 'album': b'\xa9alb',
+             'genre': b'\xa9gen', 'date': b'\xa9day', 'comment': b'\xa9cmt'}
+
+
+class TagError(Exception):
+    """The container could not be parsed natively."""
+
+
+def image_extension(data):
+    """Return the file extension for image bytes, based on magic numbers."""
+    if data[:3] == b'\xff\xd8\xff':
+        return '.jpg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return '.png'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return '.gif'
+    if data[:2] == b'BM':
+        return '.bmp'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return '.webp'
+    return '.jpg'
+
+
+def image_size(data):
+    """Return (width, height) of JPEG/PNG/GIF/BMP/WebP/AVIF image bytes, or None if unknown."""
+    try:
+        if data[:8] == b'\x89PNG\r\n\x1a\n':
+            return struct.unpack('>II', data[16:24])
+        if data[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack('<HH', data[6:10])
+        if data[:2] == b'BM':
+            width, height = struct.unpack('<ii', data[18:26])
+            return width, abs(height)
+        if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+            chunk = data[12:16]
+            if chunk == b'VP8 ':
+                width, height = struct.unpack('<HH', data[26:30])
+                return width & 0x3fff, height & 0x3fff
+            if chunk == b'VP8L':
+                bits = int.from_bytes(data[21:25], 'little')
+                return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+            if chunk == b'VP8X':
+                return int.from_bytes(data[24:27], 'little') + 1, int.from_bytes(data[27:30], 'little') + 1
+        if data[:2] == b'\xff\xd8':
+            pos = 2
+            while pos + 9 < len(data):
+                if data[pos] != 0xff:
+                    pos += 1
+                    continue
+                marker = data[pos + 1]
+                if marker in (0xd8, 0x01) or 0xd0 <= marker <= 0xd7 or marker == 0xff:
+                    pos += 1 if marker == 0xff else 2
+                    continue
+                length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+                # SOF0-SOF15 except DHT (C4), JPG (C8) and DAC (CC)
+                if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+                    height, width = struct.unpack('>HH', data[pos + 5:pos + 9])
+                    return width, height
+                pos += 2 + length
+        if data[4:8] == b'ftyp' and data[8:12] in (b'avif', b'avis'):
+            return _avif_size(data)
+    except (struct.error, TagError):
+        pass
+    return None
+
+
+def _avif_size(data):
+    """
+    Largest image spatial extent ('ispe' property in meta/iprp/ipco) of an AVIF.
+
+    Grid images list their tiles' extents too; the whole image is the largest.
+    """
+    ipco = find_atom_path(data, [b'meta', b'iprp', b'ipco'])
+    if ipco is None:
+        return None
+    sizes = [struct.unpack('>II', data[payload_start + 4:payload_start + 12])
+             for atom_type, _, payload_start, _ in iter_atoms(data, ipco[1], ipco[2]) if atom_type == b'ispe']
+    return max(sizes, key=lambda size: size[0] * size[1], default=None)
+
+
+# --- ID3v2 ---
+
+def _syncsafe(data):
+    """Decode a 4-byte syncsafe integer."""
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _unsynchronise_reverse(data):
+    """Undo ID3 unsynchronisation (0xFF 0x00 -> 0xFF)."""
+    return data.replace(b'\xff\x00', b'\xff')
+
+
+def read_id3_header(f):
+    """
+    Read the ID3v2 header at the current position.
+
+    Returns (major_version, flags, tag_size) where tag_size excludes the
+    10-byte header, or None if there is no ID3v2 tag.
+    """
+    header = f.read(10)
+    if len(header) < 10 or header[:3] != b'ID3':
+        return None
+    major, _revision, flags = header[3], header[4], header[5]
+    if major not in (2, 3, 4):
+        raise TagError(f"unsupported ID3v2.{major}")
+    return major, flags, _syncsafe(header[6:10])
+
+
+def _id3_frames_start(body, major, flags):
+    """Offset of the first frame in a tag body, skipping any extended header."""
+    if flags & 0x40 and major >= 3:
+        if major == 3:
+            return 4 + struct.unpack('>I', body[:4])[0]
+        return _syncsafe(body[:4])
+    return 0
+
+
+def _iter_raw_id3_frames(body, major, pos=0):
+    """Yield (frame_id, frame_flags, raw_payload, frame_start, frame_end) until the padding."""
+    id_len, header_len = (3, 6) if major == 2 else (4, 10)
+    while pos + header_len <= len(body):
+        frame_id = body[pos:pos + id_len]
+        if not frame_id.strip(b'\x00') or not frame_id.isalnum():
+            return  # reached padding
+        if major == 2:
+            frame_size = int.from_bytes(body[pos + 3:pos + 6], 'big')
+            frame_flags = 0
+        elif major == 3:
+            frame_size = struct.unpack('>I', body[pos + 4:pos + 8])[0]
+            frame_flags = struct.unpack('>H', body[pos + 8:pos + 10])[0]
+        else:
+            frame_size = _syncsafe(body[pos + 4:pos + 8])
+            frame_flags = struct.unpack('>H', body[pos + 8:pos + 10])[0]
+        payload = body[pos + header_len:pos + header_len + frame_size]
+        if len(payload) < frame_size:
+            raise TagError(f"truncated ID3 frame {frame_id!r}")
+        yield frame_id, frame_flags, payload, pos, pos + header_len + frame_size
+        pos += header_len + frame_size
+
+
+def iter_id3_frames(f):
+    """
+    Yield (frame_id, payload) for each frame of the ID3v2 tag at the start of f.
+
+    Compressed and unsynchronised frames are decoded; encrypted frames are skipped.
+    Yields nothing if the file has no ID3v2 tag.
+    """
+    f.seek(0)
+    header = read_id3_header(f)
+    if header is None:
+        return
+    major, flags, size = header
+    body = f.read(size)
+    if len(body) < size:
+        raise TagError('truncated ID3 tag')
+
+    if flags & 0x80 and major < 4:
+        body = _unsynchronise_reverse(body)
+
+    pos = _id3_frames_start(body, major, flags)
+    for frame_id, frame_flags, payload, _, _ in _iter_raw_id3_frames(body, major, pos):
+        if major == 3:
+            if frame_flags & 0x0040:
+                continue  # encrypted
+            if frame_flags & 0x0020:
+                payload = payload[1:]  # group identity
+            if frame_flags & 0x0080:
+                payload = zlib.decompress(payload[4:])
+        elif major == 4:
+            if frame_flags & 0x0004:
+                continue  # encrypted
+            if frame_flags & 0x0040:
+                payload = payload[1:]
+            if frame_flags & 0x0001:
+                payload = payload[4:]  # data length indicator
+            if frame_flags & 0x0002 or flags & 0x80:
+                payload = _unsynchronise_reverse(payload)
+            if frame_flags & 0x0008:
+                payload = zlib.decompress(payload)
+
+        yield frame_id.decode('latin-1'), payload
+
+
+def _split_encoded_string(data, encoding):
+    """Split a null-terminated string in the given ID3 text encoding off the front of data."""
+    if encoding in (1, 2):
+        pos = 0
+        while pos + 1 < len(data):
+            if data[pos:pos + 2] == b'\x00\x00':
+                return data[:pos], data[pos + 2:]
+            pos += 2
+        return data, b''
+    text, _, rest = data.partition(b'\x00')
+    return text, rest
+
+
+def _parse_id3_picture(frame_id, payload):
+    """Return (picture_type, mime, data) from an APIC (or v2.2 PIC) frame."""
+    encoding = payload[0]
+    if frame_id == 'PIC':
+        image_format = payload[1:4].decode('latin-1').upper()
+        mime = 'image/png' if image_format == 'PNG' else 'image/jpeg'
+        picture_type = payload[4]
+        _, data = _split_encoded_string(payload[5:], encoding)
+    else:
+        mime_bytes, rest = payload[1:].split(b'\x00', 1)
+        mime = mime_bytes.decode('latin-1').lower()
+        picture_type = rest[0]
+        _, data = _split_encoded_string(rest[1:], encoding)
+    return picture_type, mime, data
+
+
+# --- FLAC ---
+
+def iter_flac_blocks(f):
+    """
+    Yield (block_type, offset, payload) for each FLAC metadata block.
+
+    offset is the file position of the block header. A leading ID3v2 tag is skipped.
+    """
+    f.seek(0)
+    start = 0
+    header = read_id3_header(f)
+    if header is not None:
+        start = 10 + header[2]
+    f.seek(start)
+    if f.read(4) != b'fLaC':
+        raise TagError('not a FLAC stream')
+
+    while True:
+        offset = f.tell()
+        block_header = f.read(4)
+        if len(block_header) < 4:
+            raise TagError('truncated FLAC metadata')
+        is_last = block_header[0] & 0x80
+        block_type = block_header[0] & 0x7f
+        length = int.from_bytes(block_header[1:4], 'big')
+        payload = f.read(length)
+        if len(payload) < length:
+            raise TagError('truncated FLAC metadata block')
+        yield block_type, offset, payload
+        if is_last:
+            return
+
+
+def _parse_flac_picture(payload):
+    """Return (picture_type, mime, data) from a FLAC PICTURE block."""
+    picture_type, mime_len = struct.unpack('>II', payload[:8])
+    pos = 8
+    mime = payload[pos:pos + mime_len].decode('latin-1').lower()
+    pos += mime_len
+    desc_len = struct.unpack('>I', payload[pos:pos + 4])[0]
+    pos += 4 + desc_len + 16  # description, width, height, depth, colours
+    data_len = struct.unpack('>I', payload[pos:pos + 4])[0]
+    pos += 4
+    return picture_type, mime, payload[pos:pos + data_len]
+
+
+# --- MP4 ---
+
+def iter_atoms(data, start=0, end=None):
+    """Yield (atom_type, header_start, payload_start, atom_end) for atoms in data[start:end]."""
+    end = len(data) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, atom_type = struct.unpack('>I4s', data[pos:pos + 8])
+        header_len = 8
+        if size == 1:
+            size = struct.unpack('>Q', data[pos + 8:pos + 16])[0]
+            header_len = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_len or pos + size > end:
+            raise TagError(f"bad MP4 atom size for {atom_type!r}")
+        yield atom_type, pos, pos + header_len, pos + size
+        pos += size
+
+
+def meta_children_start(data, payload_start):
+    """'meta' is a full atom (4 bytes version/flags) except in some QuickTime files."""
+    if data[payload_start + 4:payload_start + 8] in (b'hdlr', b'ilst'):
+        return payload_start
+    return payload_start + 4
+
+
+def top_level_atoms(f):
+    """Return [(atom_type, offset, size, header_len)] for the top-level atoms of an MP4 file."""
+    f.seek(0, 2)
+    file_size = f.tell()
+    atoms = []
+    pos = 0
+    while pos + 8 <= file_size:
+        f.seek(pos)
+        header = f.read(16)
+        size, atom_type = struct.unpack('>I4s', header[:8])
+        header_len = 8
+        if size == 1:
+            size = struct.unpack('>Q', header[8:16])[0]
+            header_len = 16
+        elif size == 0:
+            size = file_size - pos
+        if size < header_len:
+            raise TagError('bad top-level MP4 atom')
+        atoms.append((atom_type, pos, size, header_len))
+        pos += size
+    return atoms
+
+
+def find_moov(f):
+    """Return (offset, moov_bytes) for the top-level moov atom, reading nothing else."""
+    for atom_type, offset, size, _ in top_level_atoms(f):
+        if atom_type == b'moov':
+            if size > MAX_MOOV_SIZE:
+                raise TagError('moov atom too large')
+            f.seek(offset)
+            return offset, f.read(size)
+    raise TagError('no moov atom')
+
+
+def find_atom_path(data, path, start=0, end=None):
+    """Return (header_start, payload_start, atom_end) for a nested atom path like [b'moov', b'udta']."""
+    atom_type = path[0]
+    for found_type, header_start, payload_start, atom_end in iter_atoms(data, start, end):
+        if found_type != atom_type:
+            continue
+        if len(path) == 1:
+            return header_start, payload_start, atom_end
+        children = meta_children_start(data, payload_start) if found_type == b'meta' else payload_start
+        return find_atom_path(data, path[1:], children, atom_end)
+    return None
+
+
+def iter_ilst_items(moov):
+    """Yield (item_type, [(data_type, value_bytes), ...]) for each ilst entry in a moov atom."""
+    ilst = find_atom_path(moov, [b'moov', b'udta', b'meta', b'ilst'])
+    if ilst is None:
+        return
+    _, payload_start, atom_end = ilst
+    for item_type, _, item_start, item_end in iter_atoms(moov, payload_start, atom_end):
+        values = []
+        for child_type, _, child_start, child_end in iter_atoms(moov, item_start, item_end):
+            if child_type == b'data':
+                data_type = struct.unpack('>I', moov[child_start:child_start + 4])[0] & 0xffffff
+                values.append((data_type, moov[child_start + 8:child_end]))
+        yield item_type, values
+
+
+# --- Pictures ---
+
+def _pick_picture(pictures):
+    """Prefer the front cover, otherwise the first picture."""
+    if not pictures:
+        return None
+    for picture_type, mime, data in pictures:
+        if picture_type == FRONT_COVER and data:
+            return data
+    return pictures[0][2] or None
+
+
+def read_cover(audio_path):
+    """
+    Return the embedded cover image bytes of an audio file, or None if it has none.
+
+    Raises TagError for containers that are unsupported or cannot be parsed,
+    so callers can fall back to ffmpeg.
+    """
+    audio_path = Path(audio_path)
+    ext = audio_path.suffix.lower()
+    if ext not in SUPPORTED_EXTENSIONS:
+        raise TagError(f"unsupported container {ext}")
+
+    try:
+        with open(audio_path, 'rb') as f:
+            if ext in ID3_EXTENSIONS:
+                pictures = [
+                    _parse_id3_picture(frame_id, payload)
+                    for frame_id, payload in iter_id3_frames(f)
+                    if frame_id in ('APIC', 'PIC')
+                ]
+                return _pick_picture(pictures)
+
+            if ext in FLAC_EXTENSIONS:
+                pictures = [
+                    _parse_flac_picture(payload)
+                    for block_type, _, payload in iter_flac_blocks(f)
+                    if block_type == 6
+                ]
+                return _pick_picture(pictures)
+
+            _, moov = find_moov(f)
+            for item_type, values in iter_ilst_items(moov):
+                if item_type == b'covr':
+                    for _, value in values:
+                        if value:
+                            return value
+            return None
+    except (struct.error, IndexError, ValueError, zlib.error) as e:
+        raise TagError(f"cannot parse {audio_path.name}: {e}")
+
+
+# --- Text tags ---
+
+def _decode_id3_text(data, encoding):
+    """Decode an ID3 text payload, keeping only the first of any null-separated values."""
+    value, _ = _split_encoded_string(data, encoding)
+    codec = {0: 'latin-1', 1: 'utf-16', 2: 'utf-16-be', 3: 'utf-8'}.get(encoding, 'latin-1')
+    return value.decode(codec, 'replace').strip()
+
+
+def _read_id3_tags(f):
+    """Return {field: value} from the ID3v2 tag at the start of f."""
+    f.seek(0)
+    header = read_id3_header(f)
+    if header is None:
+        return {}
+    fields = {frame: field for field, frame in ID3_FRAMES[header[0]].items()}
+    tags = {}
+    for frame_id, payload in iter_id3_frames(f):
+        field = fields.get(frame_id)
+        if not field or field in tags or not payload:
+            continue
+        if field == 'comment':
+            # encoding, 3-byte language, description, text
+            _, text = _split_encoded_string(payload[4:], payload[0])
+            value = _decode_id3_text(text, payload[0])
+        else:
+            value = _decode_id3_text(payload[1:], payload[0])
+        if value:
+            tags[field] = value
+    return tags
+
+
+def _parse_vorbis_comment(payload):
+    """Return (vendor_bytes, [comment_bytes]) from a VORBIS_COMMENT block."""
+    vendor_len = struct.unpack('<I', payload[:4])[0]
+    vendor = payload[4:4 + vendor_len]
+    pos = 4 + vendor_len
+    count = struct.unpack('<I', payload[pos:pos + 4])[0]
+    pos += 4
+    comments = []
+    for _ in range(count):
+        length = struct.unpack('<I', payload[pos:pos + 4])[0]
+        comments.append(payload[pos + 4:pos + 4 + length])
+        pos += 4 + length
+    return vendor, comments
+
+
+def _build_vorbis_comment(vendor, comments):
+    """Serialise a VORBIS_COMMENT block payload."""
+    parts = [struct.pack('<I', len(vendor)), vendor, struct.pack('<I', len(comments))]
+    for comment in comments:
+        parts += [struct.pack('<I', len(comment)), comment]
+    return b''.join(parts)
+
+
+def _read_flac_tags(f):
+    """Return {field: value} from the VORBIS_COMMENT block of a FLAC file."""
+    names = {name: field for field, name in VORBIS_FIELDS.items()}
+    names['DESCRIPTION'] = 'comment'
+    tags = {}
+    for block_type, _, payload in iter_flac_blocks(f):
+        if block_type != 4:
+            continue
+        for comment in _parse_vorbis_comment(payload)[1]:
+            name, _, value = comment.decode('utf-8', 'replace').partition('=')
+            field = names.get(name.upper())
+            if field and field not in tags and value.strip():
+                tags[field] = value.strip()
+    return tags
+
+
+def _read_mp4_tags(f):
+    """Return {field: value} from the ilst atom of an MP4 file."""
+    items = {item: field for field, item in MP4_ITEMS.items()}
+    tags = {}
+    _, moov = find_moov(f)
+    for item_type, values in iter_ilst_items(moov):
+        field = items.get(item_type)
+        if field:
+            for data_type, value in values:
+                if data_type == 1 and value.strip():
+                    tags[field] = value.decode('utf-8', 'replace').strip()
+                    break
+    return tags
+
+
+def _read_header(audio_path, f, readers):
+    """Call the reader for audio_path's container on f (or on the opened file)."""
+    audio_path = Path(audio_path)
+    ext = audio_path.suffix.lower()
+    if ext not in SUPPORTED_EXTENSIONS:
+        raise TagError(f"unsupported container {ext}")
+    reader = readers[0] if ext in ID3_EXTENSIONS else readers[1] if ext in FLAC_EXTENSIONS else readers[2]
+
+    try:
+        if f is not None:
+            return reader(f)
+        with open(audio_path, 'rb') as f:
+            return reader(f)
+    except (struct.error, IndexError, ValueError, zlib.error) as e:
+        raise TagError(f"cannot parse {audio_path.name}: {e}")
+
+
+def read_tags(audio_path, f=None):
+    """
+    Return {field: value} for the TAG_FIELDS present in an audio file's header.
+
+    f is an optional seekable binary file object to read instead of opening
+    audio_path (whose name still selects the container). Raises TagError
+    for containers that are unsupported or cannot be parsed.
+    """
+    return _read_header(audio_path, f, (_read_id3_tags, _read_flac_tags, _read_mp4_tags))
+
+
+# --- Duration ---
+
+MPEG_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MPEG_SAMPLE_RATES = (44100, 48000, 32000)
+MPEG_SCAN_BYTES = 64 * 1024   # How far past the ID3 tag to look for the first frame
+
+
+def mpeg_frame(header):
+    """
+    Parse a 4-byte MPEG audio frame header.
+
+    Returns (version, layer, bitrate_kbps, sample_rate, samples_per_frame,
+    frame_length, mono) or None if header is not a valid frame header.
+    """
+    if header[0] != 0xff or header[1] & 0xe0 != 0xe0:
+        return None
+    version_bits, layer_bits = (header[1] >> 3) & 3, (header[1] >> 1) & 3
+    bitrate_index, rate_index = header[2] >> 4, (header[2] >> 2) & 3
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    version = 1 if version_bits == 3 else 2
+    layer = 4 - layer_bits
+    bitrate = MPEG_BITRATES[(version, layer)][bitrate_index]
+    sample_rate = MPEG_SAMPLE_RATES[rate_index] >> {3: 0, 2: 1, 0: 2}[version_bits]
+    padding = (header[2] >> 1) & 1
+    if layer == 1:
+        samples, length = 384, (12 * bitrate * 1000 // sample_rate + padding) * 4
+    else:
+        samples = 576 if layer == 3 and version == 2 else 1152
+        length = samples // 8 * bitrate * 1000 // sample_rate + padding
+    return version, layer, bitrate, sample_rate, samples, length, header[3] >> 6 == 3
+
+
+def find_mpeg_frame(data, pos=0, end=None):
+    """
+    Return (offset, frame) for the first frame header in data[pos:end], or (-1, None).
+
+    A candidate only counts if another frame header follows it (or data
+    ends first), which rules out false syncs in tags and cover art.
+    """
+    end = len(data) if end is None else end
+    pos = data.find(b'\xff', pos, end)
+    while 0 <= pos <= end - 4:
+        frame = mpeg_frame(data[pos:pos + 4])
+        if frame and (pos + frame[5] + 4 > end or mpeg_frame(data[pos + frame[5]:pos + frame[5] + 4])):
+            return pos, frame
+        pos = data.find(b'\xff', pos + 1, end)
+    return -1, None
+
+
+def mpeg_info_frames(data, pos, frame):
+    """Frame count from a Xing/Info or VBRI header in the frame at data[pos], or None if it is an audio frame."""
+    version, _, _, _, _, _, mono = frame
+    side_info = (17 if mono else 32) if version == 1 else (9 if mono else 17)
+    xing = data[pos + 4 + side_info:pos + 4 + side_info + 12]
+    if xing[:4] in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', xing[4:8])[0]
+        return struct.unpack('>I', xing[8:12])[0] if flags & 1 else 0
+    vbri = data[pos + 36:pos + 54]
+    if vbri[:4] == b'VBRI':
+        return struct.unpack('>I', vbri[14:18])[0]
+    return None
+
+
+def id3_end(f):
+    """Offset just past a leading ID3v2 tag (and its footer), or 0 if there is none."""
+    f.seek(0)
+    header = read_id3_header(f)
+    if header is None:
+        return 0
+    return 10 + header[2] + (10 if header[1] & 0x10 else 0)
+
+
+def _read_mp3_duration(f):
+    """Duration from the Xing/Info or VBRI frame count, or from the bitrate for CBR files."""
+    start = id3_end(f)
+    f.seek(start)
+    window = f.read(MPEG_SCAN_BYTES)
+
+    pos, frame = find_mpeg_frame(window)
+    if frame is None:
+        raise TagError('no MPEG audio frame found')
+    _, _, bitrate, sample_rate, samples, _, _ = frame
+    frames = mpeg_info_frames(window, pos, frame)
+    if frames:
+        return frames * samples / sample_rate
+
+    f.seek(0, 2)
+    return (f.tell() - start - pos) * 8 / (bitrate * 1000)
+
+
+def _read_flac_duration(f):
+    """Duration from the total sample count in STREAMINFO."""
+    for block_type, _, payload in iter_flac_blocks(f):
+        if block_type == 0:
+            sample_rate = (payload[10] << 12) | (payload[11] << 4) | (payload[12] >> 4)
+            total = ((payload[13] & 0x0f) << 32) | struct.unpack('>I', payload[14:18])[0]
+            if not sample_rate or not total:
+                raise TagError('STREAMINFO has no sample count')
+            return total / sample_rate
+    raise TagError('no STREAMINFO block')
+
+
+def _read_mp4_duration(f):
+    """Duration from the movie header (mvhd) atom."""
+    _, moov = find_moov(f)
+    mvhd = find_atom_path(moov, [b'moov', b'mvhd'])
+    if mvhd is None:
+        raise TagError('no mvhd atom')
+    payload = moov[mvhd[1]:mvhd[2]]
+    if payload[0] == 1:
+        timescale, duration = struct.unpack('>IQ', payload[20:32])
+    else:
+        timescale, duration = struct.unpack('>II', payload[12:20])
+    if not timescale:
+        raise TagError('mvhd has no timescale')
+    return duration / timescale
+
+
+def read_duration(audio_path, f=None):
+    """
+    Return the duration in seconds of an audio file, from its header only.
+
+    MP3 durations are exact with a Xing/Info or VBRI header and estimated
+    from the bitrate otherwise. f is as for read_tags(). Raises TagError for
+    containers that are unsupported or cannot be parsed.
+    """
+    return _read_header(audio_path, f, (_read_mp3_duration, _read_flac_duration, _read_mp4_duration))
+
+
+def _rewrite_file(path, parts):
+    """
+    Replace path with the concatenation of parts and return the bytes written.
+
+    Each part is either bytes or a (start, end) range copied from the original
+    file (end None for EOF). The new file is written next to the original and
+    renamed over it, so an interrupted write leaves the original untouched.
+    """
+    temp_path = path.with_name(path.name + '.tagtmp')
+    written = 0
+    try:
+        with open(path, 'rb') as src, open(temp_path, 'wb') as dst:
+            for part in parts:
+                if isinstance(part, (bytes, bytearray)):
+                    dst.write(part)
+                    written += len(part)
+                    continue
+                start, end = part
+                src.seek(start)
+                remaining = None if end is None else end - start
+                while remaining is None or remaining > 0:
+                    chunk = src.read(COPY_CHUNK if remaining is None else min(COPY_CHUNK, remaining))
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    written += len(chunk)
+                    if remaining is not None:
+                        remaining -= len(chunk)
+        os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        os.replace(temp_path, path)
+    except BaseException:
+        if temp_path.exists():
+            temp_path.unlink()
+        raise
+    return written
+
+
+def _patch_file(path, offset, data):
+    """Overwrite data at offset in place and return the bytes written."""
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        f.write(data)
+    return len(data)
+
+
+def _syncsafe_bytes(value):
+    """Encode a 4-byte syncsafe integer."""
+    if value >= 1 << 28:
+        raise TagError('ID3 tag too large')
+    return bytes([(value >> 21) & 0x7f, (value >> 14) & 0x7f, (value >> 7) & 0x7f, value & 0x7f])
+
+
+def _id3_encode(text, major):
+    """Return (encoding, bytes) for text: UTF-8 in v2.4, Latin-1 or UTF-16 in v2.3."""
+    if major == 4:
+        return 3, text.encode('utf-8')
+    try:
+        return 0, text.encode('latin-1')
+    except UnicodeEncodeError:
+        return 1, text.encode('utf-16')
+
+
+def _id3_frame(frame_id, field, value, major):
+    """Build a complete ID3v2.3/2.4 text or COMM frame."""
+    encoding, text = _id3_encode(value, major)
+    if field == 'comment':
+        # language, then an empty description and its terminator
+        description = b'\xff\xfe\x00\x00' if encoding == 1 else b'\x00'
+        payload = bytes([encoding]) + b'eng' + description + text
+    else:
+        payload = bytes([encoding]) + text
+    size = _syncsafe_bytes(len(payload)) if major == 4 else struct.pack('>I', len(payload))
+    return frame_id.encode('latin-1') + size + b'\x00\x00' + payload
+
+
+def _write_id3_tags(path, tags):
+    """Write tags into the ID3v2 tag at the start of an MP3 file."""
+    with open(path, 'rb') as f:
+        header = read_id3_header(f)
+        if header is None:
+            major, flags, old_size, body = 4, 0, None, b''
+        else:
+            major, flags, old_size = header
+            body = f.read(old_size)
+            if len(body) < old_size:
+                raise TagError('truncated ID3 tag')
+    if major == 2:
+        raise TagError('ID3v2.2 tags are not rewritten natively')
+    if flags & 0xd0:
+        raise TagError('unsynchronised, extended or footer ID3 tags are not rewritten natively')
+
+    replaced = {ID3_FRAMES[major][field] for field in tags}
+    frames = [body[start:end] for frame_id, _, _, start, end in _iter_raw_id3_frames(body, major)
+              if frame_id.decode('latin-1') not in replaced]
+    frames += [_id3_frame(ID3_FRAMES[major][field], field, value, major)
+               for field, value in tags.items() if value]
+    frames = b''.join(frames)
+
+    if old_size is not None and len(frames) <= old_size:
+        tag = b'ID3' + bytes([major, 0, flags]) + _syncsafe_bytes(old_size)
+        return 'in-place', _patch_file(path, 0, tag + frames + bytes(old_size - len(frames)))
+
+    new_size = len(frames) + PADDING
+    tag = b'ID3' + bytes([major, 0, flags]) + _syncsafe_bytes(new_size) + frames + bytes(PADDING)
+    audio_start = 0 if old_size is None else 10 + old_size
+    return 'rewrite', _rewrite_file(path, [tag, (audio_start, None)])
+
+
+def _flac_block(block_type, payload, is_last=False):
+    """Serialise a FLAC metadata block."""
+    if len(payload) >= 1 << 24:
+        raise TagError('FLAC metadata block too large')
+    return bytes([block_type | (0x80 if is_last else 0)]) + len(payload).to_bytes(3, 'big') + payload
+
+
+def _write_flac_tags(path, tags):
+    """Write tags into the VORBIS_COMMENT block, absorbing the size change into PADDING."""
+    with open(path, 'rb') as f:
+        blocks = list(iter_flac_blocks(f))
+    region_start = blocks[0][1]
+    region_end = blocks[-1][1] + 4 + len(blocks[-1][2])
+
+    vendor, comments = b'mix.4st.uk', []
+    for block_type, _, payload in blocks:
+        if block_type == 4:
+            vendor, comments = _parse_vorbis_comment(payload)
+            break
+
+    names = {VORBIS_FIELDS[field] for field in tags}
+    if 'comment' in tags:
+        names.add('DESCRIPTION')
+    comments = [c for c in comments if c.partition(b'=')[0].decode('latin-1').upper() not in names]
+    comments += [f"{VORBIS_FIELDS[field]}={value}".encode('utf-8') for field, value in tags.items() if value]
+    vorbis = (4, _build_vorbis_comment(vendor, comments))
+
+    # STREAMINFO first, then the comments, then every other block except old comments/padding
+    kept = [(block_type, payload) for block_type, _, payload in blocks if block_type not in (0, 1, 4)]
+    streaminfo = [(block_type, payload) for block_type, _, payload in blocks if block_type == 0]
+    new_blocks = streaminfo + [vorbis] + kept
+    used = sum(4 + len(payload) for _, payload in new_blocks)
+    spare = (region_end - region_start) - used
+
+    if spare == 0 or spare >= 4:
+        if spare:
+            new_blocks.append((1, bytes(spare - 4)))
+        method = 'in-place'
+    else:
+        new_blocks.append((1, bytes(PADDING)))
+        method = 'rewrite'
+
+    region = b''.join(_flac_block(block_type, payload, i == len(new_blocks) - 1)
+                      for i, (block_type, payload) in enumerate(new_blocks))
+    if method == 'in-place':
+        return method, _patch_file(path, region_start, region)
+    return method, _rewrite_file(path, [(0, region_start), region, (region_end, None)])
+
+
+def _mp4_atom(atom_type, payload):
+    """Serialise an MP4 atom with a 32-bit size."""
+    return struct.pack('>I4s', 8 + len(payload), atom_type) + payload
+
+
+def _mp4_text_item(item_type, value):
+    """Build an ilst item holding a single UTF-8 data atom."""
+    return _mp4_atom(item_type, _mp4_atom(b'data', struct.pack('>II', 1, 0) + value.encode('utf-8')))
+
+
+def _grow_atom(moov, header_start, delta):
+    """Adjust the size field of the atom at header_start by delta."""
+    size = struct.unpack('>I', moov[header_start:header_start + 4])[0]
+    if size == 1:
+        size = struct.unpack('>Q', moov[header_start + 8:header_start + 16])[0]
+        moov[header_start + 8:header_start + 16] = struct.pack('>Q', size + delta)
+    elif size:  # 0 means "extends to end of file" and needs no update
+        moov[header_start:header_start + 4] = struct.pack('>I', size + delta)
+
+
+def _splice_ilst(moov, tags):
+    """Return moov with its ilst items replaced, creating udta/meta/ilst if missing."""
+    moov = bytearray(moov)
+    replaced = {MP4_ITEMS[field] for field in tags}
+    new_items = b''.join(_mp4_text_item(MP4_ITEMS[field], value) for field, value in tags.items() if value)
+    hdlr = _mp4_atom(b'hdlr', bytes(8) + b'mdirappl' + bytes(9))
+
+    ancestors = [0]
+    udta = find_atom_path(moov, [b'moov', b'udta'])
+    meta = find_atom_path(moov, [b'moov', b'udta', b'meta'])
+    ilst = find_atom_path(moov, [b'moov', b'udta', b'meta', b'ilst'])
+    if ilst is not None:
+        header_start, payload_start, atom_end = ilst
+        kept = b''.join(moov[item_start:item_end]
+                        for item_type, item_start, _, item_end in iter_atoms(moov, payload_start, atom_end)
+                        if item_type not in replaced)
+        ancestors += [udta[0], meta[0]]
+        old_start, old_end, insert = header_start, atom_end, _mp4_atom(b'ilst', kept + new_items)
+    elif meta is not None:
+        ancestors += [udta[0], meta[0]]
+        old_start = old_end = meta[2]
+        insert = _mp4_atom(b'ilst', new_items)
+    elif udta is not None:
+        ancestors.append(udta[0])
+        old_start = old_end = udta[2]
+        insert = _mp4_atom(b'meta', bytes(4) + hdlr + _mp4_atom(b'ilst', new_items))
+    else:
+        old_start = old_end = len(moov)
+        insert = _mp4_atom(b'udta', _mp4_atom(b'meta', bytes(4) + hdlr + _mp4_atom(b'ilst', new_items)))
+
+    delta = len(insert) - (old_end - old_start)
+    for header_start in ancestors:
+        _grow_atom(moov, header_start, delta)
+    moov[old_start:old_end] = insert
+    return moov
+
+
+def _shift_chunk_offsets(moov, after, shift):
+    """Add shift to every stco/co64 chunk offset at or beyond file position after."""
+    _, _, moov_payload, moov_end = next(iter_atoms(moov))
+    for atom_type, _, trak_start, trak_end in iter_atoms(moov, moov_payload, moov_end):
+        if atom_type != b'trak':
+            continue
+        stbl = find_atom_path(moov, [b'mdia', b'minf', b'stbl'], trak_start, trak_end)
+        if stbl is None:
+            continue
+        for table_type, _, table_start, _ in iter_atoms(moov, stbl[1], stbl[2]):
+            if table_type not in (b'stco', b'co64'):
+                continue
+            count = struct.unpack('>I', moov[table_start + 4:table_start + 8])[0]
+            fmt, width = ('>I', 4) if table_type == b'stco' else ('>Q', 8)
+            for i in range(count):
+                pos = table_start + 8 + i * width
+                offset = struct.unpack(fmt, moov[pos:pos + width])[0]
+                if offset >= after:
+                    if table_type == b'stco' and offset + shift >= 1 << 32:
+                        raise TagError('chunk offset overflow; needs co64')
+                    moov[pos:pos + width] = struct.pack(fmt, offset + shift)
+
+
+def _write_mp4_tags(path, tags):
+    """
+    Write tags into the ilst atom of an MP4 file.
+
+    The new moov is written in place when it is the last atom, when a
+    following free atom can absorb the size change, or when it shrinks by
+    enough to leave a free atom behind. Otherwise the file is rewritten with
+    a free atom of PADDING bytes after moov and the chunk offsets shifted.
+    """
+    with open(path, 'rb') as f:
+        atoms = top_level_atoms(f)
+        moov_offset, moov = find_moov(f)
+        file_size = f.seek(0, 2)
+    new_moov = _splice_ilst(moov, tags)
+    delta = len(new_moov) - len(moov)
+    moov_end = moov_offset + len(moov)
+
+    index = next(i for i, atom in enumerate(atoms) if atom[0] == b'moov')
+    following = atoms[index + 1] if index + 1 < len(atoms) else None
+
+    if delta == 0:
+        return 'in-place', _patch_file(path, moov_offset, new_moov)
+    if moov_end == file_size:
+        written = _patch_file(path, moov_offset, new_moov)
+        if delta < 0:
+            os.truncate(path, file_size + delta)
+        return 'in-place', written
+    if following and following[0] in (b'free', b'skip') and following[3] == 8 and following[2] - delta >= 8:
+        free = struct.pack('>I4s', following[2] - delta, b'free')
+        return 'in-place', _patch_file(path, moov_offset, bytes(new_moov) + free)
+    if delta <= -8:
+        free = struct.pack('>I4s', -delta, b'free')
+        return 'in-place', _patch_file(path, moov_offset, bytes(new_moov) + free)
+
+    if any(atom[0] == b'moof' for atom in atoms):
+        raise TagError('fragmented MP4 files are not rewritten natively')
+    padding = _mp4_atom(b'free', bytes(PADDING - 8))
+    _shift_chunk_offsets(new_moov, moov_end, delta + len(padding))
+    return 'rewrite', _rewrite_file(path, [(0, moov_offset), bytes(new_moov), padding, (moov_end, None)])
+
+
+def write_tags(audio_path, tags):
+    """
+    Write text tags ({field: value} with fields from TAG_FIELDS) into an audio file.
+
+    Other tags and pictures are kept; an empty value removes the tag. Returns
+    (method, bytes_written) where method is 'in-place' when only the header
+    region was patched, or 'rewrite' when the tag block outgrew its padding
+    and the file had to be copied once. Raises TagError for anything that
+    cannot be written natively, leaving the file untouched.
+    """
+    audio_path = Path(audio_path)
+    ext = audio_path.suffix.lower()
+    if ext not in SUPPORTED_EXTENSIONS:
+        raise TagError(f"unsupported container {ext}")
+    unknown = set(tags) - set(TAG_FIELDS)
+    if unknown:
+        raise TagError(f"unsupported tags: {', '.join(sorted(unknown))}")
+
+    try:
+        if ext in ID3_EXTENSIONS:
+            return _write_id3_tags(audio_path, tags)
+        if ext in FLAC_EXTENSIONS:
+            return _write_flac_tags(audio_path, tags)
+        return _write_mp4_tags(audio_path, tags)
+    except (struct.error, IndexError, ValueError, zlib.error) as e:
+        raise TagError(f"cannot parse {audio_path.name}: {e}")
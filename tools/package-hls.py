@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Package mixes as segmented HLS (fixed-length chunks plus an .m3u8 playlist).
+Requires: ffmpeg
+
+Usage:
+    ./tools/package-hls.py [directory] [dj_name ...]
+    ./tools/package-hls.py --source /path/to/audio [directory] [dj_name ...]
+    ./tools/package-hls.py --segment 6 --jobs 4 --force [directory]
+    ./tools/package-hls.py --retry-failed [directory]
+
+Folders are found the same way as the other generator tools (see
+resolve_dj_folders() in tools/catalog.py). For each mix the streaming file
+(the MP3, else the M4A) is split with a stream copy, so there is no
+re-encode and no quality loss, into <mix>.hls/:
+
+    index.m3u8      VOD playlist
+    seg00000.ts     MPEG-TS segments of --segment seconds (default 6)
+    package.json    source name, size and mtime, segment length and count
+
+A player can start after downloading one segment, seek by fetching only the
+segment it needs, and cache segments independently. generate-manifest.py
+adds hlsPlaylist to mixes that have a package.
+
+Packages whose package.json matches the source file and segment length are
+skipped unless --force. Packages are built in a temporary folder and moved
+into place, so an interrupted run never leaves a half-written package.
+ffmpeg runs under tools/supervise.py (timeouts scaled by file size, --jobs
+defaults to the CPUs allowed by the cgroup); sources that fail are
+quarantined and skipped until they change, unless --retry-failed.
+--stats out.json writes per-file timings; --profile out.prof runs under
+cProfile (see tools/toolstats.py).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import supervise
+import toolstats
+from catalog import load_config, resolve_dj_folders
+
+SEGMENT_SECONDS = 6
+PACKAGE_EXTENSIONS = ['.mp3', '.m4a']   # In order of preference
+PLAYLIST = 'index.m3u8'
+STAMP = 'package.json'
+
+STATS = toolstats.Stats('package-hls')
+QUARANTINE = supervise.Quarantine('package-hls')
+
+
+def package_dir(output_folder, base_name):
+    return Path(output_folder) / f"{base_name}.hls"
+
+
+def pick_sources(folder):
+    """Return {base_name: path} of the file to package for each mix in folder."""
+    sources = {}
+    for path in sorted(Path(folder).iterdir()):
+        ext = path.suffix.lower()
+        if ext not in PACKAGE_EXTENSIONS or not path.is_file():
+            continue
+        current = sources.get(path.stem)
+        if current is None or PACKAGE_EXTENSIONS.index(ext) < PACKAGE_EXTENSIONS.index(current.suffix.lower()):
+            sources[path.stem] = path
+    return sources
+
+
+def is_up_to_date(source, target, segment_seconds):
+    """Check whether target's package.json was written for the current source file and segment length."""
+    try:
+        with open(target / STAMP) as f:
+            stamp = json.load(f)
+    except (OSError, ValueError):
+        return False
+    st = source.stat()
+    return (stamp.get('source') == source.name and stamp.get('size') == st.st_size
+            and stamp.get('mtime') == st.st_mtime_ns and stamp.get('segmentSeconds') == segment_seconds
+            and (target / PLAYLIST).exists())
+
+
+def package(source, target, segment_seconds):
+    """Segment source into target/ with ffmpeg -c copy; returns a one-line result."""
+    staging = target.with_name(target.name + '.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    with STATS.file(source) as record:
+        st = source.stat()
+        try:
+            result = supervise.run([
+                'ffmpeg', '-v', 'error', '-y', '-i', str(source),
+                '-map', '0:a:0',  # Audio only: leave embedded cover art out of the segments
+                '-c', 'copy',
+                '-f', 'hls',
+                '-hls_time', str(segment_seconds),
+                '-hls_playlist_type', 'vod',
+                '-hls_flags', 'independent_segments',
+                '-hls_segment_filename', str(staging / 'seg%05d.ts'),
+                str(staging / PLAYLIST)
+            ], stage='decode', size=st.st_size)
+        except supervise.ProcessTimeout:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        if result.returncode != 0 or not (staging / PLAYLIST).exists():
+            shutil.rmtree(staging, ignore_errors=True)
+            raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip() or f"ffmpeg exited {result.returncode}")
+        record.read(st.st_size)
+
+        segments = sorted(staging.glob('seg*.ts'))
+        written = sum(p.stat().st_size for p in segments)
+        record.wrote(written)
+        with open(staging / STAMP, 'w') as f:
+            json.dump({'source': source.name, 'size': st.st_size, 'mtime': st.st_mtime_ns,
+                       'segmentSeconds': segment_seconds, 'segments': len(segments)}, f, indent=2)
+
+    # Swap the new package in; the old one (if any) is only removed once the new one is complete
+    if target.exists():
+        old = target.with_name(target.name + '.old')
+        shutil.rmtree(old, ignore_errors=True)
+        os.replace(target, old)
+        os.replace(staging, target)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        os.replace(staging, target)
+    return f"OK ({len(segments)} segments, {written / 1024 / 1024:.1f}MB)"
+
+
+def package_hls(args):
+    folders = resolve_dj_folders(args.directory, args.djs, args.source, load_config(), set(PACKAGE_EXTENSIONS))
+    tasks = []
+    skipped = quarantined = 0
+    for name, source_folder, output_folder in folders:
+        for base_name, source in pick_sources(source_folder).items():
+            target = package_dir(output_folder, base_name)
+            if not args.force and is_up_to_date(source, target, args.segment):
+                skipped += 1
+                continue
+            if QUARANTINE.holds(source):
+                quarantined += 1
+                continue
+            tasks.append((name, source, target))
+
+    print(f"{len(tasks)} mixes to package, {skipped} up to date"
+          + (f", {quarantined} quarantined" if quarantined else '')
+          + f" ({args.jobs} at once, {args.segment}s segments)")
+    started = time.perf_counter()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {}
+        for name, source, target in tasks:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            futures[pool.submit(package, source, target, args.segment)] = (name, source)
+        for future in as_completed(futures):
+            name, source = futures[future]
+            try:
+                print(f"  {name}/{source.name}: {future.result()}")
+                QUARANTINE.release(source)
+            except Exception as e:
+                failed += 1
+                QUARANTINE.add(source, e)
+                print(f"  {name}/{source.name}: ERROR: {e}")
+    print(f"\nPackaged {len(tasks) - failed} mixes in {time.perf_counter() - started:.1f}s"
+          + (f", {failed} failed" if failed else ''))
+    QUARANTINE.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Package mixes as segmented HLS')
+    parser.add_argument('directory', nargs='?', help='Output directory (default: mixes/ with a config, else .)')
+    parser.add_argument('djs', nargs='*', help='Only these DJ folders')
+    parser.add_argument('--source', help='Read audio from this directory')
+    parser.add_argument('--segment', type=int, default=SEGMENT_SECONDS, help='Segment length in seconds')
+    parser.add_argument('--force', action='store_true', help='Repackage mixes that are up to date')
+    parser.add_argument('--jobs', type=int, default=supervise.MAX_PROCESSES, help='ffmpeg processes at once')
+    parser.add_argument('--retry-failed', action='store_true', help='Try quarantined sources again')
+    parser.add_argument('--stats', metavar='FILE', help='Write per-file timings to FILE')
+    parser.add_argument('--profile', metavar='FILE', help='Run under cProfile and write the profile to FILE')
+    args = parser.parse_args()
+    QUARANTINE.retry = args.retry_failed
+    supervise.renice()
+    toolstats.run_main(lambda: package_hls(args), STATS, args.stats, args.profile)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Cache of decoded audio shared by the analysis tools.
+
+Decoding a compressed mix with ffmpeg is the slowest step of every analysis
+pass (peaks, loudness, tempo, ...). With the cache each mix is decoded once
+to mono signed 16-bit PCM at SAMPLE_RATE and kept as a raw file in
+tools/.pcmcache/ (or $MIX_PCM_CACHE), named after the audio file's
+fingerprint (see catalog.fingerprint()) and the sample rate:
+
+    <fingerprint>-<rate>.s16    native-endian samples, no header
+
+Later passes map the file instead of decoding again:
+
+    with PCMCache().open(path) as pcm:
+        pcm.samples         memoryview of ints over the mapped file (no copy)
+        pcm.sample_rate, pcm.duration
+
+The cache is capped at MAX_BYTES ($MIX_PCM_CACHE_MB overrides it) and the
+least recently used files are evicted after each decode; every hit touches
+the file's mtime. A file being read by another process survives eviction
+until it is closed. A new audio file version (different fingerprint) gets a
+new entry and the stale one ages out.
+"""
+
+import mmap
+import os
+import sys
+import time
+from pathlib import Path
+
+import supervise
+import toolstats
+from catalog import fingerprint
+
+SAMPLE_RATE = 11025          # Hz: enough for peaks and low/mid/high energy
+CACHE_DIR = Path(os.environ.get('MIX_PCM_CACHE') or Path(__file__).parent / '.pcmcache')
+MAX_BYTES = int(os.environ.get('MIX_PCM_CACHE_MB') or 20 * 1024) * 1024 * 1024
+SAMPLE_FORMAT = 's16le' if sys.byteorder == 'little' else 's16be'   # Native order, so memoryview.cast('h') works
+STALE_TEMP_SECONDS = 24 * 3600   # Partial decodes left by killed runs are removed after this
+
+
+class PCM:
+    """Memory-mapped samples of one cache entry; close() (or the with block) unmaps them."""
+
+    def __init__(self, path, sample_rate):
+        self.path = path
+        self.sample_rate = sample_rate
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._view = memoryview(self._map if self._map is not None else b'')
+        self.samples = self._view[:len(self._view) // 2 * 2].cast('h')
+        self.duration = len(self.samples) / sample_rate
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.samples.release()
+        self._view.release()
+        if self._map is not None:
+            self._map.close()
+
+
+class PCMCache:
+    """Decoded-PCM cache directory with an LRU size cap."""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES, sample_rate=SAMPLE_RATE):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.sample_rate = sample_rate
+
+    def entry_path(self, audio_path):
+        return self.directory / f"{fingerprint(audio_path)}-{self.sample_rate}.s16"
+
+    def open(self, audio_path):
+        """Return a PCM for audio_path, decoding it into the cache first if needed."""
+        path = self.entry_path(audio_path)
+        if path.exists():
+            os.utime(path)
+        else:
+            self.decode(audio_path, path)
+            self.evict(keep=path)
+        return PCM(path, self.sample_rate)
+
+    def decode(self, audio_path, path):
+        """Decode audio_path with ffmpeg straight into the cache entry path."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        size = os.path.getsize(audio_path)
+        try:
+            result = supervise.run([
+                'ffmpeg', '-v', 'error', '-y', '-i', str(audio_path),
+                '-map', '0:a:0',
+                '-ac', '1',
+                '-ar', str(self.sample_rate),
+                '-f', SAMPLE_FORMAT,
+                str(temp_path)
+            ], stage='decode', size=size)
+        except supervise.ProcessTimeout:
+            temp_path.unlink(missing_ok=True)
+            raise
+        if result.returncode != 0:
+            temp_path.unlink(missing_ok=True)
+            raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip() or f"ffmpeg exited {result.returncode}")
+        toolstats.read(size)
+        os.replace(temp_path, path)
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits max_bytes; returns bytes freed."""
+        for path in self.directory.glob('*.tmp'):
+            try:
+                if path.stat().st_mtime < time.time() - STALE_TEMP_SECONDS:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+        entries = []
+        for path in self.directory.glob('*.s16'):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue  # Evicted by another process
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total - freed <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            freed += size
+        return freed
+
+    def size(self):
+        """Return (entries, bytes) currently in the cache."""
+        sizes = [path.stat().st_size for path in self.directory.glob('*.s16')] if self.directory.exists() else []
+        return len(sizes), sum(sizes)
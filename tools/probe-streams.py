@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Probe every stream in every preset and record its health.
+
+Usage:
+    ./tools/probe-streams.py [streams_directory]
+    ./tools/probe-streams.py --url URL [URL ...]
+
+Default streams directory is 'streams/'. Reads every .streams preset, probes
+each unique stream URL concurrently (asyncio, with a global limit and a
+per-host limit so no single server gets hammered) and writes
+streams/health.json.
+
+For each stream it records:
+    status        ok, slow, http-error, not-audio, timeout or unreachable
+    httpStatus    final HTTP (or ICY) status code
+    connectMs     time to open the connection (DNS + TCP + TLS)
+    firstByteMs   time from opening the connection to the first audio byte
+    contentType   Content-Type of the audio response
+    bitrate       icy-br header, in kbps
+    resolvedUrl   final audio URL after redirects and .pls/.m3u playlists
+
+health.json is read by generate-streams-manifest.py and
+generate-search-index.py (through tools/streamhealth.py) to count, hide or
+sort stations.
+
+--url probes the given URLs and prints the results without writing
+health.json (useful against tools/test-server.js /__test__/icecast.* routes).
+"""
+
+import argparse
+import asyncio
+import json
+import ssl
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+from streamhealth import HEALTHY_STATUSES
+
+CONCURRENCY = 32         # Streams probed at once overall
+PER_HOST = 4             # Streams probed at once against one host
+TIMEOUT = 10.0           # Seconds allowed for each connect / header / first byte
+SLOW_FIRST_BYTE_MS = 3000
+MAX_REDIRECTS = 5
+MAX_PLAYLIST_BYTES = 64 * 1024
+USER_AGENT = 'mix.4st.uk stream prober'
+
+PLAYLIST_TYPES = {
+    'audio/x-scpls', 'audio/scpls', 'application/pls+xml',
+    'audio/x-mpegurl', 'audio/mpegurl', 'application/x-mpegurl',
+    'application/vnd.apple.mpegurl',
+}
+PLAYLIST_EXTENSIONS = ('.pls', '.m3u', '.m3u8')
+
+
+class ProbeError(Exception):
+    """A probe failed; status is one of the health status values."""
+
+    def __init__(self, status, message, http_status=None):
+        super().__init__(message)
+        self.status = status
+        self.http_status = http_status
+
+
+def parse_playlist(text, base_url):
+    """Return the stream URLs listed in a .pls or .m3u playlist."""
+    urls = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or line.startswith('['):
+            continue
+        if '=' in line and line.lower().startswith('file'):
+            line = line.split('=', 1)[1].strip()
+        elif '=' in line:
+            continue
+        if line.lower().startswith(('http://', 'https://')) or '://' not in line:
+            urls.append(urljoin(base_url, line))
+    return urls
+
+
+def is_playlist(url, content_type):
+    """Check whether a response is a playlist rather than audio."""
+    if content_type in PLAYLIST_TYPES:
+        return True
+    path = urlsplit(url).path.lower()
+    return path.endswith(PLAYLIST_EXTENSIONS) or path.endswith('tunein-station.pls')
+
+
+async def read_playlist(reader):
+    """Read a playlist body up to MAX_PLAYLIST_BYTES."""
+    body = b''
+    while len(body) < MAX_PLAYLIST_BYTES:
+        chunk = await reader.read(MAX_PLAYLIST_BYTES - len(body))
+        if not chunk:
+            break
+        body += chunk
+    return body
+
+
+async def fetch_head(url, timeout):
+    """
+    Open a connection to url and read the status line and headers.
+
+    Returns (reader, writer, status_code, headers, connect_ms, started).
+    Headers are lower-cased. Shoutcast v1 'ICY 200 OK' replies are accepted.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ProbeError('unreachable', f"unsupported URL: {url}")
+
+    secure = parts.scheme == 'https'
+    port = parts.port or (443 if secure else 80)
+    context = ssl.create_default_context() if secure else None
+
+    started = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, port, ssl=context,
+                                    server_hostname=parts.hostname if secure else None),
+            timeout)
+    except asyncio.TimeoutError:
+        raise ProbeError('timeout', 'connect timed out')
+    except (OSError, ssl.SSLError) as e:
+        raise ProbeError('unreachable', str(e))
+    connect_ms = (time.perf_counter() - started) * 1000
+
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    host = parts.hostname if not parts.port else f"{parts.hostname}:{parts.port}"
+    request = (
+        f"GET {path} HTTP/1.0\r\n"
+        f"Host: {host}\r\n"
+        f"User-Agent: {USER_AGENT}\r\n"
+        "Accept: */*\r\n"
+        "Icy-MetaData: 0\r\n"
+        "Connection: close\r\n\r\n"
+    )
+
+    try:
+        writer.write(request.encode('latin-1'))
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        fields = status_line.decode('latin-1').split(None, 2)
+        if len(fields) < 2 or not fields[1].isdigit():
+            raise ProbeError('http-error', f"bad status line: {status_line[:80]!r}")
+        status_code = int(fields[1])
+
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if b':' in line:
+                name, value = line.decode('latin-1').split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+    except asyncio.TimeoutError:
+        writer.close()
+        raise ProbeError('timeout', 'no response headers')
+    except (OSError, ssl.SSLError) as e:
+        writer.close()
+        raise ProbeError('unreachable', str(e))
+    except ProbeError:
+        writer.close()
+        raise
+
+    return reader, writer, status_code, headers, connect_ms, started
+
+
+async def probe_url(url, host_limits, per_host=PER_HOST, timeout=TIMEOUT):
+    """Probe a single stream URL, following redirects and playlists."""
+    result = {'url': url}
+    current = url
+    hops = 0
+
+    try:
+        while True:
+            host = urlsplit(current).hostname or ''
+            limit = host_limits.setdefault(host, asyncio.Semaphore(per_host))
+            async with limit:
+                reader, writer, status, headers, connect_ms, started = await fetch_head(current, timeout)
+                try:
+                    content_type = headers.get('content-type', '').split(';')[0].strip().lower()
+
+                    if status in (301, 302, 303, 307, 308) and 'location' in headers:
+                        next_url = urljoin(current, headers['location'])
+                    elif status >= 400:
+                        raise ProbeError('http-error', f"HTTP {status}", status)
+                    elif is_playlist(current, content_type):
+                        body = await asyncio.wait_for(read_playlist(reader), timeout)
+                        entries = parse_playlist(body.decode('utf-8', 'replace'), current)
+                        if not entries:
+                            raise ProbeError('not-audio', 'empty playlist', status)
+                        next_url = entries[0]
+                    else:
+                        chunk = await asyncio.wait_for(reader.read(1024), timeout)
+                        if not chunk:
+                            raise ProbeError('not-audio', 'no audio data', status)
+                        first_byte_ms = (time.perf_counter() - started) * 1000
+
+                        result.update({
+                            'httpStatus': status,
+                            'connectMs': round(connect_ms),
+                            'firstByteMs': round(first_byte_ms),
+                            'contentType': content_type,
+                        })
+                        if headers.get('icy-br', '').split(',')[0].strip().isdigit():
+                            result['bitrate'] = int(headers['icy-br'].split(',')[0])
+                        if current != url:
+                            result['resolvedUrl'] = current
+                        if content_type and not content_type.startswith(('audio/', 'application/ogg', 'video/mp2t')):
+                            raise ProbeError('not-audio', f"content type {content_type}", status)
+                        result['status'] = 'slow' if first_byte_ms > SLOW_FIRST_BYTE_MS else 'ok'
+                        return result
+                finally:
+                    writer.close()
+
+            hops += 1
+            if hops > MAX_REDIRECTS:
+                raise ProbeError('http-error', 'too many redirects or nested playlists', status)
+            current = next_url
+    except asyncio.TimeoutError:
+        result['status'] = 'timeout'
+        result['error'] = 'no audio data'
+    except (OSError, ssl.SSLError) as e:
+        result['status'] = 'unreachable'
+        result['error'] = str(e)
+    except ProbeError as e:
+        result['status'] = e.status
+        result['error'] = str(e)
+        if e.http_status is not None:
+            result['httpStatus'] = e.http_status
+    return result
+
+
+async def probe_all(urls, concurrency=CONCURRENCY, per_host=PER_HOST, timeout=TIMEOUT):
+    """Probe URLs concurrently, printing each result as it completes."""
+    overall = asyncio.Semaphore(concurrency)
+    host_limits = {}
+
+    async def bounded(url):
+        async with overall:
+            return await probe_url(url, host_limits, per_host, timeout)
+
+    results = {}
+    for future in asyncio.as_completed([bounded(url) for url in urls]):
+        result = await future
+        results[result['url']] = result
+        print(f"  {format_result(result)}")
+    return results
+
+
+def format_result(result):
+    """One-line summary of a probe result."""
+    if result['status'] in HEALTHY_STATUSES:
+        bitrate = f", {result['bitrate']}kbps" if 'bitrate' in result else ''
+        return (f"{result['status'].upper():5} {result['url']} "
+                f"({result['connectMs']}ms connect, {result['firstByteMs']}ms first byte{bitrate})")
+    return f"{result['status'].upper():5} {result['url']} ({result.get('error', '')})"
+
+
+def collect_stream_urls(streams_dir):
+    """Return the unique stream URLs across all preset files, in preset order."""
+    urls = []
+    seen = set()
+    for stream_file in sorted(streams_dir.glob('*.streams')):
+        try:
+            with open(stream_file) as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"  Error reading {stream_file.name}: {e}")
+            continue
+        for stream in data.get('streams', []):
+            url = stream.get('m3u', '')
+            if url and url not in seen:
+                seen.add(url)
+                urls.append(url)
+    return urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Probe stream presets and write streams/health.json')
+    parser.add_argument('streams_dir', nargs='?', default='streams', help='Directory of .streams presets')
+    parser.add_argument('--url', nargs='+', help='Probe these URLs only and print results')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help='Streams probed at once')
+    parser.add_argument('--per-host', type=int, default=PER_HOST, help='Streams probed at once per host')
+    parser.add_argument('--timeout', type=float, default=TIMEOUT, help='Seconds per connect/read step')
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(probe_all(args.url, args.concurrency, args.per_host, args.timeout))
+        return
+
+    streams_dir = Path(args.streams_dir)
+    if not streams_dir.exists():
+        print(f"Error: {streams_dir} directory does not exist")
+        sys.exit(1)
+
+    urls = collect_stream_urls(streams_dir)
+    if not urls:
+        print(f"No streams found in {streams_dir}")
+        return
+
+    print(f"Probing {len(urls)} streams ({args.concurrency} at once, {args.per_host} per host)...")
+    started = time.perf_counter()
+    results = asyncio.run(probe_all(urls, args.concurrency, args.per_host, args.timeout))
+    elapsed = time.perf_counter() - started
+
+    health = {
+        'generated': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'streams': {url: {k: v for k, v in results[url].items() if k != 'url'} for url in urls},
+    }
+    health_path = streams_dir / 'health.json'
+    with open(health_path, 'w') as f:
+        json.dump(health, f, indent=2)
+
+    counts = {}
+    for result in results.values():
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    summary = ', '.join(f"{n} {status}" for status, n in sorted(counts.items()))
+    print(f"\nWrote {health_path} ({summary}) in {elapsed:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+"""
+Read audio from a remote HTTP mirror of mixes/ without downloading it first.
+
+Used by generate-manifest.py and generate-peaks.py with --remote URL, where
+URL is the base of a mixes/ tree (e.g. one of the mixesBaseUrls in
+mixes/mixes-config.json) served with directory listings:
+
+    list_dj_directories()  <dj>/ and moreDJs/<dj>/ folders with audio files,
+                           parsed from the server's autoindex pages
+    metadata()             tags and duration from the container header,
+                           fetched with Range requests in BLOCK_SIZE blocks
+    stream()               the whole file in CHUNK_SIZE chunks, for piping
+                           into ffmpeg
+
+Connections are kept alive and reused per host, and at most PER_HOST
+requests run against one host at a time however many worker threads the
+tool uses. The server must support Range requests (tools/test-server.js
+does, for local testing).
+"""
+
+import http.client
+import threading
+from contextlib import contextmanager
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import quote, unquote, urljoin, urlsplit
+
+import toolstats
+from catalog import AUDIO_EXTENSIONS, probe_metadata
+
+PER_HOST = 4                 # Requests in flight against one host
+TIMEOUT = 30.0               # Seconds per connect/read
+BLOCK_SIZE = 64 * 1024       # Granularity of header Range reads
+CHUNK_SIZE = 256 * 1024      # Read size when streaming a whole file
+MAX_REDIRECTS = 5
+USER_AGENT = 'mix.4st.uk tools'
+
+
+class RemoteError(Exception):
+    """An HTTP request failed or the server cannot serve what a tool needs."""
+
+
+class _LinkParser(HTMLParser):
+    """Collects the href of every <a> in a page."""
+
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            href = dict(attrs).get('href')
+            if href:
+                self.links.append(href)
+
+
+def parse_listing(html):
+    """Return (directories, files) named by the relative links of an autoindex page."""
+    parser = _LinkParser()
+    parser.feed(html)
+    directories, files = [], []
+    for href in parser.links:
+        href = href.split('#')[0].split('?')[0]
+        if href.startswith('./'):
+            href = href[2:]
+        if not href or href.startswith(('/', '.')) or '://' in href:
+            continue
+        name = unquote(href.rstrip('/'))
+        if '/' in name:
+            continue
+        target = directories if href.endswith('/') else files
+        if name not in target:
+            target.append(name)
+    return directories, files
+
+
+def join_url(base_url, *names):
+    """Append quoted path segments to a directory URL (which may be a proxy URL with ?url=...)."""
+    url = base_url if base_url.endswith('/') else base_url + '/'
+    for name in names:
+        url += quote(name) + '/'
+    return url
+
+
+class RemoteDirectory:
+    """One DJ folder on the remote server."""
+
+    def __init__(self, session, url, path, files):
+        self.session = session
+        self.url = url
+        self.path = path          # 'dj' or 'moreDJs/dj', relative to the base URL
+        self.name = Path(path).name
+        self.files = files
+
+    def file_url(self, name):
+        return self.url + quote(name)
+
+    def metadata(self, name):
+        """Return (tags, duration) for one of this folder's files."""
+        return self.session.metadata(self.file_url(name), name)
+
+
+class RemoteFile:
+    """Read-only, seekable file object over HTTP Range requests, cached in BLOCK_SIZE blocks."""
+
+    def __init__(self, session, url):
+        self.session = session
+        self.url = url
+        self.size = None
+        self.position = 0
+        self.blocks = {}
+        self.fetched = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.blocks.clear()
+
+    def _fetch(self, first, last):
+        """Load blocks first..last (inclusive) with a single Range request."""
+        start, end = first * BLOCK_SIZE, (last + 1) * BLOCK_SIZE - 1
+        with self.session.request(self.url, {'Range': f'bytes={start}-{end}'}) as response:
+            if response.status == 416:
+                data = b''
+                self.size = int(response.getheader('Content-Range', '*/0').rsplit('/', 1)[1])
+            elif response.status != 206:
+                raise RemoteError(f"{self.url}: expected 206 for a Range request, got {response.status}")
+            else:
+                data = response.read()
+                self.size = int(response.getheader('Content-Range').rsplit('/', 1)[1])
+        self.fetched += len(data)
+        for index in range(first, last + 1):
+            offset = (index - first) * BLOCK_SIZE
+            self.blocks[index] = data[offset:offset + BLOCK_SIZE]
+
+    def read(self, n=-1):
+        if self.size is None:
+            self._fetch(0, 0)
+        end = self.size if n is None or n < 0 else min(self.size, self.position + n)
+        if end <= self.position:
+            return b''
+        first, last = self.position // BLOCK_SIZE, (end - 1) // BLOCK_SIZE
+        missing = [index for index in range(first, last + 1) if index not in self.blocks]
+        if missing:
+            self._fetch(missing[0], missing[-1])
+        data = b''.join(self.blocks[index] for index in range(first, last + 1))
+        offset = self.position - first * BLOCK_SIZE
+        data = data[offset:offset + end - self.position]
+        self.position += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        if whence == 2 and self.size is None:
+            self._fetch(0, 0)
+        base = {0: 0, 1: self.position, 2: self.size}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+
+class Session:
+    """Keep-alive HTTP connections pooled per host, with at most per_host requests per host at once."""
+
+    def __init__(self, per_host=PER_HOST, timeout=TIMEOUT):
+        self.per_host = per_host
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.limits = {}
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for conn in connections:
+                    conn.close()
+            self.idle.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _limit(self, host):
+        with self.lock:
+            return self.limits.setdefault(host, threading.BoundedSemaphore(self.per_host))
+
+    def _connect(self, host):
+        scheme, netloc = host
+        factory = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return factory(netloc, timeout=self.timeout)
+
+    def _checkout(self, host):
+        """Return (connection, reused) for host = (scheme, netloc)."""
+        with self.lock:
+            connections = self.idle.get(host)
+            if connections:
+                return connections.pop(), True
+        return self._connect(host), False
+
+    def _checkin(self, host, conn):
+        with self.lock:
+            self.idle.setdefault(host, []).append(conn)
+
+    def _send(self, host, method, target, headers):
+        """Send a request, retrying once on a fresh connection if a reused one was closed by the server."""
+        conn, reused = self._checkout(host)
+        try:
+            conn.request(method, target, headers=headers)
+            return conn, conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            if not reused:
+                raise
+        conn = self._connect(host)
+        conn.request(method, target, headers=headers)
+        return conn, conn.getresponse()
+
+    def slot(self, url):
+        """Context manager holding one of url's host slots, for clients outside the pool (e.g. ffmpeg)."""
+        parts = urlsplit(url)
+        return self._limit((parts.scheme, parts.netloc))
+
+    @contextmanager
+    def request(self, url, headers=None, method='GET'):
+        """
+        Send a request and yield the response, following redirects.
+
+        The connection goes back to the pool if the body was read to the
+        end, and is closed otherwise.
+        """
+        headers = {'User-Agent': USER_AGENT, **(headers or {})}
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            if parts.scheme not in ('http', 'https') or not parts.netloc:
+                raise RemoteError(f"unsupported URL: {url}")
+            host = (parts.scheme, parts.netloc)
+            target = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+            with self._limit(host):
+                try:
+                    conn, response = self._send(host, method, target, headers)
+                except (http.client.HTTPException, OSError) as e:
+                    raise RemoteError(f"{url}: {e}")
+                location = response.getheader('Location')
+                if response.status in (301, 302, 303, 307, 308) and location:
+                    response.read()
+                    self._checkin(host, conn)
+                    url = urljoin(url, location)
+                    continue
+                try:
+                    yield response
+                finally:
+                    if response.isclosed() and not response.will_close:
+                        self._checkin(host, conn)
+                    else:
+                        conn.close()
+                return
+        raise RemoteError(f"{url}: too many redirects")
+
+    def get(self, url):
+        """Return the body of a GET request, raising RemoteError unless it succeeds."""
+        with self.request(url) as response:
+            body = response.read()
+            if response.status != 200:
+                raise RemoteError(f"{url}: HTTP {response.status}")
+        return body
+
+    def list_directory(self, url):
+        """Return (directories, files) from the autoindex page at url."""
+        return parse_listing(self.get(url).decode('utf-8', 'replace'))
+
+    def list_dj_directories(self, base_url, extensions=AUDIO_EXTENSIONS):
+        """Return RemoteDirectory objects for <dj>/ and moreDJs/<dj>/ folders containing audio files."""
+        directories, _ = self.list_directory(join_url(base_url))
+        paths = []
+        for name in directories:
+            if name == 'moreDJs':
+                nested, _ = self.list_directory(join_url(base_url, name))
+                paths += [(name, sub) for sub in nested]
+            elif not name.startswith('.'):
+                paths.append((name,))
+
+        dj_dirs = []
+        for path in paths:
+            url = join_url(base_url, *path)
+            _, files = self.list_directory(url)
+            audio = sorted(f for f in files if Path(f).suffix.lower() in extensions)
+            if audio:
+                dj_dirs.append(RemoteDirectory(self, url, '/'.join(path), audio))
+        return sorted(dj_dirs, key=lambda d: d.name.lower())
+
+    def metadata(self, url, name):
+        """
+        Return (tags, duration) for the remote file url (named name).
+
+        Only the blocks holding the container header are fetched; containers
+        mediatags cannot parse fall back to ffprobe on the URL (see
+        catalog.probe_metadata(), which local files go through too).
+        """
+        with RemoteFile(self, url) as f:
+            tags, duration = probe_metadata(name, f, url)
+        toolstats.read(f.fetched)
+        return tags, duration
+
+    def stream(self, url):
+        """Yield the body of url in CHUNK_SIZE chunks over a pooled connection."""
+        with self.request(url) as response:
+            if response.status != 200:
+                raise RemoteError(f"{url}: HTTP {response.status}")
+            while True:
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                toolstats.read(len(chunk))
+                yield chunk
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Roll beacon.log up into compact per-day files for the stats.php dashboard.
+
+Usage:
+    ./tools/rollup-beacons.py [beacon.log] [--out DIR] [--rebuild]
+
+Default log is ./beacon.log and default output is beacon-rollups/ next to
+it (deny web access to it, as for beacon.log: it holds IP addresses).
+Run it from cron, e.g. every 10 minutes.
+
+The log is read incrementally: DIR/state.json records the inode, the byte
+offset of the last complete line processed and a hash of the first line, so
+each run only parses what ping.php appended since the previous run.
+Rotation is detected by a new inode, a file shorter than the offset or a
+changed first line (copytruncate). When beacon.log.1 starts with the
+recorded first line it is the log read last time, whether it was renamed
+or copied there, so its remainder is read first, then the new log from
+the start.
+A partially written last line is left for the next run.
+
+Each day (from server_ts, else ts) gets DIR/YYYY-MM-DD.json:
+
+    total      events that day
+    first/last timestamps of the first and last event
+    events, nicks, ips, sources
+               {name: count}
+    streams    {stream: plays} for stream-play and daily-stream
+    mixes      {mix: plays} for mix-play and daily-mix
+    searches   the day's last SEARCHES_PER_DAY searches: [{query, nick, ts}]
+
+Events without a timestamp go to DIR/undated.json. stats.php merges the day
+files and parses only the part of the log written since the last run, so
+its cost no longer grows with the log. --rebuild deletes the rollups and
+reads the current log from the start.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+SEARCHES_PER_DAY = 30
+READ_CHUNK = 1024 * 1024
+STATE_FILE = 'state.json'
+UNDATED = 'undated'
+
+
+def empty_rollup(day):
+    return {'day': day, 'total': 0, 'first': None, 'last': None, 'events': {}, 'nicks': {},
+            'ips': {}, 'sources': {}, 'streams': {}, 'mixes': {}, 'searches': []}
+
+
+def count(table, key):
+    table[key] = table.get(key, 0) + 1
+
+
+def field(entry, *keys, default=''):
+    """First of keys that is present and not null, like PHP's ??."""
+    for key in keys:
+        if entry.get(key) is not None:
+            return entry[key]
+    return default
+
+
+def add_entry(rollup, entry):
+    """Aggregate one beacon record, the same way stats.php does."""
+    nick = field(entry, 'nick', default='unknown')
+    event = field(entry, 'event', default='unknown')
+    detail = field(entry, 'detail')
+    ts = field(entry, 'server_ts', 'ts')
+
+    rollup['total'] += 1
+    rollup['first'] = rollup['first'] or ts or None
+    rollup['last'] = ts or rollup['last']
+    count(rollup['ips'], field(entry, 'ip', default='unknown'))
+    count(rollup['nicks'], nick)
+    count(rollup['events'], event)
+    if event in ('stream-play', 'daily-stream') and detail:
+        count(rollup['streams'], detail)
+    if event in ('mix-play', 'daily-mix') and detail:
+        count(rollup['mixes'], detail)
+    source = field(entry, 'source')
+    if source:
+        count(rollup['sources'], source)
+    if event == 'search' and detail:
+        rollup['searches'] = (rollup['searches'] + [{'query': detail, 'nick': nick, 'ts': ts}])[-SEARCHES_PER_DAY:]
+
+
+def first_line_hash(path):
+    """SHA-1 of the log's first line, or None while it has no complete line."""
+    with open(path, 'rb') as f:
+        line = f.readline(64 * 1024)
+    return hashlib.sha1(line).hexdigest() if line.endswith(b'\n') else None
+
+
+def read_lines(path, offset):
+    """Yield (entry_or_None, end_offset) for each complete line after offset."""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        pending = b''
+        while True:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                return
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                offset += len(line) + 1
+                try:
+                    entry = json.loads(line) if line.strip() else None
+                except ValueError:
+                    entry = None
+                yield (entry if isinstance(entry, dict) else None), offset
+
+
+class Rollups:
+    """Day rollup files in a directory, loaded on first use and written back by save()."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.days = {}
+
+    def day(self, name):
+        if name not in self.days:
+            path = self.directory / f"{name}.json"
+            try:
+                with open(path) as f:
+                    self.days[name] = json.load(f)
+            except (OSError, ValueError):
+                self.days[name] = empty_rollup(name)
+        return self.days[name]
+
+    def add(self, entry):
+        day = str(field(entry, 'server_ts', 'ts'))[:10]
+        add_entry(self.day(day or UNDATED), entry)
+
+    def save(self):
+        for name, rollup in self.days.items():
+            write_json(self.directory / f"{name}.json", rollup)
+        return len(self.days)
+
+
+def write_json(path, data):
+    temp_path = path.with_name(path.name + '.tmp')
+    with open(temp_path, 'w') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temp_path, path)
+
+
+def load_state(out_dir):
+    try:
+        with open(out_dir / STATE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def plan_reads(log_path, state):
+    """Return [(path, start_offset)] to read, following a rotation since the last run."""
+    if not state or not log_path.exists():
+        return [(log_path, 0)] if log_path.exists() else []
+    st = log_path.stat()
+    if st.st_ino == state.get('inode') and st.st_size >= state['offset'] \
+            and first_line_hash(log_path) == state.get('head'):
+        return [(log_path, state['offset'])]
+
+    reads = []
+    rotated = log_path.with_name(log_path.name + '.1')
+    if rotated.exists() and rotated.stat().st_size >= state['offset'] \
+            and first_line_hash(rotated) == state.get('head'):
+        reads.append((rotated, state['offset']))
+    reads.append((log_path, 0))
+    return reads
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Roll beacon.log up into per-day files for stats.php')
+    parser.add_argument('log', nargs='?', default='beacon.log', help='Path to beacon.log')
+    parser.add_argument('--out', help='Rollup directory (default: beacon-rollups/ next to the log)')
+    parser.add_argument('--rebuild', action='store_true', help='Delete the rollups and re-read the log')
+    args = parser.parse_args()
+
+    log_path = Path(args.log)
+    out_dir = Path(args.out) if args.out else log_path.parent / 'beacon-rollups'
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if args.rebuild:
+        for path in out_dir.glob('*.json'):
+            path.unlink()
+
+    started = time.perf_counter()
+    state = load_state(out_dir)
+    rollups = Rollups(out_dir)
+    lines = bad = read_bytes = 0
+    offset = 0
+    for path, start in plan_reads(log_path, state):
+        offset = start
+        for entry, offset in read_lines(path, start):
+            lines += 1
+            if entry is None:
+                bad += 1
+            else:
+                rollups.add(entry)
+        read_bytes += offset - start
+
+    days = rollups.save()
+    if log_path.exists():
+        write_json(out_dir / STATE_FILE, {'inode': log_path.stat().st_ino, 'offset': offset,
+                                          'head': first_line_hash(log_path), 'updated': time.time()})
+    print(f"Rolled up {lines} lines ({read_bytes / 1024:.1f} KB, {bad} unparseable) into {days} day files "
+          f"in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
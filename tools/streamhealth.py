@@ -0,0 +1,31 @@
+"""
+Stream probe results from streams/health.json, written by probe-streams.py.
+
+generate-streams-manifest.py counts failed streams per preset and
+generate-search-index.py hides them. Only a recorded failure counts against
+a stream: streams added to a preset since the last probe run have no entry
+and are treated as unprobed, not dead.
+"""
+
+import json
+
+HEALTHY_STATUSES = ('ok', 'slow')
+FAILED_STATUSES = ('http-error', 'not-audio', 'timeout', 'unreachable')
+
+
+def load_health(streams_dir):
+    """Load per-stream probe results from health.json, or None if absent."""
+    health_path = streams_dir / 'health.json'
+    if not health_path.exists():
+        return None
+    try:
+        with open(health_path) as f:
+            return json.load(f).get('streams', {})
+    except Exception as e:
+        print(f"Warning: Could not load {health_path}: {e}")
+        return None
+
+
+def stream_status(health, url):
+    """The recorded status of url, or None if it was not probed."""
+    return health.get(url, {}).get('status')
@@ -0,0 +1,208 @@
+"""
+Supervision of the ffmpeg/ffprobe processes started by the generator tools.
+
+toolstats.run() waits for a subprocess as long as it takes, so one corrupt or
+truncated file could hang a whole rebuild. run() here wraps it with:
+
+    timeouts     PROBE_TIMEOUT for probes (and other short jobs); decodes get
+                 DECODE_TIMEOUT plus DECODE_SECONDS_PER_SECOND per second of
+                 audio, estimated from the file size when the duration is
+                 not known
+    retries      a process that timed out or was killed by a signal (e.g.
+                 the OOM killer) is run again, up to RETRIES times; a plain
+                 non-zero exit means a broken file and is not retried
+    concurrency  at most MAX_PROCESSES supervised processes run at once
+                 across all threads: by default the CPUs this process may
+                 use, capped by its cgroup CPU quota, so a container limited
+                 to 2 CPUs runs 2 decodes rather than one per host core
+                 ($MIX_TOOLS_PROCESSES overrides it)
+    niceness     renice() lowers the CPU and IO priority of the tool, and so
+                 of every process it starts ($MIX_TOOLS_NICE, off by default)
+
+Files a tool still fails on go into a Quarantine: a JSON file
+(tools/.quarantine.json, or $MIX_QUARANTINE) listing, per tool, each failed
+file with its size, mtime and error. Later runs skip those files until they
+change on disk, so a batch keeps its throughput instead of stalling on the
+same file every time; --retry-failed tries them again.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import toolstats
+
+PROBE_TIMEOUT = 60                  # Seconds, for ffprobe, cover extraction and thumbnails
+DECODE_TIMEOUT = 120                # Seconds, plus DECODE_SECONDS_PER_SECOND per second of audio
+DECODE_SECONDS_PER_SECOND = 0.25    # Allows a decode to run as slowly as 4x real time
+UNKNOWN_TIMEOUT = 4 * 3600          # Decodes of unknown length (e.g. streamed from a remote)
+MIN_BITRATE = 64000                 # Bits/s, to estimate a duration from a file size
+RETRIES = 1
+NICE = int(os.environ.get('MIX_TOOLS_NICE') or 0)
+QUARANTINE_PATH = Path(os.environ.get('MIX_QUARANTINE') or Path(__file__).parent / '.quarantine.json')
+
+
+class ProcessTimeout(RuntimeError):
+    """A supervised process was still running after its timeout on every attempt."""
+
+
+def cpu_limit():
+    """CPUs this process may use: its affinity mask, capped by a cgroup (v2 or v1) CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            limit, period = f.read().split()
+        if limit != 'max':
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota:
+        cpus = min(cpus, max(1, int(quota)))
+    return cpus
+
+
+MAX_PROCESSES = int(os.environ.get('MIX_TOOLS_PROCESSES') or cpu_limit())
+
+_slots = threading.BoundedSemaphore(MAX_PROCESSES)
+
+
+def renice(nice=NICE):
+    """
+    Lower the CPU priority of this process by nice, and its IO priority to the
+    lowest best-effort level (with ionice, when installed). Threads and
+    processes started afterwards inherit both. No-op when nice is 0.
+    """
+    if nice <= 0:
+        return
+    os.nice(nice)
+    if shutil.which('ionice'):
+        subprocess.run(['ionice', '-c', '2', '-n', '7', '-p', str(os.getpid())],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def timeout_for(stage='decode', duration=None, size=None):
+    """Timeout in seconds for a process of the given stage, from the audio's duration or byte size."""
+    if stage == 'probe':
+        return PROBE_TIMEOUT
+    if duration is None and size:
+        duration = size * 8 / MIN_BITRATE
+    if duration is None:
+        return UNKNOWN_TIMEOUT
+    return DECODE_TIMEOUT + duration * DECODE_SECONDS_PER_SECOND
+
+
+def run(cmd, stage='decode', input=None, duration=None, size=None, timeout=None, retries=RETRIES):
+    """
+    toolstats.run() with a timeout, retries and a slot from the MAX_PROCESSES cap.
+
+    The timeout is timeout_for(stage, duration, size) unless given. A streamed
+    input (an iterable of chunks) cannot be replayed, so it gets one attempt.
+    Returns a CompletedProcess; raises ProcessTimeout if the last attempt timed out.
+    """
+    timeout = timeout or timeout_for(stage, duration, size)
+    attempts = retries + 1 if input is None or isinstance(input, bytes) else 1
+    for attempt in range(1, attempts + 1):
+        with _slots:
+            try:
+                result = toolstats.run(cmd, stage, input, timeout)
+            except subprocess.TimeoutExpired:
+                if attempt == attempts:
+                    raise ProcessTimeout(f"{cmd[0]} timed out after {timeout:.0f}s") from None
+                continue
+        if result.returncode >= 0 or attempt == attempts:
+            return result
+
+
+def _key(file):
+    """Quarantine key of a file: its absolute path, or the URL as is."""
+    file = str(file)
+    return file if '://' in file else os.path.abspath(file)
+
+
+def _stat(file):
+    """(size, mtime_ns) of a local file, or (None, None) for a URL or missing file."""
+    try:
+        st = os.stat(file)
+    except (OSError, ValueError):
+        return None, None
+    return st.st_size, st.st_mtime_ns
+
+
+class Quarantine:
+    """Files one tool failed on, skipped by later runs until they change on disk."""
+
+    def __init__(self, tool, path=QUARANTINE_PATH, retry=False):
+        self.tool = tool
+        self.path = Path(path)
+        self.retry = retry
+        self.lock = threading.Lock()
+        self.entries = {file: entry for file, entry in self._load().get(tool, {}).items()
+                        if entry.get('size') is None or os.path.exists(file)}  # Forget deleted files
+        self.added = {}
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        data = self._load()  # Other tools may have updated their sections meanwhile
+        if self.entries:
+            data[self.tool] = self.entries
+        else:
+            data.pop(self.tool, None)
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    def holds(self, file):
+        """Return the recorded error if file is quarantined and unchanged since, else None."""
+        if self.retry:
+            return None
+        entry = self.entries.get(_key(file))
+        if entry and (entry.get('size'), entry.get('mtime')) == _stat(file):
+            return entry['reason']
+        return None
+
+    def add(self, file, reason):
+        """Quarantine file with the error that made the tool give up on it."""
+        reason = (str(reason).strip().splitlines() or ['unknown error'])[0][:200]
+        size, mtime = _stat(file)
+        with self.lock:
+            self.entries[_key(file)] = {'reason': reason, 'size': size, 'mtime': mtime, 'failed': int(time.time())}
+            self.added[_key(file)] = reason
+            self._save()
+
+    def release(self, file):
+        """Forget a file that has now been processed successfully."""
+        with self.lock:
+            if self.entries.pop(_key(file), None) is not None:
+                self._save()
+
+    def report(self):
+        """Print the files quarantined during this run."""
+        if not self.added:
+            return
+        print(f"\n{len(self.added)} files quarantined in {self.path} "
+              f"(skipped until they change; --retry-failed tries them again):")
+        for file, reason in sorted(self.added.items()):
+            print(f"  {file}: {reason}")
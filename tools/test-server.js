@@ -81,6 +81,10 @@ const contentTypes = new Map([
   ['.gif', 'image/gif'],
   ['.mp3', 'audio/mpeg'],
   ['.m4a', 'audio/mp4'],
+  ['.flac', 'audio/flac'],
+  ['.opus', 'audio/ogg'],
+  ['.m3u8', 'application/vnd.apple.mpegurl'],
+  ['.ts', 'video/mp2t'],
   ['.ogg', 'audio/ogg'],
   ['.wav', 'audio/wav']
 ]);
@@ -139,6 +143,105 @@ function sendChunkedTestStream(res, wavBuffer, reqMethod) {
   });
 }
 
+// Fake Icecast/Shoutcast endpoints for tools/probe-streams.py:
+//   /__test__/icecast.mp3   audio/mpeg with icy-* headers, bytes trickle in
+//   /__test__/icecast.pls   .pls playlist pointing at icecast.mp3
+//   /__test__/icecast-slow.mp3  same stream, first byte delayed by ?delay=ms
+//   /__test__/icecast-dead.mp3  404, like an offline mount point
+function sendIcecastStream(res, reqMethod, delayMs = 0) {
+  res.writeHead(200, {
+    'Content-Type': 'audio/mpeg',
+    'icy-br': '128',
+    'icy-name': 'Test Icecast Stream',
+    'icy-genre': 'Test',
+    'icy-pub': '0',
+    'Cache-Control': 'no-cache, no-store'
+  });
+
+  if (reqMethod === 'HEAD') {
+    res.end();
+    return;
+  }
+
+  // MPEG-1 Layer III 128 kbps 44.1 kHz frame header followed by silence
+  const frame = Buffer.alloc(417);
+  frame.writeUInt32BE(0xfffb9064, 0);
+  let sent = 0;
+  let interval = null;
+  const timer = setTimeout(() => {
+    interval = setInterval(() => {
+      if (sent >= 64) {
+        clearInterval(interval);
+        res.end();
+        return;
+      }
+      res.write(frame);
+      sent += 1;
+    }, 26);
+  }, delayMs);
+
+  res.on('close', () => {
+    clearTimeout(timer);
+    if (interval) clearInterval(interval);
+  });
+}
+
+function sendIcecastPlaylist(res, host) {
+  const body = [
+    '[playlist]',
+    'NumberOfEntries=1',
+    `File1=http://${host}/__test__/icecast.mp3`,
+    'Title1=Test Icecast Stream',
+    'Length1=-1',
+    'Version=2',
+    ''
+  ].join('\n');
+  res.writeHead(200, {
+    'Content-Type': 'audio/x-scpls',
+    'Content-Length': String(Buffer.byteLength(body)),
+    'Cache-Control': 'no-store'
+  });
+  res.end(body);
+}
+
+// Single byte range ("bytes=start-end", "bytes=start-" or "bytes=-suffix"),
+// as sent by media elements and tools/remote.py. Returns null when absent
+// or unparseable (serve the whole file), or { start, end } which may be
+// unsatisfiable (start > end).
+function parseRange(header, size) {
+  const match = /^bytes=(\d*)-(\d*)$/.exec(header || '');
+  if (!match || (match[1] === '' && match[2] === '')) {
+    return null;
+  }
+  if (match[1] === '') {
+    return { start: Math.max(0, size - Number(match[2])), end: size - 1 };
+  }
+  const end = match[2] === '' ? size - 1 : Math.min(Number(match[2]), size - 1);
+  return { start: Number(match[1]), end };
+}
+
+// Autoindex-style listing for directories without index.html, so the
+// --remote mode of the generator tools can be tested against this server.
+async function sendDirectoryListing(res, dirPath, pathname) {
+  const entries = await fs.readdir(dirPath, { withFileTypes: true });
+  const base = pathname.endsWith('/') ? pathname : `${pathname}/`;
+  const links = entries
+    .filter(entry => !entry.name.startsWith('.'))
+    .sort((a, b) => a.name.localeCompare(b.name))
+    .map(entry => {
+      const slash = entry.isDirectory() ? '/' : '';
+      const label = entry.name.replace(/&/g, '&amp;').replace(/</g, '&lt;');
+      return `<a href="${encodeURIComponent(entry.name)}${slash}">${label}${slash}</a>`;
+    });
+  const body = `<html><body><h1>Index of ${base}</h1>\n<a href="../">../</a>\n${links.join('\n')}\n</body></html>\n`;
+  res.writeHead(200, {
+    'Content-Type': 'text/html; charset=utf-8',
+    'Content-Length': String(Buffer.byteLength(body)),
+    'Cache-Control': 'no-store'
+  });
+  res.end(body);
+}
+
 const server = http.createServer(async (req, res) => {
   try {
     if (!req.url) {
@@ -161,6 +264,28 @@ const server = http.createServer(async (req, res) => {
       return;
     }
 
+    if (pathname === '/__test__/icecast.mp3') {
+      sendIcecastStream(res, req.method || 'GET');
+      return;
+    }
+
+    if (pathname === '/__test__/icecast-slow.mp3') {
+      const delay = Number.parseInt(url.searchParams.get('delay') || '4000', 10);
+      sendIcecastStream(res, req.method || 'GET', delay);
+      return;
+    }
+
+    if (pathname === '/__test__/icecast.pls') {
+      sendIcecastPlaylist(res, req.headers.host || `127.0.0.1:${port}`);
+      return;
+    }
+
+    if (pathname === '/__test__/icecast-dead.mp3') {
+      res.writeHead(404, { 'Content-Type': 'text/plain' });
+      res.end('Mountpoint not found');
+      return;
+    }
+
     const resolvedPath = safeResolvePath(pathname);
     if (!resolvedPath) {
       res.writeHead(403);
@@ -178,14 +303,41 @@ const server = http.createServer(async (req, res) => {
     let filePath = resolvedPath;
     if (stat.isDirectory()) {
       filePath = path.join(resolvedPath, 'index.html');
+      if (!(await fs.stat(filePath).catch(() => null))) {
+        await sendDirectoryListing(res, resolvedPath, pathname);
+        return;
+      }
     }
 
     const data = await fs.readFile(filePath);
     const ext = path.extname(filePath).toLowerCase();
     const contentType = contentTypes.get(ext) || 'application/octet-stream';
 
+    const range = parseRange(req.headers.range, data.length);
+    if (range && (range.start > range.end || range.start >= data.length)) {
+      res.writeHead(416, {
+        'Content-Range': `bytes */${data.length}`,
+        'Accept-Ranges': 'bytes'
+      });
+      res.end();
+      return;
+    }
+    if (range) {
+      res.writeHead(206, {
+        'Content-Type': contentType,
+        'Content-Length': String(range.end - range.start + 1),
+        'Content-Range': `bytes ${range.start}-${range.end}/${data.length}`,
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'no-store'
+      });
+      res.end(data.subarray(range.start, range.end + 1));
+      return;
+    }
+
     res.writeHead(200, {
       'Content-Type': contentType,
+      'Content-Length': String(data.length),
+      'Accept-Ranges': 'bytes',
       'Cache-Control': 'no-store'
     });
     res.end(data);
@@ -0,0 +1,294 @@
+"""
+Per-file timing and resource instrumentation shared by the generator tools.
+
+Each tool wraps the work for one audio file in `stats.file(path)`; inside it,
+subprocesses started through run() and blocks wrapped in stage() are charged
+to that file. For every file the report records:
+
+    spawn      time to fork/exec subprocesses
+    probe      time waiting on ffprobe (or other probe subprocesses)
+    decode     time waiting on ffmpeg decodes and encodes
+    python     everything else (parsing, downsampling, JSON, ...)
+    bytesRead / bytesWritten
+    peakRss    peak resident set size of the tool process and of the
+               largest subprocess it started for the file, in bytes
+
+Command-line options understood by every instrumented tool:
+
+    --stats out.json     write a summary: per-stage p50/p95/max, totals
+                         and the slowest files with their breakdown
+    --profile out.prof   run under cProfile and write the profile (open
+                         with `python3 -m pstats out.prof` or snakeviz)
+
+The current file is tracked per thread, so worker pools only need to enter
+stats.file() in the worker.
+"""
+
+import cProfile
+import json
+import math
+import os
+import pstats
+import resource
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+SLOWEST_FILES = 10
+
+_current = threading.local()
+
+
+def _self_rss():
+    """Peak RSS of this process in bytes (ru_maxrss is KB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+class FileRecord:
+    """Timings and I/O counters for one file."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.stages = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.child_rss = 0
+        self.total = 0.0
+        self.rss = 0
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def read(self, n):
+        self.bytes_read += n
+
+    def wrote(self, n):
+        self.bytes_written += n
+
+    def as_dict(self):
+        entry = {'file': self.path, 'total': round(self.total, 4)}
+        entry.update({stage: round(seconds, 4) for stage, seconds in sorted(self.stages.items())})
+        entry.update({'bytesRead': self.bytes_read, 'bytesWritten': self.bytes_written,
+                      'peakRss': max(self.rss, self.child_rss)})
+        return entry
+
+
+def current():
+    """The FileRecord being measured on this thread, or None."""
+    return getattr(_current, 'record', None)
+
+
+@contextmanager
+def stage(name):
+    """Charge a block of work to the current file's named stage (no-op outside stats.file())."""
+    record = current()
+    if record is None:
+        yield
+        return
+    with record.stage(name):
+        yield
+
+
+def read(n):
+    """Count n bytes read for the current file."""
+    record = current()
+    if record is not None:
+        record.read(n)
+
+
+def wrote(n):
+    """Count n bytes written for the current file."""
+    record = current()
+    if record is not None:
+        record.wrote(n)
+
+
+def run(cmd, stage='decode', input=None, timeout=None):
+    """
+    Run cmd like subprocess.run(..., stdout=PIPE, stderr=PIPE) and charge it to the current file.
+
+    input is bytes or an iterable of byte chunks (e.g. a download being
+    streamed) fed to stdin. Spawn time, time waiting on the process and the
+    process's own peak RSS (from wait4) are recorded. Returns a CompletedProcess;
+    with timeout (seconds) the process is killed and subprocess.TimeoutExpired
+    raised once it runs longer (see tools/supervise.py).
+    """
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    spawned = time.perf_counter()
+    expired = threading.Event()
+    if timeout:
+        def expire():
+            expired.set()
+            proc.kill()
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+
+    # Drain stderr (and feed stdin) on helper threads so the pipes cannot
+    # fill up, then reap the child ourselves to get its resource usage.
+    record = current()
+    stderr = []
+    feed_errors = []
+    helpers = [threading.Thread(target=lambda: stderr.append(proc.stderr.read()), daemon=True)]
+    if input is not None:
+        def feed():
+            _current.record = record  # a streamed input's reads count towards the same file
+            chunks = [input] if isinstance(input, bytes) else input
+            try:
+                for chunk in chunks:
+                    proc.stdin.write(chunk)
+            except BrokenPipeError:
+                pass
+            except Exception as e:
+                feed_errors.append(e)
+            finally:
+                proc.stdin.close()
+                if hasattr(chunks, 'close'):
+                    chunks.close()
+        helpers.append(threading.Thread(target=feed, daemon=True))
+    for helper in helpers:
+        helper.start()
+    stdout = proc.stdout.read()
+    for helper in helpers:
+        helper.join()
+    proc.stdout.close()
+    proc.stderr.close()
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    finished = time.perf_counter()
+    if timeout:
+        timer.cancel()
+
+    if record is not None:
+        record.add('spawn', spawned - started)
+        record.add(stage, finished - spawned)
+        record.child_rss = max(record.child_rss, usage.ru_maxrss * 1024)
+    if expired.is_set() and proc.returncode < 0:
+        raise subprocess.TimeoutExpired(cmd, timeout, stdout, b''.join(stderr))
+    if feed_errors:
+        raise feed_errors[0]
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, b''.join(stderr))
+
+
+class Stats:
+    """Collects FileRecords for one tool run and summarises them."""
+
+    def __init__(self, tool):
+        self.tool = tool
+        self.records = {}
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def file(self, path):
+        """Measure the work done for one file on this thread; repeated calls for a path accumulate."""
+        with self.lock:
+            record = self.records.setdefault(str(path), FileRecord(path))
+        previous = current()
+        _current.record = record
+        started = time.perf_counter()
+        before = sum(record.stages.values())
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - started
+            record.total += elapsed
+            record.add('python', max(0.0, elapsed - (sum(record.stages.values()) - before)))
+            record.rss = _self_rss()
+            _current.record = previous
+
+    def summary(self):
+        """Return the --stats report as a dict."""
+        records = list(self.records.values())
+        stage_names = sorted({name for record in records for name in record.stages})
+        stages = {}
+        for name in ['total'] + stage_names:
+            values = [record.total if name == 'total' else record.stages.get(name, 0.0) for record in records]
+            stages[name] = {
+                'sum': round(sum(values), 4),
+                'p50': round(percentile(values, 0.50), 4),
+                'p95': round(percentile(values, 0.95), 4),
+                'max': round(max(values, default=0), 4),
+            }
+        slowest = sorted(records, key=lambda record: record.total, reverse=True)[:SLOWEST_FILES]
+        return {
+            'tool': self.tool,
+            'files': len(records),
+            'wallTime': round(time.perf_counter() - self.started, 4),
+            'stages': stages,
+            'bytesRead': sum(record.bytes_read for record in records),
+            'bytesWritten': sum(record.bytes_written for record in records),
+            'peakRss': max([_self_rss()] + [record.child_rss for record in records]),
+            'slowest': [record.as_dict() for record in slowest],
+        }
+
+    def write(self, path):
+        """Write the summary to path and print a short digest."""
+        report = self.summary()
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        parts = [f"{name} p50 {values['p50']:.2f}s p95 {values['p95']:.2f}s max {values['max']:.2f}s"
+                 for name, values in report['stages'].items() if values['sum'] > 0]
+        print(f"\nStats ({report['files']} files, {report['wallTime']:.1f}s) written to {path}")
+        for part in parts:
+            print(f"  {part}")
+        return report
+
+
+def take_options(argv):
+    """Remove --stats FILE and --profile FILE from argv; returns (argv, stats_path, profile_path)."""
+    remaining = []
+    options = {'--stats': None, '--profile': None}
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        name, eq, value = arg.partition('=')
+        if name in options:
+            if not eq:
+                i += 1
+                if i >= len(argv):
+                    raise SystemExit(f"Error: {name} requires a file argument")
+                value = argv[i]
+            options[name] = value
+        else:
+            remaining.append(arg)
+        i += 1
+    return remaining, options['--stats'], options['--profile']
+
+
+def run_main(main, stats, stats_path=None, profile_path=None):
+    """Run a tool's main(), optionally under cProfile, then write the --stats report."""
+    profiler = cProfile.Profile() if profile_path else None
+    try:
+        if profiler:
+            profiler.enable()
+        return main()
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+            print(f"\nProfile written to {profile_path} (top functions by cumulative time):")
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
+        if stats_path:
+            Path(stats_path).parent.mkdir(parents=True, exist_ok=True)
+            stats.write(stats_path)